@@ -0,0 +1,322 @@
+"""Admission control: shed excess load quickly instead of queueing it.
+
+Every request is put in a route class (read, write, bulk, auth). Each class
+has a concurrency cap that adapts AIMD-style to observed latency: it grows by
+about one slot per "limit" fast completions and shrinks by ADMISSION_BACKOFF
+when responses get slower than the class target or fail with a 5xx. Requests
+over the cap get an immediate 503 with Retry-After rather than waiting in
+uvicorn until the database recovers.
+
+GETs are favoured: reads may wait up to ADMISSION_READ_WAIT_MS for a slot,
+every other class is refused at once, and bulk and auth work is also refused
+while reads are waiting.
+
+Optionally (RATE_LIMIT_PER_SECOND > 0) each client also gets a token bucket,
+kept in Redis so all workers share it, or in process memory while Redis is
+unavailable. An empty bucket answers 429 with the time until the next token.
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional, Tuple
+
+from monitoring import ADMISSION_IN_FLIGHT, ADMISSION_LIMIT, ADMISSION_REJECTED, CACHE_ERRORS
+
+logger = logging.getLogger(__name__)
+
+# 0 turns admission control off entirely
+ADMISSION_CONTROL = int(os.getenv("ADMISSION_CONTROL", "1"))
+ADMISSION_BACKOFF = float(os.getenv("ADMISSION_BACKOFF", "0.9"))
+ADMISSION_READ_WAIT_MS = float(os.getenv("ADMISSION_READ_WAIT_MS", "50"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))  # seconds, on 503
+
+# Requests per second per client; 0 disables rate limiting
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "0"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", str(max(1, int(RATE_LIMIT_PER_SECOND * 2)))))
+# Identify clients by the first X-Forwarded-For hop (only behind a trusted proxy)
+RATE_LIMIT_TRUST_FORWARDED = int(os.getenv("RATE_LIMIT_TRUST_FORWARDED", "0"))
+RATE_LIMIT_LOCAL_CLIENTS = int(os.getenv("RATE_LIMIT_LOCAL_CLIENTS", "10000"))
+RATE_LIMIT_PREFIX = "ratelimit:"
+# After a Redis error, use local buckets for this long before trying Redis again
+RATE_LIMIT_REDIS_BACKOFF = float(os.getenv("RATE_LIMIT_REDIS_BACKOFF", "5"))
+
+@dataclass(frozen=True)
+class RouteClassPolicy:
+    initial: int
+    minimum: int
+    maximum: int
+    # Latency above which the limit backs off; None keeps the limit fixed
+    target_ms: Optional[float]
+    max_wait_ms: float = 0.0
+    yields_to_reads: bool = False
+
+ROUTE_CLASS_POLICIES: Dict[str, RouteClassPolicy] = {
+    "read": RouteClassPolicy(
+        initial=int(os.getenv("ADMISSION_READ_LIMIT", "64")), minimum=8, maximum=512,
+        target_ms=float(os.getenv("ADMISSION_READ_TARGET_MS", "250")), max_wait_ms=ADMISSION_READ_WAIT_MS,
+    ),
+    "write": RouteClassPolicy(
+        initial=int(os.getenv("ADMISSION_WRITE_LIMIT", "32")), minimum=4, maximum=256,
+        target_ms=float(os.getenv("ADMISSION_WRITE_TARGET_MS", "500")),
+    ),
+    # bcrypt dominates; its latency says little about database health
+    "auth": RouteClassPolicy(
+        initial=int(os.getenv("ADMISSION_AUTH_LIMIT", "16")), minimum=2, maximum=64,
+        target_ms=float(os.getenv("ADMISSION_AUTH_TARGET_MS", "1000")), yields_to_reads=True,
+    ),
+    # Exports stream for as long as the table is big, so latency is no signal
+    "bulk": RouteClassPolicy(
+        initial=int(os.getenv("ADMISSION_BULK_LIMIT", "4")), minimum=1, maximum=64,
+        target_ms=None, yields_to_reads=True,
+    ),
+}
+
+AUTH_PATHS = frozenset({"/login", "/signup", "/me"})
+EXEMPT_PATHS = frozenset({"/health", "/metrics", "/docs", "/redoc", "/openapi.json", "/docs/oauth2-redirect"})
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """Route class of a request, or None if it is never limited"""
+    if path in EXEMPT_PATHS or method == "OPTIONS":
+        return None
+    if path in AUTH_PATHS:
+        return "auth"
+    if path.startswith("/export/") or path.endswith("/bulk"):
+        return "bulk"
+    if method in ("GET", "HEAD"):
+        return "read"
+    return "write"
+
+class AdaptiveLimiter:
+    """Concurrency limit for one route class, adjusted AIMD-style by latency"""
+
+    def __init__(self, name: str, policy: RouteClassPolicy, backoff: float = ADMISSION_BACKOFF):
+        self.name = name
+        self.policy = policy
+        self.backoff = backoff
+        self.limit = float(policy.initial)
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        ADMISSION_LIMIT.labels(route_class=name).set(self.limit)
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def try_acquire(self) -> bool:
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            ADMISSION_IN_FLIGHT.labels(route_class=self.name).inc()
+            return True
+        return False
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting up to the class's max_wait_ms; False if shed"""
+        if self.try_acquire():
+            return True
+        # Bound the queue by the limit so waiting never outgrows capacity
+        if self.policy.max_wait_ms <= 0 or len(self._waiters) >= int(self.limit):
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # release() hands the slot over by resolving the future
+            return await asyncio.wait_for(waiter, self.policy.max_wait_ms / 1000)
+        except asyncio.TimeoutError:
+            # The slot may have arrived just as the wait expired
+            return waiter.done() and not waiter.cancelled()
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._free_slot()
+            raise
+        finally:
+            if waiter.cancelled():
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+
+    def release(self, latency: float, failed: bool = False) -> None:
+        self._adjust(latency, failed)
+        self._free_slot()
+
+    def _free_slot(self) -> None:
+        self.in_flight -= 1
+        ADMISSION_IN_FLIGHT.labels(route_class=self.name).dec()
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                ADMISSION_IN_FLIGHT.labels(route_class=self.name).inc()
+                waiter.set_result(True)
+
+    def _adjust(self, latency: float, failed: bool) -> None:
+        target_ms = self.policy.target_ms
+        if target_ms is None:
+            return
+        now = time.monotonic()
+        if failed or latency * 1000 > target_ms:
+            # At most one decrease per target interval, so one slow burst
+            # does not collapse the limit to its floor
+            if now - self._last_decrease >= target_ms / 1000:
+                self._last_decrease = now
+                self.limit = max(self.policy.minimum, self.limit * self.backoff)
+        elif self.in_flight * 2 >= self.limit:
+            # Only grow while the limit is actually in use
+            self.limit = min(self.policy.maximum, self.limit + 1 / self.limit)
+        else:
+            return
+        ADMISSION_LIMIT.labels(route_class=self.name).set(self.limit)
+
+# KEYS[1]: bucket; ARGV: tokens per second, burst. Returns {allowed, retry_after}.
+# Uses the server clock so every worker sees the same time.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+class RateLimiter:
+    """Per-client token buckets in Redis, or in this process without Redis"""
+
+    def __init__(self, rate: float, burst: int, max_local_clients: int = RATE_LIMIT_LOCAL_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_local_clients = max_local_clients
+        self._local: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._script = None
+        self._redis_retry_at = 0.0
+
+    async def take(self, client_id: str, redis_client=None) -> float:
+        """Spend one token; returns 0 if allowed, else seconds until a token is free"""
+        if redis_client is not None and time.monotonic() >= self._redis_retry_at:
+            try:
+                if self._script is None or self._script.registered_client is not redis_client:
+                    self._script = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+                allowed, retry_after = await self._script(
+                    keys=[f"{RATE_LIMIT_PREFIX}{client_id}"], args=[self.rate, self.burst]
+                )
+                return 0.0 if int(allowed) else float(retry_after)
+            except Exception as e:
+                logger.warning(f"⚠️ Redis rate limiting failed, using local buckets: {str(e)}")
+                CACHE_ERRORS.labels(operation="rate_limit").inc()
+                self._redis_retry_at = time.monotonic() + RATE_LIMIT_REDIS_BACKOFF
+        return self.take_local(client_id)
+
+    def take_local(self, client_id: str) -> float:
+        now = time.monotonic()
+        tokens, ts = self._local.pop(client_id, (float(self.burst), now))
+        tokens = min(self.burst, tokens + (now - ts) * self.rate)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / self.rate
+        self._local[client_id] = (tokens, now)
+        if len(self._local) > self.max_local_clients:
+            self._local.popitem(last=False)
+        return retry_after
+
+def client_id(scope) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = next((value for name, value in scope["headers"] if name == b"x-forwarded-for"), b"")
+        if forwarded:
+            return forwarded.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def _redis_client(scope):
+    """Shared Redis client of the app's cache service, if there is one"""
+    app = scope.get("app")
+    cache = getattr(getattr(app, "state", None), "cache", None)
+    return getattr(cache, "client", None)
+
+async def _reject(send, status: int, detail: str, retry_after: float) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class AdmissionMiddleware:
+    """ASGI middleware applying rate limits and adaptive concurrency limits.
+
+    Shed requests never reach the routes: rate-limited clients get 429,
+    requests over their class's concurrency limit get 503, both with
+    Retry-After.
+    """
+
+    def __init__(
+        self,
+        app,
+        policies: Optional[Dict[str, RouteClassPolicy]] = None,
+        rate: float = RATE_LIMIT_PER_SECOND,
+        burst: int = RATE_LIMIT_BURST,
+        enabled: bool = bool(ADMISSION_CONTROL),
+    ):
+        self.app = app
+        self.enabled = enabled
+        self.limiters = {
+            name: AdaptiveLimiter(name, policy) for name, policy in (policies or ROUTE_CLASS_POLICIES).items()
+        }
+        self.rate_limiter = RateLimiter(rate, burst) if rate > 0 else None
+
+    async def __call__(self, scope, receive, send):
+        name = route_class(scope["method"], scope["path"]) if scope["type"] == "http" and self.enabled else None
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        if self.rate_limiter is not None:
+            retry_after = await self.rate_limiter.take(client_id(scope), _redis_client(scope))
+            if retry_after > 0:
+                ADMISSION_REJECTED.labels(route_class=name, reason="rate_limit").inc()
+                await _reject(send, 429, "Too many requests", retry_after)
+                return
+
+        limiter = self.limiters[name]
+        reads = self.limiters.get("read")
+        if (limiter.policy.yields_to_reads and reads is not None and reads.waiting) or not await limiter.acquire():
+            ADMISSION_REJECTED.labels(route_class=name, reason="overload").inc()
+            await _reject(send, 503, "Server is busy, please retry", ADMISSION_RETRY_AFTER)
+            return
+
+        status_code = 500
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            limiter.release(time.perf_counter() - start, failed=status_code >= 500)
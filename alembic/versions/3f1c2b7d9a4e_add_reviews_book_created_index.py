@@ -0,0 +1,22 @@
+"""Add (book_id, created_at, id) index on reviews
+
+Revision ID: 3f1c2b7d9a4e
+Revises: e9ecb888b0fe
+Create Date: 2026-10-18 10:12:41.503218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2b7d9a4e'
+down_revision = 'e9ecb888b0fe'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index('idx_reviews_book_created', 'reviews', ['book_id', 'created_at', 'id'], unique=False)
+
+def downgrade():
+    op.drop_index('idx_reviews_book_created', table_name='reviews')
@@ -0,0 +1,46 @@
+"""Add book_stats rating aggregates
+
+Revision ID: 8b2e4f6a1c3d
+Revises: 3f1c2b7d9a4e
+Create Date: 2026-10-18 11:02:17.884105
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4f6a1c3d'
+down_revision = '3f1c2b7d9a4e'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('book_stats',
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('review_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('rating_sum', sa.Float(), server_default='0', nullable=False),
+    sa.Column('rating_1', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('rating_2', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('rating_3', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('rating_4', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('rating_5', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ),
+    sa.PrimaryKeyConstraint('book_id')
+    )
+    # Backfill from existing reviews (same buckets as services.stats_service.star_bucket)
+    op.execute("""
+        INSERT INTO book_stats (book_id, review_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5)
+        SELECT book_id, COUNT(*), SUM(rating),
+               SUM(CASE WHEN rating < 1.5 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN rating >= 1.5 AND rating < 2.5 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN rating >= 2.5 AND rating < 3.5 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN rating >= 3.5 AND rating < 4.5 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN rating >= 4.5 THEN 1 ELSE 0 END)
+        FROM reviews
+        GROUP BY book_id
+    """)
+
+def downgrade():
+    op.drop_table('book_stats')
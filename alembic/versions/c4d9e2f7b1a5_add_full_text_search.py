@@ -0,0 +1,88 @@
+"""Add full-text search indexes for books and reviews
+
+Revision ID: c4d9e2f7b1a5
+Revises: 8b2e4f6a1c3d
+Create Date: 2026-10-18 14:20:53.310942
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d9e2f7b1a5'
+down_revision = '8b2e4f6a1c3d'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("""
+            ALTER TABLE books ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(author, '')), 'B') ||
+                setweight(to_tsvector('english', coalesce(description, '')), 'C')) STORED
+        """)
+        op.execute("CREATE INDEX idx_books_search ON books USING GIN (search_vector)")
+        op.execute("CREATE INDEX idx_reviews_comment_search ON reviews USING GIN (to_tsvector('english', coalesce(comment, '')))")
+        return
+
+    op.execute("""
+        CREATE VIRTUAL TABLE books_fts USING fts5(
+            title, author, description, content='books', content_rowid='id',
+            tokenize='porter unicode61 remove_diacritics 2')
+    """)
+    op.execute("""
+        CREATE TRIGGER books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts(rowid, title, author, description) VALUES (new.id, new.title, new.author, new.description);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author, description)
+            VALUES ('delete', old.id, old.title, old.author, old.description);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER books_fts_au AFTER UPDATE ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author, description)
+            VALUES ('delete', old.id, old.title, old.author, old.description);
+            INSERT INTO books_fts(rowid, title, author, description) VALUES (new.id, new.title, new.author, new.description);
+        END
+    """)
+    op.execute("""
+        CREATE VIRTUAL TABLE reviews_fts USING fts5(
+            comment, content='reviews', content_rowid='id',
+            tokenize='porter unicode61 remove_diacritics 2')
+    """)
+    op.execute("""
+        CREATE TRIGGER reviews_fts_ai AFTER INSERT ON reviews BEGIN
+            INSERT INTO reviews_fts(rowid, comment) VALUES (new.id, new.comment);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER reviews_fts_ad AFTER DELETE ON reviews BEGIN
+            INSERT INTO reviews_fts(reviews_fts, rowid, comment) VALUES ('delete', old.id, old.comment);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER reviews_fts_au AFTER UPDATE ON reviews BEGIN
+            INSERT INTO reviews_fts(reviews_fts, rowid, comment) VALUES ('delete', old.id, old.comment);
+            INSERT INTO reviews_fts(rowid, comment) VALUES (new.id, new.comment);
+        END
+    """)
+    # Index the rows that already exist
+    op.execute("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+    op.execute("INSERT INTO reviews_fts(reviews_fts) VALUES ('rebuild')")
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS idx_reviews_comment_search")
+        op.execute("DROP INDEX IF EXISTS idx_books_search")
+        op.drop_column('books', 'search_vector')
+        return
+
+    for trigger in ('books_fts_ai', 'books_fts_ad', 'books_fts_au', 'reviews_fts_ai', 'reviews_fts_ad', 'reviews_fts_au'):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS reviews_fts")
+    op.execute("DROP TABLE IF EXISTS books_fts")
@@ -1,13 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from passlib.context import CryptContext
-from jose import jwt
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, timedelta
 from pydantic import BaseModel, EmailStr
 from schemas import Token, UserCreate, UserLogin
 from database import get_db
 from models import User
+from services.cache_service import LocalCache
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+import asyncio
+import multiprocessing
 import os
+import time
 from dotenv import load_dotenv
 
 # -------------------------------
@@ -21,7 +29,28 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60
 # -------------------------------
 # 🔒 Password Hashing Context
 # -------------------------------
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# passlib and jose are imported on first use, not when main is imported, so
+# a new worker starts serving without paying for the auth stack up front.
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# bcrypt runs in worker processes so a login burst neither blocks the event
+# loop nor exhausts the threadpool shared with sync routes. The pool size
+# bounds how many hashes run at once; 0 falls back to the threadpool.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+_hash_executor: ProcessPoolExecutor | None = None
+
+# -------------------------------
+# 🎫 Token Cache
+# -------------------------------
+# Decoded, unexpired tokens -> user, so authenticated requests skip the
+# signature check and the User query. Entries never outlive the token.
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "4096"))
+AUTH_TOKEN_CACHE_TTL = int(os.getenv("AUTH_TOKEN_CACHE_TTL", "300"))
+token_cache = LocalCache(AUTH_TOKEN_CACHE_SIZE, AUTH_TOKEN_CACHE_TTL)
+bearer_scheme = HTTPBearer(auto_error=False)
 
 # -------------------------------
 # 🚪 Router Instance
@@ -36,16 +65,55 @@ class LoginResponse(BaseModel):
     token_type: str
     user: dict
 
+class CurrentUser(BaseModel):
+    id: int
+    email: EmailStr
+    username: str | None = None
+
 # -------------------------------
 # 🔐 Utility Functions
 # -------------------------------
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+def get_hash_executor() -> ProcessPoolExecutor | None:
+    """Process pool for bcrypt, started on first use"""
+    global _hash_executor
+    if _hash_executor is None and PASSWORD_HASH_WORKERS > 0:
+        # spawn: forking a process that already runs event-loop and driver threads is unsafe
+        _hash_executor = ProcessPoolExecutor(
+            max_workers=PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _hash_executor
+
+def shutdown_hash_executor() -> None:
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
+async def _run_hasher(func, *args):
+    executor = get_hash_executor()
+    if executor is None:
+        return await run_in_threadpool(func, *args)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    except BrokenProcessPool:
+        # A worker died; start a fresh pool on the next call
+        shutdown_hash_executor()
+        raise
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hasher(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hasher(verify_password, plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
+    from jose import jwt
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
@@ -55,16 +123,16 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
 # 👤 Register Route
 # -------------------------------
 @auth_router.post("/signup", response_model=LoginResponse)
-def register_user(request: UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.email == request.email).first()
+async def register_user(request: UserCreate, db: AsyncSession = Depends(get_db)):
+    existing_user = await db.scalar(select(User).where(User.email == request.email))
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password = hash_password(request.password)
+    hashed_password = await hash_password_async(request.password)
     new_user = User(email=request.email,  username=request.username, hashed_password=hashed_password)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     access_token = create_access_token(data={"sub": new_user.email})
     return {
@@ -81,9 +149,9 @@ def register_user(request: UserCreate, db: Session = Depends(get_db)):
 # 🔐 Login Route
 # -------------------------------
 @auth_router.post("/login", response_model=LoginResponse)
-def login_user(request: UserLogin, db: Session = Depends(get_db)): 
-    user = db.query(User).filter(User.email == request.email).first()
-    if not user or not verify_password(request.password, user.hashed_password):
+async def login_user(request: UserLogin, db: AsyncSession = Depends(get_db)): 
+    user = await db.scalar(select(User).where(User.email == request.email))
+    if not user or not await verify_password_async(request.password, user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
     access_token = create_access_token(data={"sub": user.email})
@@ -95,4 +163,48 @@ def login_user(request: UserLogin, db: Session = Depends(get_db)):
             "email": user.email,
             "username": user.username  # Extract username from email
         }
-    }
\ No newline at end of file
+    }
+
+# -------------------------------
+# 🛡️ Current User Dependency
+# -------------------------------
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
+    db: AsyncSession = Depends(get_db),
+) -> CurrentUser:
+    """Resolve the bearer token to a user, verifying it only on a cache miss"""
+    unauthorized = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    if credentials is None:
+        raise unauthorized
+    token = credentials.credentials
+
+    cached = token_cache.get(token, default=None)
+    if cached is not None:
+        return cached
+
+    from jose import JWTError, jwt
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise unauthorized
+    email, expires_at = payload.get("sub"), payload.get("exp")
+    if email is None or expires_at is None:
+        raise unauthorized
+
+    user = await db.scalar(select(User).where(User.email == email))
+    if user is None:
+        raise unauthorized
+
+    current_user = CurrentUser(id=user.id, email=user.email, username=user.username)
+    remaining = expires_at - time.time()
+    if remaining > 0:
+        token_cache.set(token, current_user, min(remaining, AUTH_TOKEN_CACHE_TTL))
+    return current_user
+
+@auth_router.get("/me", response_model=CurrentUser)
+async def read_current_user(current_user: CurrentUser = Depends(get_current_user)):
+    return current_user
@@ -0,0 +1,87 @@
+"""Compare two benchmark result files and flag regressions.
+
+Usage:
+    python -m benchmarks.compare baseline.json results.json [--threshold 0.15]
+
+Exits with status 1 when any scenario regressed, so it can gate CI.
+"""
+import argparse
+import json
+import sys
+from typing import List
+
+# Relative change tolerated before a metric counts as a regression
+DEFAULT_THRESHOLD = 0.15
+
+# metric -> True if bigger is better
+METRICS = {
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "rps": True,
+}
+
+# Settings that must match for latencies to be comparable
+CONFIG_KEYS = ("books", "cache", "concurrency", "requests", "login_requests", "page_size", "review_queue_size", "admission_control")
+
+def config_mismatch(baseline: dict, current: dict) -> List[str]:
+    """Run settings that differ between the two result files"""
+    old, new = baseline.get("meta", {}), current.get("meta", {})
+    return [key for key in CONFIG_KEYS if old.get(key) != new.get(key)]
+
+def compare(baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD) -> List[dict]:
+    """One row per (mode, scenario, metric) present in both runs"""
+    rows = []
+    for mode, scenarios in current["results"].items():
+        for scenario, stats in scenarios.items():
+            base = baseline.get("results", {}).get(mode, {}).get(scenario)
+            if base is None:
+                continue
+            for metric, higher_is_better in METRICS.items():
+                old, new = base.get(metric), stats.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old
+                regressed = change < -threshold if higher_is_better else change > threshold
+                rows.append({
+                    "mode": mode,
+                    "scenario": scenario,
+                    "metric": metric,
+                    "baseline": old,
+                    "current": new,
+                    "change": round(change, 4),
+                    "regressed": regressed,
+                })
+    return rows
+
+def report(rows: List[dict], out=sys.stdout) -> bool:
+    """Print a comparison table and return True if nothing regressed"""
+    print(f"{'mode':<6} {'scenario':<14} {'metric':<7} {'baseline':>10} {'current':>10} {'change':>8}", file=out)
+    for row in rows:
+        flag = "  REGRESSION" if row["regressed"] else ""
+        print(
+            f"{row['mode']:<6} {row['scenario']:<14} {row['metric']:<7} "
+            f"{row['baseline']:>10.2f} {row['current']:>10.2f} {row['change']:>+8.1%}{flag}",
+            file=out,
+        )
+    return not any(row["regressed"] for row in rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flag regressions between two benchmark runs")
+    parser.add_argument("baseline", help="Stored baseline JSON")
+    parser.add_argument("current", help="JSON written by benchmarks.run")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative change tolerated per metric (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    for key in config_mismatch(baseline, current):
+        print(f"warning: baseline was recorded with a different {key}", file=sys.stderr)
+    if not report(compare(baseline, current, args.threshold)):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
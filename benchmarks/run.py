@@ -0,0 +1,285 @@
+"""Load/latency benchmark for the Book Review Service.
+
+Usage:
+    python -m benchmarks.seed --database bench.db --books 10000 --reviews 100000 --reset
+    python -m benchmarks.run --database bench.db --output results.json
+    python -m benchmarks.run --database bench.db --compare baseline.json
+
+The app runs in-process behind httpx's ASGI transport, with fakeredis
+standing in for Redis (``--cache none`` runs L1 only). Every mode starts
+from an empty cache:
+
+- ``cold``: each read request targets a distinct key, so every read is a
+  miss that goes to the database and fills the cache.
+- ``warm``: the same requests are replayed once untimed, then measured.
+
+Write scenarios and ``/login`` run after the reads in each mode.
+
+``--accept-encoding gzip`` (repeatable) reruns every mode with that
+Accept-Encoding, reported as ``warm+gzip`` etc. ``mean_bytes`` counts bytes
+on the wire and ``cpu_ms`` the process CPU time per request, so the
+bandwidth saved can be weighed against the compression cost.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.compare import DEFAULT_THRESHOLD, compare, config_mismatch, report
+from benchmarks.seed import BENCH_USER_EMAIL, BENCH_USER_PASSWORD, use_database
+
+logger = logging.getLogger(__name__)
+
+MODES = ("cold", "warm")
+READ_SCENARIOS = ("list_books", "book_reviews")
+WRITE_SCENARIOS = ("create_book", "create_review", "login")
+SCENARIOS = READ_SCENARIOS + WRITE_SCENARIOS
+ENCODINGS = ("identity", "gzip", "br")
+
+# (method, path, json body)
+Call = Tuple[str, str, Optional[dict]]
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of already sorted samples"""
+    if not samples:
+        return 0.0
+    rank = max(0, min(len(samples) - 1, math.ceil(pct / 100 * len(samples)) - 1))
+    return samples[rank]
+
+def summarize(
+    latencies: List[float], errors: int, sizes: List[int], elapsed: float, cpu: float = 0.0, shed: int = 0
+) -> dict:
+    latencies = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "shed": shed,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "mean_ms": ms(statistics.fmean(latencies)) if latencies else 0.0,
+        "max_ms": ms(latencies[-1]) if latencies else 0.0,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_bytes": round(statistics.fmean(sizes)) if sizes else 0,
+        "cpu_ms": ms(cpu / len(latencies)) if latencies else 0.0,
+    }
+
+class Planner:
+    """Builds reproducible request sequences for each scenario"""
+
+    def __init__(self, book_ids: List[int], seed_value: int, page_size: int):
+        self.book_ids = book_ids
+        self.rng = random.Random(seed_value)
+        self.page_size = page_size
+        # Unique per run so repeated runs against one database never collide on ISBN
+        self.isbn_base = 9790000000000 + (time.time_ns() // 1000) % 10**8 * 1000
+        self.isbn_count = 0
+
+    def distinct_books(self, count: int) -> List[int]:
+        """Book ids without repeats until every book has been used once"""
+        ids = []
+        while len(ids) < count:
+            batch = list(self.book_ids)
+            self.rng.shuffle(batch)
+            ids.extend(batch)
+        return ids[:count]
+
+    def plan(self, scenario: str, count: int) -> List[Call]:
+        if scenario == "list_books":
+            # Distinct offsets -> distinct cache keys
+            pages = max(1, len(self.book_ids) - self.page_size + 1)
+            offsets = [i % pages for i in range(count)]
+            self.rng.shuffle(offsets)
+            return [("GET", f"/books?skip={skip}&limit={self.page_size}", None) for skip in offsets]
+        if scenario == "book_reviews":
+            return [("GET", f"/books/{book_id}/reviews?limit={self.page_size}", None)
+                    for book_id in self.distinct_books(count)]
+        if scenario == "create_book":
+            calls = []
+            for _ in range(count):
+                self.isbn_count += 1
+                calls.append(("POST", "/books", {
+                    "title": f"Benchmark book {self.isbn_count}",
+                    "author": "Benchmark",
+                    "isbn": str(self.isbn_base + self.isbn_count),
+                    "published_year": 2024,
+                }))
+            return calls
+        if scenario == "create_review":
+            return [("POST", f"/books/{book_id}/reviews", {
+                "reviewer_name": "Benchmark",
+                "rating": self.rng.choice([1.0, 2.5, 3.0, 4.0, 5.0]),
+                "comment": "Benchmark review",
+            }) for book_id in self.distinct_books(count)]
+        if scenario == "login":
+            return [("POST", "/login", {"email": BENCH_USER_EMAIL, "password": BENCH_USER_PASSWORD})] * count
+        raise ValueError(f"Unknown scenario {scenario}")
+
+async def drive(client: httpx.AsyncClient, calls: List[Call], concurrency: int) -> dict:
+    """Send ``calls`` from ``concurrency`` workers and summarize latencies"""
+    latencies, sizes = [], []
+    errors = shed = 0
+    pending = iter(calls)
+
+    async def worker():
+        nonlocal errors, shed
+        for method, path, body in pending:
+            start = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            if response.status_code in (429, 503) and "retry-after" in response.headers:
+                # Refused by admission control; kept out of the latency figures
+                shed += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            sizes.append(response.num_bytes_downloaded)
+            if response.status_code >= 400:
+                errors += 1
+
+    start, cpu_start = time.perf_counter(), time.process_time()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, sizes, time.perf_counter() - start, time.process_time() - cpu_start, shed)
+
+def result_key(mode: str, encoding: str) -> str:
+    return mode if encoding == "identity" else f"{mode}+{encoding}"
+
+def create_redis(kind: str):
+    if kind == "none":
+        return None
+    import fakeredis
+    return fakeredis.FakeAsyncRedis()
+
+async def run(args) -> dict:
+    from sqlalchemy import select
+
+    from admission import ADMISSION_CONTROL
+    from database import AsyncSessionLocal, async_engine
+    from main import app
+    from models import Book
+    from services.cache_service import CacheService
+    from services.review_queue import REVIEW_QUEUE_SIZE, ReviewWriteQueue
+
+    async with AsyncSessionLocal() as db:
+        book_ids = list((await db.execute(select(Book.id).order_by(Book.id))).scalars())
+    if not book_ids:
+        raise SystemExit("Benchmark database is empty - run `python -m benchmarks.seed` first")
+
+    counts = {scenario: args.requests for scenario in SCENARIOS}
+    counts["login"] = args.login_requests
+    scenarios = args.scenario or list(SCENARIOS)
+
+    results: Dict[str, Dict[str, dict]] = {}
+    try:
+        for encoding in args.accept_encoding:
+            for mode in args.mode:
+                key = result_key(mode, encoding)
+                planner = Planner(book_ids, args.seed, args.page_size)
+                cache = CacheService(create_redis(args.cache))
+                await cache.start()
+                app.state.cache = cache
+                # REVIEW_QUEUE_SIZE > 0 benchmarks write-behind review ingestion
+                app.state.review_queue = None
+                if REVIEW_QUEUE_SIZE > 0:
+                    app.state.review_queue = ReviewWriteQueue(AsyncSessionLocal, cache)
+                    app.state.review_queue.start()
+                results[key] = {}
+                transport = httpx.ASGITransport(app=app)
+                # httpx asks for gzip by default; pin the header so runs are comparable
+                headers = {"Accept-Encoding": encoding}
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+                    for scenario in scenarios:
+                        calls = planner.plan(scenario, counts[scenario])
+                        if mode == "warm" and scenario in READ_SCENARIOS:
+                            await drive(client, calls, args.concurrency)
+                        stats = await drive(client, calls, args.concurrency)
+                        results[key][scenario] = stats
+                        logger.info(
+                            f"⏱️ {key:<10} {scenario:<13} p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms "
+                            f"p99={stats['p99_ms']}ms {stats['rps']} req/s {stats['mean_bytes']}B "
+                            f"cpu={stats['cpu_ms']}ms errors={stats['errors']} shed={stats['shed']}"
+                        )
+                if app.state.review_queue is not None:
+                    await app.state.review_queue.stop()
+                await cache.stop()
+    finally:
+        await async_engine.dispose()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": os.environ["DATABASE_URL"],
+            "books": len(book_ids),
+            "cache": args.cache,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "login_requests": args.login_requests,
+            "page_size": args.page_size,
+            "seed": args.seed,
+            "review_queue_size": REVIEW_QUEUE_SIZE,
+            "admission_control": ADMISSION_CONTROL,
+        },
+        "results": results,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Book Review Service endpoints")
+    parser.add_argument("--database", default="bench.db", help="SQLite file seeded by benchmarks.seed")
+    parser.add_argument("--cache", choices=("fakeredis", "none"), default="fakeredis",
+                        help="Shared cache tier behind the in-process L1")
+    parser.add_argument("--mode", action="append", choices=MODES,
+                        help="Cache mode to run (repeatable, default: both)")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                        help="Scenario to run (repeatable, default: all)")
+    parser.add_argument("--accept-encoding", action="append", choices=ENCODINGS,
+                        help="Accept-Encoding to send (repeatable, default: identity)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=50,
+                        help="Requests for /login (bcrypt makes it much slower)")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for request plans")
+    parser.add_argument("--output", help="Write results JSON here (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="Baseline JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative change tolerated per metric (default: %(default)s)")
+    args = parser.parse_args(argv)
+    args.mode = args.mode or list(MODES)
+    args.accept_encoding = args.accept_encoding or ["identity"]
+
+    logging.basicConfig(level=logging.INFO)
+    # Per-request logs would dominate the timings
+    for name in ("main", "services", "httpx"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    use_database(args.database)
+
+    results = asyncio.run(run(args))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for key in config_mismatch(baseline, results):
+            logger.warning(f"⚠️ Baseline was recorded with a different {key}")
+        if not report(compare(baseline, results, args.threshold), out=sys.stderr):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
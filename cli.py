@@ -0,0 +1,90 @@
+"""Maintenance commands for the Book Review Service.
+
+Usage:
+    python cli.py rebuild-stats [--book-id ID]
+    python cli.py rebuild-search
+    python cli.py rebuild-leaderboard
+"""
+import argparse
+import asyncio
+import logging
+
+from sqlalchemy import text
+
+from database import AsyncSessionLocal, async_engine
+from services.stats_service import StatsService
+from services.leaderboard_service import LeaderboardService
+from services.cache_service import CacheService, create_redis_client, close_redis_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def rebuild_stats(book_id: int = None) -> int:
+    """Recompute per-book rating aggregates from the reviews table.
+
+    Cached stats are not invalidated; they expire within CACHE_TTL.
+    """
+    try:
+        async with AsyncSessionLocal() as db:
+            count = await StatsService(db).rebuild(book_id)
+        logger.info(f"✅ Rebuilt rating aggregates for {count} books")
+        return count
+    finally:
+        await async_engine.dispose()
+
+async def rebuild_search() -> None:
+    """Re-index every book and review for full-text search.
+
+    Only needed on SQLite when rows were written with the FTS triggers
+    missing; Postgres derives its search vectors from the rows themselves.
+    """
+    try:
+        async with async_engine.begin() as conn:
+            if conn.dialect.name != "sqlite":
+                logger.info("ℹ️ Search vectors are generated columns here; nothing to rebuild")
+                return
+            await conn.execute(text("INSERT INTO books_fts(books_fts) VALUES ('rebuild')"))
+            await conn.execute(text("INSERT INTO reviews_fts(reviews_fts) VALUES ('rebuild')"))
+        logger.info("✅ Rebuilt full-text search indexes")
+    finally:
+        await async_engine.dispose()
+
+async def rebuild_leaderboard() -> int:
+    """Reload the Redis leaderboards from book_stats and recent reviews.
+
+    Without Redis each worker rebuilds its in-process boards at startup, so
+    there is nothing to do here.
+    """
+    redis_client = await create_redis_client()
+    try:
+        if redis_client is None:
+            logger.warning("⚠️ Redis unavailable; in-process leaderboards are rebuilt when the app starts")
+            return 0
+        async with AsyncSessionLocal() as db:
+            count = await LeaderboardService(db, CacheService(redis_client)).rebuild()
+        logger.info(f"✅ Rebuilt leaderboards for {count} books")
+        return count
+    finally:
+        await close_redis_client(redis_client)
+        await async_engine.dispose()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Book Review Service maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    stats_parser = commands.add_parser("rebuild-stats", help="Recompute per-book rating aggregates")
+    stats_parser.add_argument("--book-id", type=int, default=None, help="Only rebuild this book")
+
+    commands.add_parser("rebuild-search", help="Re-index books and reviews for full-text search")
+    commands.add_parser("rebuild-leaderboard", help="Reload the top-books leaderboards from the database")
+
+    args = parser.parse_args(argv)
+    if args.command == "rebuild-stats":
+        asyncio.run(rebuild_stats(args.book_id))
+    elif args.command == "rebuild-search":
+        asyncio.run(rebuild_search())
+    elif args.command == "rebuild-leaderboard":
+        asyncio.run(rebuild_leaderboard())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Response compression negotiated through Accept-Encoding.
+
+gzip is always available; brotli ("br") is used when the optional
+``brotli`` package is installed. Cached responses carry precompressed
+bodies (see CachedResponse), so the middleware only compresses dynamic
+responses.
+"""
+import gzip
+import os
+import zlib
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+# Bodies smaller than this are sent as-is; compression would not pay off
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+# Server preference order
+SUPPORTED_ENCODINGS: Tuple[str, ...] = ("br", "gzip") if brotli is not None else ("gzip",)
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+# Encodings the current request accepts, best first (set by CompressionMiddleware)
+_accepted_encodings: ContextVar[Tuple[str, ...]] = ContextVar("accepted_encodings", default=())
+
+def parse_accept_encoding(header: Optional[str]) -> Tuple[str, ...]:
+    """Supported encodings acceptable to the client, best first"""
+    if not header:
+        return ()
+    weights: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name.strip().lower()] = quality
+    accepted = []
+    for encoding in SUPPORTED_ENCODINGS:
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > 0:
+            accepted.append((quality, encoding))
+    # Stable sort keeps server preference among equal weights
+    return tuple(encoding for _, encoding in sorted(accepted, key=lambda item: -item[0]))
+
+def accepted_encodings() -> Tuple[str, ...]:
+    return _accepted_encodings.get()
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """ETag of the ``encoding`` representation: '"abc"' -> '"abc-gzip"'"""
+    return f'{etag[:-1]}-{encoding}"' if etag.endswith('"') else etag
+
+def strip_etag_encoding(etag: str) -> str:
+    """Inverse of encoded_etag, so any representation's ETag revalidates"""
+    for encoding in ("br", "gzip"):
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+def is_compressible(media_type: Optional[str]) -> bool:
+    return bool(media_type) and media_type.startswith(COMPRESSIBLE_TYPES)
+
+def precompress(body: bytes, media_type: Optional[str]) -> Dict[str, bytes]:
+    """Every supported encoding of ``body``, or nothing when it is too small to bother"""
+    if len(body) < COMPRESSION_MIN_SIZE or not is_compressible(media_type):
+        return {}
+    return {encoding: compress(body, encoding) for encoding in SUPPORTED_ENCODINGS}
+
+class _StreamCompressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._flush = self._compressor.flush
+            self._finish = self._compressor.finish
+            self.compress = self._compressor.process
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._flush = lambda: self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = self._compressor.flush
+            self.compress = self._compressor.compress
+
+    def chunk(self, data: bytes) -> bytes:
+        # Flush per chunk so streamed exports reach the client incrementally
+        return self.compress(data) + self._flush()
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses the client accepts in compressed form.
+
+    Responses that already carry Content-Encoding (precompressed cache hits)
+    pass through untouched, as do small bodies and non-text content types.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header = next((value for name, value in scope["headers"] if name == b"accept-encoding"), b"")
+        accepted = parse_accept_encoding(header.decode("latin-1"))
+        token = _accepted_encodings.set(accepted)
+        try:
+            if not accepted:
+                await self.app(scope, receive, send)
+            else:
+                await self.app(scope, receive, _CompressingSender(send, accepted[0], self.minimum_size))
+        finally:
+            _accepted_encodings.reset(token)
+
+class _CompressingSender:
+    def __init__(self, send, encoding: str, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start: Optional[dict] = None
+        self.compressor: Optional[_StreamCompressor] = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if self.passthrough:
+            await self.send(message)
+            return
+        if message["type"] == "http.response.start":
+            self.start = message
+            headers = {name.lower(): value for name, value in message.get("headers", [])}
+            media_type = headers.get(b"content-type", b"").decode("latin-1")
+            if (
+                b"content-encoding" in headers
+                or message["status"] in (204, 304)
+                or not is_compressible(media_type)
+            ):
+                self.passthrough = True
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            if not more_body:
+                # Whole body in one message: compress it in one go
+                if len(body) < self.minimum_size:
+                    await self._send_start([])
+                    await self.send(message)
+                else:
+                    compressed = compress(body, self.encoding)
+                    await self._send_start(self._encoding_headers(len(compressed)))
+                    await self.send({"type": "http.response.body", "body": compressed})
+                self.passthrough = True
+                return
+            self.compressor = _StreamCompressor(self.encoding)
+            await self._send_start(self._encoding_headers(None))
+
+        data = self.compressor.chunk(body) if body else b""
+        if not more_body:
+            data += self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    def _encoding_headers(self, length: Optional[int]) -> List[Tuple[bytes, bytes]]:
+        headers = [(b"content-encoding", self.encoding.encode())]
+        if length is not None:
+            headers.append((b"content-length", str(length).encode()))
+        return headers
+
+    async def _send_start(self, extra: List[Tuple[bytes, bytes]]) -> None:
+        if not extra:
+            await self.send(self.start)
+            return
+        replaced = {name for name, _ in extra} | {b"content-length"}
+        headers = []
+        vary = b"Accept-Encoding"
+        for name, value in self.start.get("headers", []):
+            lowered = name.lower()
+            if lowered in replaced:
+                continue
+            if lowered == b"vary":
+                vary = value + b", " + vary
+            elif lowered == b"etag":
+                value = encoded_etag(value.decode("latin-1"), self.encoding).encode("latin-1")
+            headers.append((name, value))
+        headers.extend(extra)
+        headers.append((b"vary", vary))
+        await self.send({**self.start, "headers": headers})
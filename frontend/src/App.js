@@ -48,6 +48,25 @@ const api = {
     return response.json();
   },
 
+  // Book, rating summary and newest reviews in one request
+  async getBook(bookId, reviewLimit = 100) {
+    const response = await fetch(
+      `${API_BASE_URL}/books/${bookId}?review_limit=${reviewLimit}`
+    );
+    if (!response.ok) throw new Error("Failed to fetch book");
+    return response.json();
+  },
+
+  // Ranked full-text search; pass an AbortSignal to cancel superseded queries
+  async searchBooks(query, limit = 50, signal) {
+    const response = await fetch(
+      `${API_BASE_URL}/search?q=${encodeURIComponent(query)}&limit=${limit}`,
+      { signal }
+    );
+    if (!response.ok) throw new Error("Failed to search books");
+    return response.json();
+  },
+
   async getBookReviews(bookId, skip = 0, limit = 100) {
     const response = await fetch(
       `${API_BASE_URL}/books/${bookId}/reviews?skip=${skip}&limit=${limit}`
@@ -624,6 +643,7 @@ const App = () => {
   const [books, setBooks] = useState([]);
   const [loading, setLoading] = useState(true);
   const [searchTerm, setSearchTerm] = useState("");
+  const [searchResults, setSearchResults] = useState([]);
   const [showAddBookModal, setShowAddBookModal] = useState(false);
   const [showAddReviewModal, setShowAddReviewModal] = useState(false);
   const [showReviewsModal, setShowReviewsModal] = useState(false);
@@ -710,8 +730,10 @@ const App = () => {
     setReviewsLoading(true);
 
     try {
-      const reviewsData = await api.getBookReviews(book.id);
-      setReviews(reviewsData);
+      // One request refreshes the book's rating summary and loads its reviews
+      const detail = await api.getBook(book.id);
+      setSelectedBook(detail);
+      setReviews(detail.reviews);
     } catch (err) {
   setError("Failed to load reviews");
   setTimeout(() => setError(""), 3000);
@@ -754,12 +776,30 @@ const App = () => {
     }
   };
 
-  // Filter books based on search term
-  const filteredBooks = books.filter(
-    (book) =>
-      book.title.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      book.author.toLowerCase().includes(searchTerm.toLowerCase())
-  );
+  // Search on the server (ranked, indexed) instead of filtering the full list
+  useEffect(() => {
+    const query = searchTerm.trim();
+    if (!query) {
+      setSearchResults([]);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        setSearchResults(await api.searchBooks(query, 50, controller.signal));
+      } catch (err) {
+        if (err.name !== "AbortError") {
+          console.error("Search failed:", err);
+        }
+      }
+    }, 250);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [searchTerm]);
+
+  const filteredBooks = searchTerm.trim() ? searchResults : books;
 
   return (
     <div className="min-h-screen bg-gradient-to-br from-blue-50 via-white to-purple-50">
@@ -1,17 +1,35 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+import time
+IMPORT_STARTED = time.perf_counter()  # before the framework imports, for the startup breakdown
+
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional
 import logging
 from contextlib import asynccontextmanager
 
-from database import get_db, engine, Base
+from database import STARTUP_MODE, get_db, async_engine, engine, Base, AsyncSessionLocal, SchemaOutOfDateError, check_schema_revision
 from models import Book, Review
-from schemas import BookCreate, BookResponse, ReviewCreate, ReviewResponse
+from schemas import BookCreate, BookDetailResponse, BookResponse, BookStatsResponse, BulkResult, ReviewCreate, ReviewQueued, ReviewResponse, TopBookResponse
 from services.book_service import BookService
 from services.review_service import ReviewService
-from services.cache_service import CacheService
-from auth import auth_router
+from services.review_queue import REVIEW_QUEUE_SIZE, ReviewQueueFull, ReviewWriteQueue
+from services.stats_service import StatsService
+from services.search_service import SearchService
+from services.leaderboard_service import LeaderboardService
+from services.book_index import book_index
+from services.cache_warmer import CacheWarmer
+from services.export_service import ExportService, EXPORT_FORMATS
+from services.cache_service import CacheService, create_redis_client, close_redis_client
+from services.pagination import InvalidCursorError
+from services.bulk import InvalidPayloadError, iter_request_items
+from services.batch import InvalidBatchError, parse_ids
+from auth import CurrentUser, auth_router, get_current_user, shutdown_hash_executor
+from admission import AdmissionMiddleware
+from compression import CompressionMiddleware
+from monitoring import PrometheusMiddleware, StartupTimer, instrument_engine, metrics_response
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -20,10 +38,52 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events"""
-    logger.info("🚀 Starting up Book Review Service...")
-    Base.metadata.create_all(bind=engine)
+    logger.info(f"🚀 Starting up Book Review Service ({STARTUP_MODE} mode)...")
+    startup = StartupTimer()
+    startup.record("import", IMPORT_SECONDS)
+    started = time.perf_counter()
+    with startup.phase("schema"):
+        if STARTUP_MODE == "production":
+            # Migrations ran before the deploy; only confirm they did
+            try:
+                revision = await check_schema_revision()
+            except SchemaOutOfDateError:
+                # Close pooled connections so the process can exit
+                await async_engine.dispose()
+                raise
+            logger.info(f"✅ Database schema at Alembic head {revision}")
+        else:
+            async with async_engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+    with startup.phase("cache"):
+        redis_client = await create_redis_client()
+        app.state.cache = CacheService(redis_client)
+        await app.state.cache.start()
+    with startup.phase("indexes"):
+        async with AsyncSessionLocal() as db:
+            await LeaderboardService(db, app.state.cache).ensure_built()
+            await book_index.rebuild(db)
+    with startup.phase("warmup"):
+        # Refill the hottest pages before traffic finds them cold
+        warmer = CacheWarmer(AsyncSessionLocal, app.state.cache)
+        warmer.start()
+        await warmer.warm_hot_keys()
+    app.state.review_queue = None
+    if REVIEW_QUEUE_SIZE > 0:
+        app.state.review_queue = ReviewWriteQueue(AsyncSessionLocal, app.state.cache)
+        app.state.review_queue.start()
+    startup.record("total", time.perf_counter() - started)
+    logger.info(f"⏱️ Startup breakdown: {startup.summary()}")
     yield
     logger.info("🛑 Shutting down Book Review Service...")
+    if app.state.review_queue is not None:
+        # Write queued reviews before the cache and engine go away
+        await app.state.review_queue.stop()
+    await warmer.stop()
+    await app.state.cache.stop()
+    await close_redis_client(redis_client)
+    shutdown_hash_executor()
+    await async_engine.dispose()
 
 app = FastAPI(
     title="Book Review Service",
@@ -35,6 +95,9 @@ app = FastAPI(
 # Routers
 app.include_router(auth_router)
 
+# Load shedding - inside CORS so 429/503 responses stay readable by browsers
+app.add_middleware(AdmissionMiddleware)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -42,29 +105,87 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+# gzip/br by Accept-Encoding; cached pages arrive precompressed and pass through
+app.add_middleware(CompressionMiddleware)
+
+# Metrics - outermost so it times the whole stack
+app.add_middleware(PrometheusMiddleware)
+instrument_engine(async_engine.sync_engine)
+instrument_engine(engine)
+
 # Dependency Injection
-def get_book_service(db: Session = Depends(get_db)) -> BookService:
-    cache_service = CacheService()
+def get_cache_service(request: Request) -> CacheService:
+    """Process-wide cache service created in the lifespan hook"""
+    return request.app.state.cache
+
+def get_review_queue(request: Request) -> Optional[ReviewWriteQueue]:
+    """Write-behind review queue, or None when reviews are written synchronously"""
+    return getattr(request.app.state, "review_queue", None)
+
+def get_book_service(
+    db: AsyncSession = Depends(get_db),
+    cache_service: CacheService = Depends(get_cache_service)
+) -> BookService:
     return BookService(db, cache_service)
 
-def get_review_service(db: Session = Depends(get_db)) -> ReviewService:
-    cache_service = CacheService()
+def get_review_service(
+    db: AsyncSession = Depends(get_db),
+    cache_service: CacheService = Depends(get_cache_service)
+) -> ReviewService:
     return ReviewService(db, cache_service)
 
+def get_stats_service(
+    db: AsyncSession = Depends(get_db),
+    cache_service: CacheService = Depends(get_cache_service)
+) -> StatsService:
+    return StatsService(db, cache_service)
+
+def get_leaderboard_service(
+    db: AsyncSession = Depends(get_db),
+    cache_service: CacheService = Depends(get_cache_service)
+) -> LeaderboardService:
+    return LeaderboardService(db, cache_service)
+
+def get_search_service(
+    db: AsyncSession = Depends(get_db),
+    cache_service: CacheService = Depends(get_cache_service)
+) -> SearchService:
+    return SearchService(db, cache_service)
+
 # Routes
 @app.get("/books", response_model=List[BookResponse], tags=["Books"])
 async def list_books(
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    ids: Optional[str] = Query(None, description="Comma-separated book ids to fetch in one request"),
+    if_none_match: Optional[str] = Header(None),
     book_service: BookService = Depends(get_book_service)
 ):
-    """Retrieve all books with caching support"""
+    """Retrieve all books with caching support.
+
+    Pass the ``X-Next-Cursor`` response header back as ``cursor`` to fetch the
+    next page with keyset pagination; ``skip``/``limit`` still work as before.
+    Send the ``ETag`` back as ``If-None-Match`` to get an empty 304 while the
+    list is unchanged. With ``ids=1,2,3`` the listed books are returned in
+    that order instead, and unknown ids are skipped.
+    """
     try:
-        logger.info(f"Fetching books with skip={skip}, limit={limit}")
-        books = await book_service.get_books(skip=skip, limit=limit)
-        return books
+        if ids is not None:
+            logger.info(f"Fetching books by ids={ids}")
+            return (await book_service.get_books_by_ids(parse_ids(ids))).to_response()
+        logger.info(f"Fetching books with skip={skip}, limit={limit}, cursor={cursor}")
+        page = await book_service.get_books(skip=skip, limit=limit, cursor=cursor, if_none_match=if_none_match)
+        # Already-serialised body - bypasses response_model validation and encoding
+        return page.to_response()
+    except (InvalidCursorError, InvalidBatchError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"❌ Error fetching books: {str(e)}")
         raise HTTPException(
@@ -72,11 +193,60 @@ async def list_books(
             detail="Failed to retrieve books"
         )
 
+@app.get("/books/top", response_model=List[TopBookResponse], tags=["Books"])
+async def top_books(
+    by: str = Query("rating", pattern="^(rating|reviews)$"),
+    window: str = Query("all", pattern="^(all|7d|30d)$"),
+    limit: int = Query(10, ge=1, le=100),
+    leaderboard_service: LeaderboardService = Depends(get_leaderboard_service)
+):
+    """Top-rated (Bayesian-smoothed) or most-reviewed books, all time or over the last 7/30 days"""
+    try:
+        logger.info(f"🏆 Fetching top books by={by}, window={window}, limit={limit}")
+        page = await leaderboard_service.get_top_books(by=by, window=window, limit=limit)
+        return page.to_response()
+    except Exception as e:
+        logger.error(f"❌ Error fetching top books: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve top books"
+        )
+
+# Registered after /books/top so "top" is never parsed as a book id
+@app.get("/books/{book_id}", response_model=BookDetailResponse, tags=["Books"])
+async def get_book(
+    book_id: int,
+    review_limit: int = Query(10, ge=1, le=100),
+    if_none_match: Optional[str] = Header(None),
+    book_service: BookService = Depends(get_book_service)
+):
+    """A book with its rating summary and newest reviews in one response.
+
+    Continue with ``/books/{book_id}/reviews?cursor=`` using the
+    ``X-Next-Cursor`` header. Supports If-None-Match like the list endpoints.
+    """
+    try:
+        logger.info(f"📖 Fetching book detail for book_id={book_id}")
+        page = await book_service.get_book_detail(book_id, review_limit=review_limit, if_none_match=if_none_match)
+        return page.to_response()
+    except ValueError as e:
+        logger.warning(f"⚠️ Book detail failed: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"❌ Error fetching book detail: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve book"
+        )
+
 @app.post("/books", response_model=BookResponse, status_code=status.HTTP_201_CREATED, tags=["Books"])
 async def create_book(
     book: BookCreate,
     book_service: BookService = Depends(get_book_service),
-    # current_user: User = Depends(get_current_user)  # Uncomment to enable auth
+    # current_user: CurrentUser = Depends(get_current_user)  # Uncomment to enable auth
 ):
     """Create a new book"""
     try:
@@ -97,18 +267,59 @@ async def create_book(
             detail="Failed to create book"
         )
 
+@app.post("/books/bulk", response_model=BulkResult, tags=["Books"])
+async def bulk_create_books(
+    request: Request,
+    book_service: BookService = Depends(get_book_service)
+):
+    """Create many books from a JSON array or a streamed NDJSON body.
+
+    Items are validated and inserted in chunks; invalid items are reported
+    by their position instead of failing the whole request.
+    """
+    try:
+        logger.info("📚 Bulk creating books")
+        result = await book_service.bulk_create_books(iter_request_items(request))
+        logger.info(f"✅ Bulk book import: {result.inserted} inserted, {result.failed} failed")
+        return result
+    except ValueError as e:
+        logger.warning(f"⚠️ Validation error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"❌ Error bulk creating books: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create books"
+        )
+
 @app.get("/books/{book_id}/reviews", response_model=List[ReviewResponse], tags=["Reviews"])
 async def get_book_reviews(
     book_id: int,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
     review_service: ReviewService = Depends(get_review_service)
 ):
-    """Get all reviews for a specific book"""
+    """Get all reviews for a specific book, newest first.
+
+    Supports keyset pagination through ``cursor`` / ``X-Next-Cursor`` and
+    conditional requests through ``ETag`` / ``If-None-Match``.
+    """
     try:
-        logger.info(f"Fetching reviews for book_id={book_id}")
-        reviews = await review_service.get_reviews_by_book(book_id, skip=skip, limit=limit)
-        return reviews
+        logger.info(f"Fetching reviews for book_id={book_id}, cursor={cursor}")
+        page = await review_service.get_reviews_by_book(
+            book_id, skip=skip, limit=limit, cursor=cursor, if_none_match=if_none_match
+        )
+        return page.to_response()
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except ValueError as e:
         logger.warning(f"⚠️ Book not found: {str(e)}")
         raise HTTPException(
@@ -122,18 +333,37 @@ async def get_book_reviews(
             detail="Failed to retrieve reviews"
         )
 
-@app.post("/books/{book_id}/reviews", response_model=ReviewResponse, status_code=status.HTTP_201_CREATED, tags=["Reviews"])
+@app.post(
+    "/books/{book_id}/reviews", response_model=ReviewResponse, status_code=status.HTTP_201_CREATED, tags=["Reviews"],
+    responses={status.HTTP_202_ACCEPTED: {"model": ReviewQueued, "description": "Queued for write-behind insertion"}},
+)
 async def create_review(
     book_id: int,
     review: ReviewCreate,
-    review_service: ReviewService = Depends(get_review_service)
+    review_service: ReviewService = Depends(get_review_service),
+    review_queue: Optional[ReviewWriteQueue] = Depends(get_review_queue)
 ):
-    """Create a new review for a book"""
+    """Create a new review for a book.
+
+    In write-behind mode (REVIEW_QUEUE_SIZE > 0) the review is queued and
+    acknowledged with 202 and a ticket; it shows up in listings once the next
+    batch is flushed. A full queue answers 429 with Retry-After.
+    """
     try:
         logger.info(f"📝 Creating review for book_id={book_id}, data={review.dict()}")
+        if review_queue is not None:
+            queued = await review_service.queue_review(book_id, review, review_queue)
+            return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=jsonable_encoder(queued))
         new_review = await review_service.create_review(book_id, review)
         logger.info("✅ Review created")
         return new_review
+    except ReviewQueueFull as e:
+        logger.warning("⚠️ Review queue full, asking client to retry")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except ValueError as e:
         logger.warning(f"⚠️ Review creation failed: {str(e)}")
         raise HTTPException(
@@ -147,11 +377,156 @@ async def create_review(
             detail="Failed to create review"
         )
 
+@app.get("/reviews", response_model=Dict[str, List[ReviewResponse]], tags=["Reviews"])
+async def get_reviews_for_books(
+    book_ids: str = Query(..., description="Comma-separated book ids"),
+    per_book: int = Query(5, ge=1, le=100),
+    review_service: ReviewService = Depends(get_review_service)
+):
+    """Newest reviews of several books in one request, keyed by book id.
+
+    Each list is the first page of ``/books/{book_id}/reviews?limit=per_book``.
+    """
+    try:
+        logger.info(f"📚 Fetching reviews for book_ids={book_ids}, per_book={per_book}")
+        page = await review_service.get_reviews_for_books(parse_ids(book_ids), per_book=per_book)
+        return page.to_response()
+    except InvalidBatchError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"❌ Error fetching reviews for books: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve reviews"
+        )
+
+@app.post("/books/{book_id}/reviews/bulk", response_model=BulkResult, tags=["Reviews"])
+async def bulk_create_reviews(
+    book_id: int,
+    request: Request,
+    review_service: ReviewService = Depends(get_review_service)
+):
+    """Create many reviews for a book from a JSON array or a streamed NDJSON body"""
+    try:
+        logger.info(f"📝 Bulk creating reviews for book_id={book_id}")
+        result = await review_service.bulk_create_reviews(book_id, iter_request_items(request))
+        logger.info(f"✅ Bulk review import: {result.inserted} inserted, {result.failed} failed")
+        return result
+    except InvalidPayloadError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except ValueError as e:
+        logger.warning(f"⚠️ Bulk review import failed: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"❌ Error bulk creating reviews: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create reviews"
+        )
+
+@app.get("/books/{book_id}/stats", response_model=BookStatsResponse, tags=["Reviews"])
+async def get_book_stats(
+    book_id: int,
+    stats_service: StatsService = Depends(get_stats_service)
+):
+    """Get review count, average rating and star histogram for a book"""
+    try:
+        logger.info(f"Fetching rating stats for book_id={book_id}")
+        return await stats_service.get_stats(book_id)
+    except ValueError as e:
+        logger.warning(f"⚠️ Book not found: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"❌ Error fetching book stats: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve book stats"
+        )
+
+@app.get("/search", response_model=List[BookResponse], tags=["Books"])
+async def search_books(
+    q: str = Query(..., min_length=1, max_length=200),
+    skip: int = 0,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    include_reviews: bool = False,
+    search_service: SearchService = Depends(get_search_service)
+):
+    """Full-text search over title, author and description, best matches first.
+
+    Set ``include_reviews`` to also match review comments. Pass the
+    ``X-Next-Cursor`` response header back as ``cursor`` for the next page.
+    """
+    try:
+        logger.info(f"🔎 Searching books for q={q!r}, skip={skip}, limit={limit}, include_reviews={include_reviews}")
+        page = await search_service.search_books(
+            q, skip=skip, limit=limit, cursor=cursor, include_reviews=include_reviews
+        )
+        return page.to_response()
+    except ValueError as e:
+        # Invalid cursor or a query with no searchable words
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"❌ Error searching books: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to search books"
+        )
+
+@app.get("/export/books", tags=["Export"])
+async def export_books(
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Stream every book as NDJSON or CSV without caching"""
+    logger.info(f"📤 Exporting books as {fmt}")
+    return StreamingResponse(
+        ExportService(db).export_books(fmt),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename=books.{fmt}"}
+    )
+
+@app.get("/export/reviews", tags=["Export"])
+async def export_reviews(
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    book_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Stream every review (optionally of one book) as NDJSON or CSV without caching"""
+    logger.info(f"📤 Exporting reviews as {fmt}, book_id={book_id}")
+    return StreamingResponse(
+        ExportService(db).export_reviews(fmt, book_id=book_id),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename=reviews.{fmt}"}
+    )
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrics endpoint"""
+    return metrics_response()
+
 @app.get("/health", tags=["Health"])
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "book-review-api"}
 
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+
 # Run the app
 if __name__ == "__main__":
     import uvicorn
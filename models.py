@@ -1,9 +1,14 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Index
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Index, DDL, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from sqlalchemy.dialects import sqlite
 from database import Base
 from sqlalchemy import text
 
+# CURRENT_TIMESTAMP on SQLite has no fractional seconds; bind datetimes in the
+# same format so keyset comparisons on created_at line up with stored values
+Timestamp = DateTime(timezone=True).with_variant(sqlite.DATETIME(truncate_microseconds=True), "sqlite")
+
 class Book(Base):
     __tablename__ = "books"
     
@@ -16,8 +21,17 @@ class Book(Base):
     created_at = Column(DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP'))
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
-    # Relationship
+    # Relationships
     reviews = relationship("Review", back_populates="book", cascade="all, delete-orphan")
+    stats = relationship("BookStats", back_populates="book", uselist=False, lazy="joined", cascade="all, delete-orphan")
+
+    @property
+    def review_count(self) -> int:
+        return self.stats.review_count if self.stats else 0
+
+    @property
+    def average_rating(self):
+        return self.stats.average_rating if self.stats else None
 
 class Review(Base):
     __tablename__ = "reviews"
@@ -27,7 +41,7 @@ class Review(Base):
     reviewer_name = Column(String(255), nullable=False)
     rating = Column(Float, nullable=False)  # 1.0 to 5.0
     comment = Column(Text, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP'))
+    created_at = Column(Timestamp, server_default=text('CURRENT_TIMESTAMP'))
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationship
@@ -37,8 +51,38 @@ class Review(Base):
     __table_args__ = (
         Index('idx_reviews_book_id', 'book_id'),
         Index('idx_reviews_book_rating', 'book_id', 'rating'),
+        # Covers "newest reviews for a book" and keyset pagination on (created_at, id)
+        Index('idx_reviews_book_created', 'book_id', 'created_at', 'id'),
     )
 
+class BookStats(Base):
+    """Per-book rating aggregates, maintained on every review insert"""
+    __tablename__ = "book_stats"
+
+    book_id = Column(Integer, ForeignKey("books.id"), primary_key=True)
+    review_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_sum = Column(Float, nullable=False, default=0.0, server_default="0")
+    # Histogram of ratings rounded to the nearest star
+    rating_1 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_2 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_3 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_4 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_5 = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP'), onupdate=func.now())
+
+    # Relationship
+    book = relationship("Book", back_populates="stats")
+
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return None
+        return round(self.rating_sum / self.review_count, 2)
+
+    @property
+    def histogram(self) -> dict:
+        return {str(star): getattr(self, f"rating_{star}") for star in range(1, 6)}
+
 class User(Base):
     __tablename__ = "users"
 
@@ -46,4 +90,79 @@ class User(Base):
     email = Column(String(255), unique=True, nullable=False, index=True)
     username = Column(String, unique=True, index=True) 
     hashed_password = Column(String(255), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP'))
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP'))
+
+# Full-text search indexes. They are not mapped columns: the database keeps
+# them in step with every INSERT/UPDATE/DELETE (triggers on SQLite, a
+# generated column on Postgres), so single and bulk writes are both covered.
+FTS_TOKENIZER = "porter unicode61 remove_diacritics 2"
+TS_CONFIG = "english"
+
+SQLITE_SEARCH_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+        title, author, description, content='books', content_rowid='id', tokenize='{FTS_TOKENIZER}')""",
+    """CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts(rowid, title, author, description) VALUES (new.id, new.title, new.author, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author, description)
+        VALUES ('delete', old.id, old.title, old.author, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author, description)
+        VALUES ('delete', old.id, old.title, old.author, old.description);
+        INSERT INTO books_fts(rowid, title, author, description) VALUES (new.id, new.title, new.author, new.description);
+    END""",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS reviews_fts USING fts5(
+        comment, content='reviews', content_rowid='id', tokenize='{FTS_TOKENIZER}')""",
+    """CREATE TRIGGER IF NOT EXISTS reviews_fts_ai AFTER INSERT ON reviews BEGIN
+        INSERT INTO reviews_fts(rowid, comment) VALUES (new.id, new.comment);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS reviews_fts_ad AFTER DELETE ON reviews BEGIN
+        INSERT INTO reviews_fts(reviews_fts, rowid, comment) VALUES ('delete', old.id, old.comment);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS reviews_fts_au AFTER UPDATE ON reviews BEGIN
+        INSERT INTO reviews_fts(reviews_fts, rowid, comment) VALUES ('delete', old.id, old.comment);
+        INSERT INTO reviews_fts(rowid, comment) VALUES (new.id, new.comment);
+    END""",
+    # create_all may add the indexes to tables that already have rows
+    "INSERT INTO books_fts(books_fts) VALUES ('rebuild')",
+    "INSERT INTO reviews_fts(reviews_fts) VALUES ('rebuild')",
+]
+SQLITE_SEARCH_DROP_DDL = ["DROP TABLE IF EXISTS books_fts", "DROP TABLE IF EXISTS reviews_fts"]
+
+POSTGRES_SEARCH_DDL = [
+    f"""ALTER TABLE books ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('{TS_CONFIG}', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('{TS_CONFIG}', coalesce(author, '')), 'B') ||
+        setweight(to_tsvector('{TS_CONFIG}', coalesce(description, '')), 'C')) STORED""",
+    "CREATE INDEX IF NOT EXISTS idx_books_search ON books USING GIN (search_vector)",
+    f"""CREATE INDEX IF NOT EXISTS idx_reviews_comment_search ON reviews
+        USING GIN (to_tsvector('{TS_CONFIG}', coalesce(comment, '')))""",
+]
+
+# Same backfill as migration 8b2e4f6a1c3d, for databases created with create_all
+BOOK_STATS_BACKFILL = """
+    INSERT INTO book_stats (book_id, review_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5)
+    SELECT book_id, COUNT(*), SUM(rating),
+           SUM(CASE WHEN rating < 1.5 THEN 1 ELSE 0 END),
+           SUM(CASE WHEN rating >= 1.5 AND rating < 2.5 THEN 1 ELSE 0 END),
+           SUM(CASE WHEN rating >= 2.5 AND rating < 3.5 THEN 1 ELSE 0 END),
+           SUM(CASE WHEN rating >= 3.5 AND rating < 4.5 THEN 1 ELSE 0 END),
+           SUM(CASE WHEN rating >= 4.5 THEN 1 ELSE 0 END)
+    FROM reviews
+    GROUP BY book_id
+"""
+
+@event.listens_for(Base.metadata, "after_create")
+def _backfill_book_stats(target, connection, tables=(), **kw):
+    """Fill book_stats when this create_all made it (``tables`` lists only new tables)"""
+    if BookStats.__table__ in tables:
+        connection.execute(text(BOOK_STATS_BACKFILL))
+for statement in SQLITE_SEARCH_DDL:
+    event.listen(Base.metadata, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in SQLITE_SEARCH_DROP_DDL:
+    # External-content indexes would otherwise outlive their tables
+    event.listen(Base.metadata, "before_drop", DDL(statement).execute_if(dialect="sqlite"))
+for statement in POSTGRES_SEARCH_DDL:
+    event.listen(Base.metadata, "after_create", DDL(statement).execute_if(dialect="postgresql"))
@@ -1,31 +1,172 @@
 import time
 import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
 from functools import wraps
-from prometheus_client import Counter, Histogram, generate_latest
-from fastapi import Request, Response
-from fastapi.responses import PlainTextResponse
+from typing import Dict, Optional
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from fastapi import Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
 
 # Metrics
 REQUEST_COUNT = Counter('http_requests_total', 'Total HTTP requests', ['method', 'endpoint', 'status'])
-REQUEST_DURATION = Histogram('http_request_duration_seconds', 'HTTP request duration')
-CACHE_HITS = Counter('cache_hits_total', 'Total cache hits')
-CACHE_MISSES = Counter('cache_misses_total', 'Total cache misses')
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'HTTP request duration', ['method', 'endpoint', 'status'],
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30),
+)
+CACHE_HITS = Counter('cache_hits_total', 'Total cache hits', ['tier', 'family'])
+CACHE_MISSES = Counter('cache_misses_total', 'Total cache misses', ['family'])
+CACHE_ERRORS = Counter('cache_errors_total', 'Total cache errors', ['operation'])
+CACHE_WARMUPS = Counter('cache_warmups_total', 'Hot cache keys reloaded in the background', ['family', 'result'])
+DB_QUERY_DURATION = Histogram(
+    'db_query_duration_seconds', 'Duration of individual SQL statements', ['operation'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 5),
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    'db_queries_per_request', 'SQL statements executed per HTTP request', ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100),
+)
+DB_TIME_PER_REQUEST = Histogram(
+    'db_time_per_request_seconds', 'Time spent in SQL per HTTP request', ['endpoint'],
+    buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 5),
+)
+FUNCTION_DURATION = Histogram('function_duration_seconds', 'Duration of instrumented functions', ['function'])
+DB_POOL_CHECKOUT = Histogram(
+    'db_pool_checkout_seconds', 'Time to check a connection out of the pool, including waiting for a free one', ['pool'],
+    buckets=(.0001, .0005, .001, .005, .01, .05, .1, .5, 1, 5, 30),
+)
+DB_POOL_TIMEOUTS = Counter('db_pool_timeouts_total', 'Checkouts that gave up waiting for a free connection', ['pool'])
+DB_POOL_CHECKED_OUT = Gauge('db_pool_checked_out', 'Connections currently checked out of the pool', ['pool'])
+BOOK_EXISTS_LOOKUPS = Counter('book_exists_lookups_total', 'Book existence checks by where they were answered', ['source'])
+REVIEW_QUEUE_DEPTH = Gauge('review_queue_depth', 'Reviews waiting in the write-behind queue')
+REVIEW_QUEUE_REJECTED = Counter('review_queue_rejected_total', 'Reviews refused because the write-behind queue was full')
+REVIEW_QUEUE_FAILED = Counter('review_queue_failed_total', 'Queued reviews that could not be written')
+REVIEW_BATCH_SIZE = Histogram(
+    'review_batch_size', 'Reviews written per write-behind transaction',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+ADMISSION_REJECTED = Counter('admission_rejected_total', 'Requests shed by admission control', ['route_class', 'reason'])
+ADMISSION_LIMIT = Gauge('admission_concurrency_limit', 'Adaptive concurrency limit per route class', ['route_class'])
+ADMISSION_IN_FLIGHT = Gauge('admission_in_flight', 'Admitted requests still being served', ['route_class'])
+STARTUP_PHASE_SECONDS = Gauge('app_startup_phase_seconds', 'Seconds spent in each startup phase', ['phase'])
+
+class QueryStats:
+    """SQL statements executed on behalf of the current request"""
+
+    __slots__ = ("count", "duration")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+def key_family(key: str) -> str:
+    """Low-cardinality label for a cache key, e.g. ``books:list`` or ``reviews:book``"""
+    return ":".join(key.split(":", 2)[:2])
 
 def track_performance(func):
     """Decorator to track function performance"""
+    name = func.__qualname__
+
     @wraps(func)
     async def wrapper(*args, **kwargs):
-        start_time = time.time()
+        start_time = time.perf_counter()
         try:
             result = await func(*args, **kwargs)
             return result
         finally:
-            duration = time.time() - start_time
-            REQUEST_DURATION.observe(duration)
+            duration = time.perf_counter() - start_time
+            FUNCTION_DURATION.labels(function=name).observe(duration)
     return wrapper
 
-# Add to main.py for metrics endpoint
-@app.get("/metrics")
-async def get_metrics():
-    """Prometheus metrics endpoint"""
-    return PlainTextResponse(generate_latest())
\ No newline at end of file
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("query_start_time")
+    if not start_times:
+        return
+    duration = time.perf_counter() - start_times.pop()
+    operation = statement.lstrip().split(" ", 1)[0].upper() or "OTHER"
+    DB_QUERY_DURATION.labels(operation=operation).observe(duration)
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.duration += duration
+
+def instrument_engine(engine: Engine) -> None:
+    """Record per-statement and per-request SQL timings for an engine.
+
+    For an AsyncEngine pass ``async_engine.sync_engine``.
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+class StartupTimer:
+    """Per-phase breakdown of application startup, exported as gauges"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    def record(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = seconds
+        STARTUP_PHASE_SECONDS.labels(phase=phase).set(seconds)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def summary(self) -> str:
+        return ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.phases.items())
+
+class PrometheusMiddleware:
+    """ASGI middleware recording per-route, per-status latency and SQL usage.
+
+    Routes are labelled by their path template (``/books/{book_id}/reviews``),
+    never by the raw path, to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start_time
+            _query_stats.reset(token)
+            route = scope.get("route")
+            endpoint = getattr(route, "path", "unmatched")
+            labels = {"method": scope["method"], "endpoint": endpoint, "status": str(status_code)}
+            REQUEST_COUNT.labels(**labels).inc()
+            REQUEST_DURATION.labels(**labels).observe(duration)
+            DB_QUERIES_PER_REQUEST.labels(endpoint=endpoint).observe(stats.count)
+            DB_TIME_PER_REQUEST.labels(endpoint=endpoint).observe(stats.duration)
+
+def metrics_response() -> Response:
+    """Prometheus exposition of every registered metric"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field, EmailStr, validator
+from pydantic import BaseModel, Field, EmailStr, TypeAdapter, validator
 from datetime import datetime
-from typing import Optional, List
+from typing import ClassVar, Dict, Optional, List
 
 # -------------------------------
 # 📘 Book Schemas
@@ -19,6 +19,8 @@ class BookResponse(BookBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime]
+    review_count: Optional[int] = None
+    average_rating: Optional[float] = None
 
     class Config:
         from_attributes = True
@@ -27,6 +29,21 @@ class BookResponse(BookBase):
             "from_attributes": True
         }
 
+class BookStatsResponse(BaseModel):
+    book_id: int
+    review_count: int = 0
+    average_rating: Optional[float] = None
+    rating_histogram: Dict[str, int] = Field(default_factory=lambda: {str(star): 0 for star in range(1, 6)})
+
+BookListAdapter = TypeAdapter(List[BookResponse])
+
+class TopBookResponse(BookResponse):
+    # Bayesian-smoothed rating, or the review count when ranking by reviews
+    score: float
+    window_review_count: int
+
+TopBookListAdapter = TypeAdapter(List[TopBookResponse])
+
 # -------------------------------
 # ✍️ Review Schemas
 # -------------------------------
@@ -47,6 +64,40 @@ class ReviewResponse(ReviewBase):
     class Config:
         from_attributes = True
 
+ReviewListAdapter = TypeAdapter(List[ReviewResponse])
+
+class BookDetailResponse(BookResponse):
+    """A book page: the book, its rating summary and its newest reviews"""
+    stats: BookStatsResponse
+    reviews: List[ReviewResponse]
+
+class ReviewQueued(BaseModel):
+    """Acknowledgement for a review accepted by the write-behind queue"""
+    ticket: str
+    book_id: int
+    status: str = "queued"
+    accepted_at: datetime
+
+# -------------------------------
+# 📦 Bulk Ingestion Schemas
+# -------------------------------
+class BulkError(BaseModel):
+    index: int
+    error: str
+
+class BulkResult(BaseModel):
+    inserted: int = 0
+    failed: int = 0
+    errors: List[BulkError] = []
+
+    # Only the first errors are reported; ``failed`` still counts all of them
+    max_errors: ClassVar[int] = 100
+
+    def add_error(self, index: int, error: str) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append(BulkError(index=index, error=error))
+
 # -------------------------------
 # 🔐 Auth Schemas
 # -------------------------------
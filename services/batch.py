@@ -0,0 +1,33 @@
+"""Helpers for the batch read endpoints (``GET /books?ids=`` and ``GET /reviews?book_ids=``).
+
+Each item has its own cache entry holding its serialised JSON, so a batch
+response is assembled by joining bytes and never re-encoded.
+"""
+import os
+from typing import Iterable, List, Tuple
+
+# Most ids one batch request may name
+MAX_BATCH_IDS = int(os.getenv("MAX_BATCH_IDS", "100"))
+
+class InvalidBatchError(ValueError):
+    """Raised when a batch id list is malformed or too long"""
+
+def parse_ids(raw: str, max_ids: int = MAX_BATCH_IDS) -> List[int]:
+    """Parse "1,2,3" into distinct ids, keeping the requested order"""
+    try:
+        ids = [int(part) for part in raw.split(",") if part.strip()]
+    except ValueError:
+        raise InvalidBatchError("ids must be a comma-separated list of integers")
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise InvalidBatchError("At least one id is required")
+    if len(ids) > max_ids:
+        raise InvalidBatchError(f"At most {max_ids} ids per request")
+    return ids
+
+def json_array(items: Iterable[bytes]) -> bytes:
+    return b"[" + b",".join(items) + b"]"
+
+def json_object(items: Iterable[Tuple[str, bytes]]) -> bytes:
+    """Join already-encoded values under plain (escape-free) keys such as ids"""
+    return b"{" + b",".join(b'"%s":%s' % (key.encode(), value) for key, value in items) + b"}"
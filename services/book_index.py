@@ -0,0 +1,130 @@
+"""In-process answer to "does book N exist?" without a database query.
+
+Book ids are dense integers and books are never deleted, so a bitmap (one
+bit per id) is exact for every id it contains. It is rebuilt at startup and
+updated by create_book and bulk imports; ids it does not know yet (created
+by another worker) fall back to the database once and are added.
+
+The bitmap also answers "no" for ids up to ``complete_up_to``, the highest
+id below which it is known to hold every book. A scan that sees max id M
+only proves that once inserts allocated below M have had BOOK_INDEX_SETTLE
+seconds to commit, so the mark advances to M on the first scan at least
+that long after the one that saw it. Scans read only the ids above the mark
+and run at most every BOOK_INDEX_REFRESH_INTERVAL seconds, when a lookup
+misses the bitmap. A scraper walking ids below the mark never reaches the
+database.
+
+Unknown ids above the mark are looked up once and, if missing, remembered
+for BOOK_MISSING_TTL seconds in their own namespace. Only book creation
+bumps it, so review traffic leaves the cached 404s alone and a new book
+never answers 404.
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import Optional, Tuple
+import logging
+import os
+import time
+
+from models import Book
+from monitoring import BOOK_EXISTS_LOOKUPS
+from services.cache_service import CacheService, BOOKS_MISSING_NAMESPACE
+
+logger = logging.getLogger(__name__)
+
+BOOK_MISSING_TTL = int(os.getenv("BOOK_MISSING_TTL", "30"))
+# Longest an insert may take to commit after a higher id became visible
+BOOK_INDEX_SETTLE = float(os.getenv("BOOK_INDEX_SETTLE", "30"))
+BOOK_INDEX_REFRESH_INTERVAL = float(os.getenv("BOOK_INDEX_REFRESH_INTERVAL", "10"))
+
+class BookIndex:
+    """Bitmap of known book ids"""
+
+    def __init__(self, settle: float = BOOK_INDEX_SETTLE, refresh_interval: float = BOOK_INDEX_REFRESH_INTERVAL):
+        self.settle = settle
+        self.refresh_interval = refresh_interval
+        self.clear()
+
+    def add(self, book_id: int) -> None:
+        if book_id < 0:
+            return
+        byte = book_id >> 3
+        if byte >= len(self._bits):
+            # Grow geometrically so sequential creates stay O(1) amortised
+            self._bits.extend(bytes(max(byte + 1 - len(self._bits), len(self._bits))))
+        self._bits[byte] |= 1 << (book_id & 7)
+
+    def __contains__(self, book_id: int) -> bool:
+        byte = book_id >> 3
+        return 0 <= byte < len(self._bits) and bool(self._bits[byte] & (1 << (book_id & 7)))
+
+    def __len__(self) -> int:
+        return sum(byte.bit_count() for byte in self._bits)
+
+    def clear(self) -> None:
+        self._bits = bytearray()
+        self.complete_up_to = 0
+        # (when, max id) of the newest scan not yet old enough to trust
+        self._unsettled: Optional[Tuple[float, int]] = None
+        self._next_refresh = 0.0
+
+    def known_missing(self, book_id: int) -> bool:
+        """True if the book certainly does not exist"""
+        return book_id <= self.complete_up_to and book_id not in self
+
+    def refresh_due(self) -> bool:
+        return time.monotonic() >= self._next_refresh
+
+    async def refresh(self, db: AsyncSession) -> int:
+        """Load the ids above ``complete_up_to`` and advance it; returns how many were read"""
+        now = time.monotonic()
+        self._next_refresh = now + self.refresh_interval
+        ids = (await db.scalars(select(Book.id).where(Book.id > self.complete_up_to))).all()
+        for book_id in ids:
+            self.add(book_id)
+        if self._unsettled is not None and now - self._unsettled[0] >= self.settle:
+            # Everything allocated below that scan's max id has committed by now, and this scan read it
+            self.complete_up_to = max(self.complete_up_to, self._unsettled[1])
+            self._unsettled = None
+        if self._unsettled is None:
+            self._unsettled = (now, max(ids, default=self.complete_up_to))
+        return len(ids)
+
+    async def rebuild(self, db: AsyncSession) -> int:
+        """Load every book id; returns how many were indexed"""
+        index = BookIndex(self.settle, self.refresh_interval)
+        await index.refresh(db)
+        self.__dict__.update(index.__dict__)
+        count = len(self)
+        logger.info(f"✅ Book index built with {count} books")
+        return count
+
+book_index = BookIndex()
+
+async def book_exists(db: AsyncSession, cache: CacheService, book_id: int) -> bool:
+    """Bitmap first, then the negative cache, then one primary-key lookup"""
+    if book_id in book_index:
+        BOOK_EXISTS_LOOKUPS.labels(source="index").inc()
+        return True
+    if book_index.known_missing(book_id):
+        BOOK_EXISTS_LOOKUPS.labels(source="index").inc()
+        return False
+
+    missing_key = await cache.namespaced_key(BOOKS_MISSING_NAMESPACE, str(book_id))
+    if await cache.get(missing_key):
+        BOOK_EXISTS_LOOKUPS.labels(source="negative_cache").inc()
+        return False
+
+    if book_index.refresh_due():
+        # One range scan answers this id and moves the complete range up
+        BOOK_EXISTS_LOOKUPS.labels(source="refresh").inc()
+        await book_index.refresh(db)
+        exists = book_id in book_index
+    else:
+        BOOK_EXISTS_LOOKUPS.labels(source="database").inc()
+        exists = await db.scalar(select(Book.id).where(Book.id == book_id)) is not None
+    if not exists:
+        await cache.set(missing_key, True, ttl=BOOK_MISSING_TTL)
+        return False
+    book_index.add(book_id)
+    return True
@@ -1,58 +1,230 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
-import json
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
 
-from models import Book
-from schemas import BookCreate, BookResponse
-from services.cache_service import CacheService
+from models import Book, BookStats, Review
+from schemas import BookCreate, BookDetailResponse, BookResponse, BookListAdapter, BulkResult, ReviewResponse
+from monitoring import track_performance
+from services.cache_service import CacheService, CachedResponse, RawCodec, ResponseCodec, BOOKS_LIST_NAMESPACE, BOOKS_MISSING_NAMESPACE, reviews_namespace
+from services.batch import json_array
+from services.stats_service import book_stats
+from services.book_index import book_index
+from services.bulk import BULK_CHUNK_SIZE, chunked, validate_item
+from services.pagination import book_cursor, decode_cursor, id_page, page_cursor, page_ids, review_cursor
 
 class BookService:
-    def __init__(self, db: Session, cache_service: CacheService):
+    def __init__(self, db: AsyncSession, cache_service: CacheService):
         self.db = db
         self.cache = cache_service
     
-    async def get_books(self, skip: int = 0, limit: int = 100) -> List[BookResponse]:
-        """Get books with caching - cache first, then database"""
-        cache_key = f"books:list:{skip}:{limit}"
+    @track_performance
+    async def get_books(
+        self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, if_none_match: Optional[str] = None
+    ) -> CachedResponse:
+        """Get books with caching - cache first, then database.
+
+        Pages are ordered by id. When ``cursor`` is given the page starts right
+        after the cursor position (keyset pagination) and ``skip`` is ignored.
+        The page caches only its book ids; the bodies come from the per-book
+        entries (see get_books_by_ids), so reviews never invalidate the page.
+        A matching ``if_none_match`` gets a 304.
+        """
+        cache_key = await self.cache.namespaced_key(
+            BOOKS_LIST_NAMESPACE, f"c{cursor}:{limit}" if cursor else f"{skip}:{limit}"
+        )
         
-        # Try cache first
-        cached_books = await self.cache.get(cache_key)
-        if cached_books:
-            return [BookResponse(**book) for book in cached_books]
+        # Cache first; concurrent misses share a single database load
+        page = await self.cache.get_or_load(
+            cache_key, lambda: self._load_books_page(skip, limit, cursor), codec=ResponseCodec
+        )
+        return await self.listing_response(cache_key, page, if_none_match)
+    
+    async def _load_books_page(self, skip: int, limit: int, cursor: Optional[str]) -> CachedResponse:
+        """Fetch one page of books from the database (one extra row tells us if there is a next page)"""
+        query = select(Book).order_by(Book.id).limit(limit + 1)
+        if cursor:
+            query = query.where(Book.id > decode_cursor(cursor)["id"])
+        else:
+            query = query.offset(skip)
+        result = await self.db.execute(query)
+        books = result.scalars().all()
+        await self.cache_books(books[:limit])
+        return id_page(books[:limit], page_cursor(books, limit, lambda book: book_cursor(book.id)))
+    
+    async def listing_response(
+        self, cache_key: str, page: CachedResponse, if_none_match: Optional[str] = None
+    ) -> CachedResponse:
+        """Fill a cached id page (see pagination.id_page) with the current book bodies.
+
+        The ETag is derived from the assembled body, so a review that changes
+        a listed book's rating summary changes the page's tag as well.
+        """
+        books = await self.get_books_by_ids(page_ids(page))
+        return self.cache.assembled_response(cache_key, books.with_headers(page.headers), if_none_match)
+    
+    @track_performance
+    async def get_books_by_ids(self, book_ids: List[int]) -> CachedResponse:
+        """Books in the requested order; unknown ids are left out.
+
+        Each book is cached on its own in its reviews namespace (its rating
+        summary changes with every review). Hits come from one MGET, misses
+        from one IN query, and the misses are backfilled in one pipeline.
+        """
+        if not book_ids:
+            return CachedResponse(body=b"[]")
+        keys = await self._book_keys(book_ids)
+        cached = await self.cache.get_many(keys.values(), codec=RawCodec)
+        bodies = {book_id: cached[key] for book_id, key in keys.items() if key in cached}
         
-        # Cache miss - fetch from database
-        books = self.db.query(Book).offset(skip).limit(limit).all()
-        book_responses = [BookResponse.model_validate(book) for book in books]
+        misses = [book_id for book_id in book_ids if book_id not in bodies]
+        if misses:
+            books = (await self.db.scalars(select(Book).where(Book.id.in_(misses)))).all()
+            bodies.update(await self.cache_books(books, keys))
         
-        # Update cache (fire and forget)
-        books_dict = [book.model_dump() for book in book_responses]
-        await self.cache.set(cache_key, books_dict)
+        return CachedResponse(body=json_array(bodies[book_id] for book_id in book_ids if book_id in bodies))
+    
+    async def cache_books(self, books: Sequence[Book], keys: Optional[Dict[int, str]] = None) -> Dict[int, bytes]:
+        """Store each book's body in its per-book entry; returns the bodies by id"""
+        if not books:
+            return {}
+        keys = keys or await self._book_keys([book.id for book in books])
+        bodies = {book.id: BookResponse.model_validate(book).model_dump_json().encode() for book in books}
+        await self.cache.set_many({keys[book_id]: body for book_id, body in bodies.items()}, codec=RawCodec)
+        return bodies
+    
+    async def _book_keys(self, book_ids: List[int]) -> Dict[int, str]:
+        keys = await self.cache.namespaced_keys([reviews_namespace(book_id) for book_id in book_ids], "book")
+        return {book_id: keys[reviews_namespace(book_id)] for book_id in book_ids}
+    
+    @track_performance
+    async def get_book_detail(
+        self, book_id: int, review_limit: int = 10, if_none_match: Optional[str] = None
+    ) -> CachedResponse:
+        """The book, its rating summary and its newest reviews as one cached body.
+
+        Cached in the book's reviews namespace, so every new review
+        invalidates it together with the review pages and stats. The
+        ``X-Next-Cursor`` header continues at ``/books/{book_id}/reviews``.
+        """
+        cache_key = await self.cache.namespaced_key(reviews_namespace(book_id), f"detail:{review_limit}")
+        return await self.cache.get_or_load_response(
+            cache_key, lambda: self._load_book_detail(book_id, review_limit), if_none_match
+        )
+    
+    async def _load_book_detail(self, book_id: int, review_limit: int) -> CachedResponse:
+        """One round trip: book joined to its stats and to its newest reviews"""
+        newest = (
+            select(Review)
+            .where(Review.book_id == book_id)
+            .order_by(Review.created_at.desc(), Review.id.desc())
+            .limit(review_limit + 1)
+            .subquery()
+        )
+        review = aliased(Review, newest)
+        query = (
+            select(Book, review)
+            .outerjoin(review, review.book_id == Book.id)
+            .where(Book.id == book_id)
+            .order_by(review.created_at.desc(), review.id.desc())
+        )
+        rows = (await self.db.execute(query)).all()
+        if not rows:
+            raise ValueError(f"Book with id {book_id} not found")
         
-        return book_responses
+        book = rows[0][0]
+        reviews = [row[1] for row in rows if row[1] is not None]
+        detail = BookDetailResponse(
+            **BookResponse.model_validate(book).model_dump(),
+            stats=book_stats(book),
+            reviews=[ReviewResponse.model_validate(r) for r in reviews[:review_limit]],
+        )
+        next_cursor = page_cursor(reviews, review_limit, lambda r: review_cursor(r.created_at, r.id))
+        return CachedResponse(
+            body=detail.model_dump_json().encode(),
+            headers={"X-Next-Cursor": next_cursor} if next_cursor else {},
+        )
     
+    @track_performance
     async def create_book(self, book_data: BookCreate) -> BookResponse:
         """Create a new book and invalidate cache"""
         # Check for duplicate ISBN if provided
         if book_data.isbn:
-            existing = self.db.query(Book).filter(Book.isbn == book_data.isbn).first()
+            existing = await self.db.scalar(select(Book).where(Book.isbn == book_data.isbn).limit(1))
             if existing:
                 raise ValueError(f"Book with ISBN {book_data.isbn} already exists")
         
-        # Create book
-        db_book = Book(**book_data.dict())
+        # Create book together with its (empty) rating aggregates
+        db_book = Book(**book_data.model_dump(), stats=BookStats())
         self.db.add(db_book)
-        self.db.commit()
-        self.db.refresh(db_book)
+        await self.db.commit()
+        await self.db.refresh(db_book)
+        book_index.add(db_book.id)
         
-        # Invalidate books cache
-        await self.cache.invalidate_pattern("books:list:*")
+        # Invalidate books cache and any cached 404 for the new id
+        await self.cache.bump_generation(BOOKS_LIST_NAMESPACE)
+        await self.cache.bump_generation(BOOKS_MISSING_NAMESPACE)
         
         return BookResponse.model_validate(db_book)
     
+    @track_performance
+    async def bulk_create_books(self, items: AsyncIterator[Any], chunk_size: int = BULK_CHUNK_SIZE) -> BulkResult:
+        """Validate and insert books in chunked transactions.
+
+        Each chunk checks ISBN duplicates with one IN query and inserts the
+        valid rows, then their empty stats rows, with one executemany each.
+        Invalid items are reported and skipped; the list cache is invalidated
+        once for the whole batch.
+        """
+        result = BulkResult()
+        async for chunk in chunked(items, chunk_size):
+            candidates = []
+            for index, item in chunk:
+                book, error = validate_item(BookCreate, item)
+                if error:
+                    result.add_error(index, error)
+                else:
+                    candidates.append((index, book))
+            
+            isbns = [book.isbn for _, book in candidates if book.isbn]
+            existing = set()
+            if isbns:
+                existing = set(await self.db.scalars(select(Book.isbn).where(Book.isbn.in_(isbns))))
+            
+            rows = []
+            for index, book in candidates:
+                if book.isbn and book.isbn in existing:
+                    result.add_error(index, f"Book with ISBN {book.isbn} already exists")
+                    continue
+                if book.isbn:
+                    existing.add(book.isbn)
+                rows.append((index, book.model_dump()))
+            if not rows:
+                continue
+            
+            try:
+                book_ids = list(await self.db.scalars(insert(Book).returning(Book.id), [row for _, row in rows]))
+                # Review writes update the stats row in place, so every book needs one
+                await self.db.execute(insert(BookStats), [{"book_id": book_id} for book_id in book_ids])
+                await self.db.commit()
+                result.inserted += len(rows)
+                for book_id in book_ids:
+                    book_index.add(book_id)
+            except IntegrityError as e:
+                # Lost a race with a concurrent insert of the same ISBN
+                await self.db.rollback()
+                for index, _ in rows:
+                    result.add_error(index, f"Chunk rejected by the database: {e.orig}")
+        
+        if result.inserted:
+            await self.cache.bump_generation(BOOKS_LIST_NAMESPACE)
+            await self.cache.bump_generation(BOOKS_MISSING_NAMESPACE)
+        return result
+    
     async def get_book_by_id(self, book_id: int) -> Book:
         """Get book by ID with validation"""
-        book = self.db.query(Book).filter(Book.id == book_id).first()
+        book = await self.db.get(Book, book_id)
         if not book:
             raise ValueError(f"Book with id {book_id} not found")
         return book
\ No newline at end of file
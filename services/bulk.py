@@ -0,0 +1,78 @@
+import json
+import os
+from typing import Any, AsyncIterator, List, Optional, Tuple, Type
+
+from fastapi import Request
+from pydantic import BaseModel, ValidationError
+
+# Rows inserted per transaction by the bulk endpoints
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines")
+
+class InvalidPayloadError(ValueError):
+    """Raised when a bulk request body is neither a JSON array nor NDJSON"""
+
+class InvalidLine:
+    """Placeholder for an NDJSON line that is not valid JSON"""
+
+    def __init__(self, message: str):
+        self.message = message
+
+async def iter_request_items(request: Request) -> AsyncIterator[Any]:
+    """Yield the items of a bulk request body.
+
+    NDJSON bodies are read incrementally, so memory stays bounded by one
+    chunk; anything else must be a JSON array.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_CONTENT_TYPES:
+        buffer = b""
+        async for data in request.stream():
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield _parse_line(line)
+        if buffer.strip():
+            yield _parse_line(buffer)
+        return
+
+    try:
+        items = json.loads(await request.body())
+    except ValueError:
+        raise InvalidPayloadError("Request body must be a JSON array or NDJSON")
+    if not isinstance(items, list):
+        raise InvalidPayloadError("Request body must be a JSON array or NDJSON")
+    for item in items:
+        yield item
+
+def _parse_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return InvalidLine(f"Invalid JSON: {str(e)}")
+
+async def chunked(items: AsyncIterator[Any], size: int) -> AsyncIterator[List[Tuple[int, Any]]]:
+    """Group items into lists of (index, item) of at most ``size``"""
+    chunk = []
+    index = 0
+    async for item in items:
+        chunk.append((index, item))
+        index += 1
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def validate_item(schema: Type[BaseModel], item: Any) -> Tuple[Optional[BaseModel], Optional[str]]:
+    """Validate one bulk item, returning (model, None) or (None, error message)"""
+    if isinstance(item, InvalidLine):
+        return None, item.message
+    try:
+        return schema.model_validate(item), None
+    except ValidationError as e:
+        return None, "; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'item'}: {error['msg']}" for error in e.errors()
+        )
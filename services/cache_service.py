@@ -1,86 +1,814 @@
-import redis
+import redis.asyncio as redis
+import asyncio
+import hashlib
 import json
 import logging
-from typing import Optional, Any
+import re
+import time
+import weakref
+from collections import Counter, OrderedDict, defaultdict
+from contextvars import ContextVar
+import uuid
+from dataclasses import dataclass, field, replace
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Type, Union
 import os
 
+from fastapi import Response
+
+from monitoring import CACHE_ERRORS, CACHE_HITS, CACHE_MISSES, key_family
+from compression import accepted_encodings, encoded_etag, precompress, strip_etag_encoding
+
 logger = logging.getLogger(__name__)
 
-class CacheService:
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+# Seconds to connect / to wait for a reply. Kept short: a cache that is down
+# or hung must fall back to the database, not stall the request.
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "0.5"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.5"))
+
+# Pub/sub channel carrying "<namespace> <generation>" invalidation messages
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+_MISSING = object()
+
+# Without Redis, generations start from the process start time rather than 0,
+# so a restarted worker never reissues an ETag for different data
+_LOCAL_GENERATION_BASE = time.time_ns() // 1000
+
+# Hot-key tracking: logical keys kept per family, and how fast persisted
+# counts fade (applied on every persist) so yesterday's hits stop counting
+HOT_KEYS_PER_FAMILY = int(os.getenv("HOT_KEYS_PER_FAMILY", "50"))
+HOT_KEYS_DECAY = float(os.getenv("HOT_KEYS_DECAY", "0.8"))
+HOT_KEYS_PREFIX = "cache:hot:"
+
+# False while the cache warmer loads keys, so warming does not count as traffic
+track_access: ContextVar[bool] = ContextVar("track_access", default=True)
+
+# Cross-process single-flight lock; 0 keeps coalescing per process only
+CACHE_LOCK_MS = int(os.getenv("CACHE_LOCK_MS", "0"))
+
+# Delete the lock only if we still own it
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+# Cache namespaces - every key embeds its namespace's generation number, so a
+# namespace is invalidated by bumping that number instead of deleting keys
+BOOKS_LIST_NAMESPACE = "books:list"
+# Cached 404s for unknown book ids; bumped only when books are created
+BOOKS_MISSING_NAMESPACE = "books:missing"
+
+def reviews_namespace(book_id: int) -> str:
+    """Per-book namespace for cached review pages"""
+    return f"reviews:book:{book_id}"
+
+def redis_connection_pool(url: Optional[str] = None) -> redis.ConnectionPool:
+    """Bounded pool that fails fast.
+
+    When Redis refuses connections, or all REDIS_MAX_CONNECTIONS are busy,
+    the command raises at once and the caller treats it as a cache miss.
+    A blocking pool would instead hold every request for its full timeout.
+    """
+    return redis.ConnectionPool.from_url(
+        url or REDIS_URL,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+    )
+
+async def create_redis_client(url: Optional[str] = None) -> Optional[redis.Redis]:
+    """Create the process-wide async Redis client backed by a bounded connection pool.
+
+    Returns None when Redis is unreachable so the app can run without a cache.
+    """
+    pool = redis_connection_pool(url)
+    client = redis.Redis(connection_pool=pool)
+    try:
+        await client.ping()
+        logger.info("Redis connection pool established")
+        return client
+    except Exception as e:
+        logger.warning(f"Redis connection failed: {str(e)}")
+        await client.aclose()
+        await pool.disconnect()
+        return None
+
+async def close_redis_client(client: Optional[redis.Redis]) -> None:
+    """Close the shared Redis client and release its pooled connections"""
+    if client is None:
+        return
+    await client.aclose()
+    await client.connection_pool.disconnect()
+
+class JsonCodec:
+    """Default codec: values are stored in Redis as JSON"""
+
+    @staticmethod
+    def dumps(value: Any) -> bytes:
+        return json.dumps(value, default=str).encode()
+
+    @staticmethod
+    def loads(raw: bytes) -> Any:
+        return json.loads(raw)
+
+class RawCodec:
+    """Values are already-serialised bytes (e.g. one item of a batch response)"""
+
+    @staticmethod
+    def dumps(value: bytes) -> bytes:
+        return value
+
+    @staticmethod
+    def loads(raw: bytes) -> bytes:
+        return raw
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """A fully serialised response body plus the headers that go with it.
+
+    Cache hits return these bytes as-is, skipping validation and encoding.
+    ``encoded`` holds precompressed copies of the body (gzip, br), built once
+    per cache fill and picked per request from Accept-Encoding.
+    """
+    body: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+    media_type: Optional[str] = "application/json"
+    status_code: int = 200
+    encoded: Dict[str, bytes] = field(default_factory=dict)
+
+    @classmethod
+    def not_modified(cls, etag: str) -> "CachedResponse":
+        """Empty 304 answer to a matching If-None-Match"""
+        return cls(body=b"", headers={"ETag": etag, "Cache-Control": "no-cache"}, media_type=None, status_code=304)
+
+    def with_headers(self, headers: Dict[str, str]) -> "CachedResponse":
+        return replace(self, headers={**self.headers, **headers})
+
+    def precompressed(self) -> "CachedResponse":
+        return replace(self, encoded=precompress(self.body, self.media_type))
+
+    def to_response(self) -> Response:
+        body, headers = self.body, self.headers
+        if self.encoded:
+            encoding = next((name for name in accepted_encodings() if name in self.encoded), None)
+            headers = {**headers, "Vary": "Accept-Encoding"}
+            if encoding:
+                body = self.encoded[encoding]
+                headers["Content-Encoding"] = encoding
+                if "ETag" in headers:
+                    headers["ETag"] = encoded_etag(headers["ETag"], encoding)
+        return Response(content=body, status_code=self.status_code, media_type=self.media_type, headers=headers)
+
+class ResponseCodec:
+    """Stores a CachedResponse as one metadata line followed by the raw body
+    and then each precompressed body, with their lengths in the metadata"""
+
+    @staticmethod
+    def dumps(value: CachedResponse) -> bytes:
+        meta = json.dumps({
+            "headers": value.headers,
+            "media_type": value.media_type,
+            "encoded": {name: len(data) for name, data in value.encoded.items()},
+        }).encode()
+        return b"".join([meta, b"\n", value.body, *value.encoded.values()])
+
+    @staticmethod
+    def loads(raw: bytes) -> CachedResponse:
+        meta, _, payload = raw.partition(b"\n")
+        meta = json.loads(meta)
+        lengths = meta.get("encoded", {})
+        end = len(payload) - sum(lengths.values())
+        body, encoded = payload[:end], {}
+        for name, length in lengths.items():
+            encoded[name] = payload[end:end + length]
+            end += length
+        return CachedResponse(body=body, headers=meta["headers"], media_type=meta["media_type"], encoded=encoded)
+
+Codec = Union[Type[JsonCodec], Type[RawCodec], Type[ResponseCodec]]
+
+def etag_for(cache_key: str, body: bytes) -> str:
+    """Strong ETag for ``body`` cached under a generation-stamped cache key.
+
+    The key ties the tag to one page and one generation; the body makes it
+    change whenever a reload produces different content, even on a worker
+    that never saw the generation bump (e.g. one running without Redis).
+    """
+    digest = hashlib.blake2b(cache_key.encode() + b"\0", digest_size=12)
+    digest.update(body)
+    return '"' + digest.hexdigest() + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """The client's tag matching ``etag``, if any.
+
+    If-None-Match uses weak comparison, so a W/ prefix is ignored, and the
+    ETag of any compressed representation matches too.
+    """
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/")
+        if strip_etag_encoding(tag) == etag:
+            return tag
+    return None
+
+class LocalCache:
+    """Bounded in-process LRU cache with per-entry TTL (the L1 tier)"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str, default: Any = _MISSING) -> Any:
+        """Return the cached value, or ``default`` (_MISSING) when absent or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class InvalidationBroker:
+    """In-process fan-out of generation bumps to every CacheService in this process.
+
+    Used on its own when Redis is absent; with Redis, bumps travel over pub/sub.
+    """
+
     def __init__(self):
-        self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+        self._subscribers: "weakref.WeakSet[CacheService]" = weakref.WeakSet()
+
+    def subscribe(self, cache: "CacheService") -> None:
+        self._subscribers.add(cache)
+
+    def publish(self, namespace: str, generation: int) -> None:
+        for cache in list(self._subscribers):
+            cache._apply_generation(namespace, generation)
+
+local_broker = InvalidationBroker()
+
+_GENERATION_SEGMENT = re.compile(r":g\d+:")
+
+def logical_key(key: str) -> str:
+    """Cache key without its generation: the same page across invalidations"""
+    return _GENERATION_SEGMENT.sub(":", key, count=1)
+
+class HotKeyTracker:
+    """Approximate access counts per key family.
+
+    Space-saving style: each family keeps at most 4x ``capacity`` counters and
+    drops all but the top 2x when it fills, so memory stays bounded and the
+    hottest keys survive.
+    """
+
+    def __init__(self, capacity: int = HOT_KEYS_PER_FAMILY):
+        self.capacity = capacity
+        self._counts: Dict[str, Counter] = defaultdict(Counter)
+        # Increments not yet persisted to Redis
+        self._unsaved: Counter = Counter()
+
+    def record(self, key: str, count: int = 1) -> None:
+        logical = logical_key(key)
+        family = key_family(logical)
+        counts = self._counts[family]
+        counts[logical] += count
+        self._unsaved[logical] += count
+        if len(counts) > self.capacity * 4:
+            kept = Counter(dict(counts.most_common(self.capacity * 2)))
+            for dropped in counts.keys() - kept.keys():
+                self._unsaved.pop(dropped, None)
+            self._counts[family] = kept
+
+    def hot(self, prefix: str = "", limit: Optional[int] = None) -> List[str]:
+        """Hottest logical keys starting with ``prefix``, up to ``limit`` per family"""
+        limit = limit or self.capacity
+        keys = []
+        for counts in self._counts.values():
+            keys.extend([key for key, _ in counts.most_common() if key.startswith(prefix)][:limit])
+        return keys
+
+    def take_unsaved(self) -> Counter:
+        unsaved, self._unsaved = self._unsaved, Counter()
+        return unsaved
+
+    def clear(self) -> None:
+        self._counts.clear()
+        self._unsaved.clear()
+
+class CacheService:
+    """Two-tier cache: a bounded in-process L1 in front of the shared Redis L2.
+
+    Every key embeds its namespace generation, so L1 coherence only requires
+    each worker to learn about generation bumps. Bumps are broadcast over the
+    ``cache:invalidate`` Redis channel (or ``local_broker`` without Redis), and
+    cached generations also expire after CACHE_L1_GENERATION_TTL seconds in
+    case a message is lost.
+    """
+
+    def __init__(self, client: Optional[redis.Redis] = None):
         self.default_ttl = int(os.getenv("CACHE_TTL", "300"))  # 5 minutes
-        self._client = None
-        self._is_available = True
-    
+        self.generation_ttl = float(os.getenv("CACHE_L1_GENERATION_TTL", "5"))
+        self.local = LocalCache(
+            max_size=int(os.getenv("CACHE_L1_SIZE", "1024")),
+            ttl=float(os.getenv("CACHE_L1_TTL", "30")),
+        )
+        self._client = client
+        self._is_available = client is not None
+        self._local_generations: Dict[str, int] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.lock_ms = CACHE_LOCK_MS
+        self._listener: Optional[asyncio.Task] = None
+        self.hot_keys = HotKeyTracker()
+        # Called with the namespace after each bump made here (see CacheWarmer)
+        self.on_invalidate: Optional[Callable[[str], None]] = None
+        local_broker.subscribe(self)
+
     @property
-    def client(self):
-        """Lazy Redis client initialization"""
-        if self._client is None:
+    def client(self) -> Optional[redis.Redis]:
+        """Shared Redis client, or None when running without a cache"""
+        return self._client
+
+    async def start(self) -> None:
+        """Start listening for invalidations published by other workers"""
+        if self._is_available and self._listener is None:
+            self._listener = asyncio.create_task(self._listen_for_invalidations())
+
+    async def stop(self) -> None:
+        """Stop the invalidation listener"""
+        if self._listener is not None:
+            self._listener.cancel()
             try:
-                self._client = redis.from_url(self.redis_url, decode_responses=True)
-                # Test connection
-                self._client.ping()
-                self._is_available = True
-                logger.info("Redis connection established")
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen_for_invalidations(self) -> None:
+        while True:
+            try:
+                async with self.client.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    while True:
+                        # An explicit read timeout; an idle channel would trip REDIS_SOCKET_TIMEOUT
+                        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                        if message is None or message["type"] != "message":
+                            continue
+                        namespace, _, generation = message["data"].decode().rpartition(" ")
+                        self._apply_generation(namespace, int(generation))
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.warning(f"Redis connection failed: {str(e)}")
-                self._is_available = False
-                self._client = None
-        return self._client
-    
-    async def get(self, key: str) -> Optional[Any]:
-        """Get value from cache with error handling"""
+                logger.warning(f"Cache invalidation listener error: {str(e)}")
+                CACHE_ERRORS.labels(operation="listen").inc()
+                # Anything cached while disconnected may have missed a bump
+                self.local.clear()
+                await asyncio.sleep(1)
+
+    def _apply_generation(self, namespace: str, generation: int) -> None:
+        """Record a generation bump; keys of older generations stop being read"""
+        key = self._generation_key(namespace)
+        if self._is_available:
+            current = self.local.get(key)
+            if current is _MISSING or current < generation:
+                self.local.set(key, generation, ttl=self.generation_ttl)
+        elif self._local_generations.get(namespace, _LOCAL_GENERATION_BASE) < generation:
+            self._local_generations[namespace] = generation
+
+    async def get(self, key: str, codec: Optional[Codec] = None) -> Optional[Any]:
+        """Get value from cache with error handling - L1 first, then Redis"""
+        codec = codec or JsonCodec
+        family = key_family(key)
+        value = self.local.get(key)
+        if value is not _MISSING:
+            CACHE_HITS.labels(tier="l1", family=family).inc()
+            return value
         if not self._is_available:
+            CACHE_MISSES.labels(family=family).inc()
             return None
-            
+
         try:
-            if self.client:
-                value = self.client.get(key)
-                if value:
-                    return json.loads(value)
+            value = await self.client.get(key)
+            if value:
+                value = codec.loads(value)
+                self.local.set(key, value)
+                CACHE_HITS.labels(tier="redis", family=family).inc()
+                return value
         except Exception as e:
             logger.warning(f"Cache get error for key {key}: {str(e)}")
-            self._is_available = False
+            CACHE_ERRORS.labels(operation="get").inc()
+        CACHE_MISSES.labels(family=family).inc()
         return None
-    
-    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
-        """Set value in cache with error handling"""
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None, codec: Optional[Codec] = None) -> bool:
+        """Set value in both tiers. Returns True when the value reached Redis"""
+        codec = codec or JsonCodec
+        ttl = ttl or self.default_ttl
+        self.local.set(key, value, ttl=min(ttl, self.local.ttl))
         if not self._is_available:
             return False
-            
+
         try:
-            if self.client:
-                ttl = ttl or self.default_ttl
-                result = self.client.setex(key, ttl, json.dumps(value, default=str))
-                return result
+            return bool(await self.client.setex(key, ttl, codec.dumps(value)))
         except Exception as e:
             logger.warning(f"Cache set error for key {key}: {str(e)}")
-            self._is_available = False
+            CACHE_ERRORS.labels(operation="set").inc()
+        return False
+
+    async def get_many(self, keys: Iterable[str], codec: Optional[Codec] = None) -> Dict[str, Any]:
+        """Values of the cached ``keys``: L1 first, then one MGET for the rest"""
+        codec = codec or JsonCodec
+        found: Dict[str, Any] = {}
+        remote = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is _MISSING:
+                remote.append(key)
+            else:
+                found[key] = value
+                CACHE_HITS.labels(tier="l1", family=key_family(key)).inc()
+
+        if remote and self._is_available:
+            try:
+                for key, raw in zip(remote, await self.client.mget(remote)):
+                    if raw:
+                        found[key] = codec.loads(raw)
+                        self.local.set(key, found[key])
+                        CACHE_HITS.labels(tier="redis", family=key_family(key)).inc()
+            except Exception as e:
+                logger.warning(f"Cache mget error for {len(remote)} keys: {str(e)}")
+                CACHE_ERRORS.labels(operation="get").inc()
+        for key in remote:
+            if key not in found:
+                CACHE_MISSES.labels(family=key_family(key)).inc()
+        return found
+
+    async def set_many(self, values: Dict[str, Any], ttl: Optional[int] = None, codec: Optional[Codec] = None) -> bool:
+        """Set several values in both tiers with one pipelined round trip to Redis"""
+        codec = codec or JsonCodec
+        ttl = ttl or self.default_ttl
+        for key, value in values.items():
+            self.local.set(key, value, ttl=min(ttl, self.local.ttl))
+        if not values or not self._is_available:
+            return False
+
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key, value in values.items():
+                    pipe.setex(key, ttl, codec.dumps(value))
+                return all(await pipe.execute())
+        except Exception as e:
+            logger.warning(f"Cache set error for {len(values)} keys: {str(e)}")
+            CACHE_ERRORS.labels(operation="set").inc()
         return False
-    
+
     async def delete(self, key: str) -> bool:
         """Delete key from cache"""
+        self.local.delete(key)
         if not self._is_available:
             return False
-            
+
         try:
-            if self.client:
-                return bool(self.client.delete(key))
+            return bool(await self.client.delete(key))
         except Exception as e:
             logger.warning(f"Cache delete error for key {key}: {str(e)}")
+            CACHE_ERRORS.labels(operation="delete").inc()
         return False
-    
-    async def invalidate_pattern(self, pattern: str) -> int:
-        """Delete all keys matching pattern"""
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[int] = None,
+        codec: Optional[Codec] = None,
+    ) -> Any:
+        """Get a value, running ``loader`` on a miss with single-flight semantics.
+
+        Concurrent misses for the same key in this process share one loader
+        call. With CACHE_LOCK_MS set, a short Redis lock also makes other
+        processes wait for the winner's result instead of loading it again.
+        Every call counts towards the key's hotness (see CacheWarmer).
+        """
+        if track_access.get():
+            self.hot_keys.record(key)
+        while True:
+            value = await self.get(key, codec)
+            if value is not None:
+                return value
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The leading request was cancelled - retry and maybe lead
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        token = None
+        try:
+            token = await self._acquire_lock(key)
+            value = None
+            if token is None:
+                # Another process is loading this key - wait for its result
+                value = await self._wait_for_value(key, codec)
+            if value is None:
+                value = await loader()
+                await self.set(key, value, ttl, codec)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; don't warn if there are none
+            raise
+        finally:
+            self._inflight.pop(key, None)
+            if token:
+                await self._release_lock(key, token)
+
+    async def get_or_load_response(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[CachedResponse]],
+        if_none_match: Optional[str] = None,
+        ttl: Optional[int] = None,
+    ) -> CachedResponse:
+        """get_or_load for cached response bodies, with conditional GET.
+
+        The response carries a strong ETag derived from ``key`` and the body,
+        and its precompressed bodies. When ``if_none_match`` already names the
+        cached page's ETag, a 304 is returned instead - on a hit without
+        calling ``loader``.
+        """
+        async def load() -> CachedResponse:
+            return self.cacheable_response(key, await loader())
+
+        page = await self.get_or_load(key, load, ttl, codec=ResponseCodec)
+        matched = etag_matches(if_none_match, page.headers.get("ETag") or etag_for(key, page.body))
+        if matched:
+            return CachedResponse.not_modified(matched)
+        return page
+
+    @staticmethod
+    def cacheable_response(key: str, page: CachedResponse) -> CachedResponse:
+        """``page`` as stored under ``key``: with its ETag and, once per fill,
+        its compressed bodies. For entries filled outside get_or_load_response."""
+        return page.with_headers({"ETag": etag_for(key, page.body), "Cache-Control": "no-cache"}).precompressed()
+
+    def assembled_response(
+        self, key: str, page: CachedResponse, if_none_match: Optional[str] = None
+    ) -> CachedResponse:
+        """cacheable_response for a page assembled per request from cached parts.
+
+        The compressed bodies are kept in L1 under the page's ETag, so they
+        are built once per distinct content rather than once per request.
+        """
+        etag = etag_for(key, page.body)
+        matched = etag_matches(if_none_match, etag)
+        if matched:
+            return CachedResponse.not_modified(matched)
+        memo_key = f"assembled:{etag}"
+        response = self.local.get(memo_key)
+        if response is _MISSING:
+            response = page.with_headers({"ETag": etag, "Cache-Control": "no-cache"}).precompressed()
+            self.local.set(memo_key, response)
+        return response
+
+    async def _acquire_lock(self, key: str) -> Optional[str]:
+        """Take the cross-process loader lock; returns a token, or None if held elsewhere"""
+        token = uuid.uuid4().hex
+        if not self._is_available or self.lock_ms <= 0:
+            return token
+
+        try:
+            if await self.client.set(f"lock:{key}", token, nx=True, px=self.lock_ms):
+                return token
+            return None
+        except Exception as e:
+            logger.warning(f"Cache lock error for key {key}: {str(e)}")
+            CACHE_ERRORS.labels(operation="lock").inc()
+        return token
+
+    async def _release_lock(self, key: str, token: str) -> None:
+        if not self._is_available or self.lock_ms <= 0:
+            return
+
+        try:
+            await self.client.eval(_RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", token)
+        except Exception as e:
+            logger.warning(f"Cache unlock error for key {key}: {str(e)}")
+            CACHE_ERRORS.labels(operation="unlock").inc()
+
+    async def _wait_for_value(self, key: str, codec: Optional[Codec] = None) -> Optional[Any]:
+        """Poll Redis while another process holds the lock, for at most the lock TTL"""
+        deadline = time.monotonic() + self.lock_ms / 1000
+        interval = max(self.lock_ms / 20000, 0.005)
+        while time.monotonic() < deadline:
+            await asyncio.sleep(interval)
+            value = await self.get(key, codec)
+            if value is not None:
+                return value
+            try:
+                if not await self.client.exists(f"lock:{key}"):
+                    break
+            except Exception:
+                break
+        return None
+
+    @staticmethod
+    def _generation_key(namespace: str) -> str:
+        return f"gen:{namespace}"
+
+    async def get_generation(self, namespace: str) -> int:
+        """Current generation number of a cache namespace"""
+        if not self._is_available:
+            return self._local_generations.get(namespace, _LOCAL_GENERATION_BASE)
+
+        key = self._generation_key(namespace)
+        generation = self.local.get(key)
+        if generation is not _MISSING:
+            return generation
+
+        try:
+            value = await self.client.get(key)
+            if value is None:
+                # Seed from the clock so a lost counter never reuses an old generation
+                await self.client.set(key, time.time_ns() // 1000, nx=True)
+                value = await self.client.get(key)
+            generation = int(value)
+            self.local.set(key, generation, ttl=self.generation_ttl)
+            self._local_generations.pop(namespace, None)
+            return generation
+        except Exception as e:
+            logger.warning(f"Cache generation error for namespace {namespace}: {str(e)}")
+            CACHE_ERRORS.labels(operation="generation").inc()
+        return self._outage_generation(namespace)
+
+    def _outage_generation(self, namespace: str) -> int:
+        """Generation to use while Redis cannot be read.
+
+        Held in ``_local_generations`` as without Redis: stable for the rest of
+        this outage so L1 still works, but seeded from the clock at its start,
+        so pages cached in an earlier outage are never served again.
+        """
+        return self._local_generations.setdefault(namespace, time.time_ns() // 1000)
+
+    async def get_generations(self, namespaces: Iterable[str]) -> Dict[str, int]:
+        """get_generation for many namespaces, with one MGET for those not in L1"""
+        namespaces = list(dict.fromkeys(namespaces))
+        if not self._is_available:
+            return {ns: self._local_generations.get(ns, _LOCAL_GENERATION_BASE) for ns in namespaces}
+
+        generations: Dict[str, int] = {}
+        missing = []
+        for namespace in namespaces:
+            generation = self.local.get(self._generation_key(namespace))
+            if generation is _MISSING:
+                missing.append(namespace)
+            else:
+                generations[namespace] = generation
+        if not missing:
+            return generations
+
+        keys = [self._generation_key(namespace) for namespace in missing]
+        try:
+            values = await self.client.mget(keys)
+            unseeded = [key for key, value in zip(keys, values) if value is None]
+            if unseeded:
+                # Seed from the clock so a lost counter never reuses an old generation
+                seed = time.time_ns() // 1000
+                async with self.client.pipeline(transaction=False) as pipe:
+                    for key in unseeded:
+                        pipe.set(key, seed, nx=True)
+                    pipe.mget(unseeded)
+                    seeded = dict(zip(unseeded, (await pipe.execute())[-1]))
+                values = [seeded.get(key, value) for key, value in zip(keys, values)]
+            for namespace, key, value in zip(missing, keys, values):
+                generations[namespace] = int(value)
+                self.local.set(key, generations[namespace], ttl=self.generation_ttl)
+                self._local_generations.pop(namespace, None)
+        except Exception as e:
+            logger.warning(f"Cache generation error for {len(missing)} namespaces: {str(e)}")
+            CACHE_ERRORS.labels(operation="generation").inc()
+            for namespace in missing:
+                generations.setdefault(namespace, self._outage_generation(namespace))
+        return generations
+
+    async def namespaced_key(self, namespace: str, suffix: str) -> str:
+        """Build a cache key that embeds the namespace's current generation"""
+        generation = await self.get_generation(namespace)
+        return f"{namespace}:g{generation}:{suffix}"
+
+    async def namespaced_keys(self, namespaces: Iterable[str], suffix: str) -> Dict[str, str]:
+        """namespaced_key for many namespaces at once, keyed by namespace"""
+        generations = await self.get_generations(namespaces)
+        return {namespace: f"{namespace}:g{generation}:{suffix}" for namespace, generation in generations.items()}
+
+    async def bump_generation(self, namespace: str) -> int:
+        """Invalidate every key in a namespace with a single INCR.
+
+        Entries of older generations are never read again and age out by TTL.
+        The new generation is applied locally at once and broadcast to the
+        other workers.
+        """
+        if not self._is_available:
+            generation = self._local_generations.get(namespace, _LOCAL_GENERATION_BASE) + 1
+            local_broker.publish(namespace, generation)
+            self._invalidated(namespace)
+            return generation
+
+        try:
+            key = self._generation_key(namespace)
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.set(key, time.time_ns() // 1000, nx=True)
+                pipe.incr(key)
+                _, generation = await pipe.execute()
+            self._apply_generation(namespace, generation)
+            await self.client.publish(INVALIDATION_CHANNEL, f"{namespace} {generation}")
+            self._invalidated(namespace)
+            return generation
+        except Exception as e:
+            logger.warning(f"Cache invalidate error for namespace {namespace}: {str(e)}")
+            CACHE_ERRORS.labels(operation="invalidate").inc()
+        # The bump may not have reached Redis; drop our own copy at least, so
+        # this worker moves to a fresh outage generation (or past its current one)
+        self.local.delete(self._generation_key(namespace))
+        if namespace in self._local_generations:
+            self._local_generations[namespace] += 1
+        return 0
+
+    def _invalidated(self, namespace: str) -> None:
+        if self.on_invalidate is not None:
+            try:
+                self.on_invalidate(namespace)
+            except Exception as e:
+                logger.warning(f"Cache invalidation hook error for namespace {namespace}: {str(e)}")
+
+    async def persist_hot_keys(self) -> None:
+        """Add this worker's new access counts to the shared hot set in Redis.
+
+        One sorted set per family; each persist also decays the scores by
+        HOT_KEYS_DECAY and trims the set, so it follows recent traffic.
+        """
+        unsaved = self.hot_keys.take_unsaved()
+        if not unsaved or not self._is_available:
+            return
+        by_family: Dict[str, Dict[str, int]] = defaultdict(dict)
+        for key, count in unsaved.items():
+            by_family[key_family(key)][key] = count
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for family, counts in by_family.items():
+                    hot_key = f"{HOT_KEYS_PREFIX}{family}"
+                    pipe.zunionstore(hot_key, {hot_key: HOT_KEYS_DECAY})
+                    for key, count in counts.items():
+                        pipe.zincrby(hot_key, count, key)
+                    pipe.zremrangebyrank(hot_key, 0, -self.hot_keys.capacity * 2 - 1)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Cache hot-key persist error: {str(e)}")
+            CACHE_ERRORS.labels(operation="hot_keys").inc()
+
+    async def load_hot_keys(self, limit: int) -> List[str]:
+        """Hottest logical keys per family from the shared hot set, or this process's counts"""
         if not self._is_available:
-            return 0
-            
+            return self.hot_keys.hot(limit=limit)
         try:
-            if self.client:
-                keys = self.client.keys(pattern)
-                if keys:
-                    return self.client.delete(*keys)
+            keys = []
+            async for hot_key in self.client.scan_iter(match=f"{HOT_KEYS_PREFIX}*"):
+                keys.extend(key.decode() for key in await self.client.zrevrange(hot_key, 0, limit - 1))
+            return keys
         except Exception as e:
-            logger.warning(f"Cache invalidate error for pattern {pattern}: {str(e)}")
-        return 0
\ No newline at end of file
+            logger.warning(f"Cache hot-key load error: {str(e)}")
+            CACHE_ERRORS.labels(operation="hot_keys").inc()
+        return self.hot_keys.hot(limit=limit)
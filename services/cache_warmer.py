@@ -0,0 +1,137 @@
+"""Background cache warm-up for the hottest pages.
+
+CacheService counts accesses per logical key (the key without its
+generation, e.g. ``reviews:book:7:0:20``). The warmer reloads the hottest of
+them through the normal service methods:
+
+- at startup, from the hot set persisted in Redis, so a deploy or a Redis
+  restart does not send every first request to the database;
+- right after this worker bumps a namespace, for that namespace's hot keys.
+
+Loads run one at a time at most CACHE_WARMUP_RATE per second, so warming
+never competes with live traffic for the database.
+"""
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from typing import Iterable, List, Optional, Set
+import asyncio
+import logging
+import os
+
+from monitoring import CACHE_WARMUPS
+from services.cache_service import CacheService, BOOKS_LIST_NAMESPACE, track_access
+from services.book_service import BookService
+from services.review_service import ReviewService
+from services.stats_service import StatsService
+from services.leaderboard_service import LeaderboardService
+
+logger = logging.getLogger(__name__)
+
+# Loads per second; 0 disables warm-up
+CACHE_WARMUP_RATE = float(os.getenv("CACHE_WARMUP_RATE", "10"))
+# Hottest keys per family to warm
+CACHE_WARMUP_KEYS = int(os.getenv("CACHE_WARMUP_KEYS", "20"))
+HOT_KEYS_PERSIST_INTERVAL = float(os.getenv("HOT_KEYS_PERSIST_INTERVAL", "60"))
+
+def _page_args(suffix: List[str]) -> Optional[dict]:
+    """skip/limit or cursor/limit from a page key suffix ("0:20" or "c<cursor>:20")"""
+    if len(suffix) != 2 or not suffix[1].isdigit():
+        return None
+    if suffix[0].startswith("c"):
+        return {"cursor": suffix[0][1:], "limit": int(suffix[1])}
+    if suffix[0].isdigit():
+        return {"skip": int(suffix[0]), "limit": int(suffix[1])}
+    return None
+
+class CacheWarmer:
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        cache: CacheService,
+        rate: float = CACHE_WARMUP_RATE,
+        keys_per_family: int = CACHE_WARMUP_KEYS,
+    ):
+        self.session_factory = session_factory
+        self.cache = cache
+        self.rate = rate
+        self.keys_per_family = keys_per_family
+        self.pending: Set[str] = set()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        cache.on_invalidate = self.invalidated
+
+    def start(self) -> None:
+        if self.rate > 0 and not self._tasks:
+            self._tasks = [asyncio.create_task(self._run()), asyncio.create_task(self._persist())]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.cache.persist_hot_keys()
+
+    async def warm_hot_keys(self) -> int:
+        """Queue the persisted hot set; returns how many keys were queued"""
+        if self.rate <= 0:
+            return 0
+        keys = await self.cache.load_hot_keys(self.keys_per_family)
+        self.schedule(keys)
+        logger.info(f"🔥 Warming {len(keys)} hot cache keys")
+        return len(keys)
+
+    def invalidated(self, namespace: str) -> None:
+        """Re-warm the hot keys of a namespace this worker just invalidated"""
+        if self.rate > 0:
+            self.schedule(self.cache.hot_keys.hot(f"{namespace}:", self.keys_per_family))
+
+    def schedule(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            if key not in self.pending:
+                self.pending.add(key)
+                self._queue.put_nowait(key)
+
+    async def _run(self) -> None:
+        track_access.set(False)
+        while True:
+            key = await self._queue.get()
+            self.pending.discard(key)
+            await self.warm(key)
+            await asyncio.sleep(1 / self.rate)
+
+    async def _persist(self) -> None:
+        while True:
+            await asyncio.sleep(HOT_KEYS_PERSIST_INTERVAL)
+            await self.cache.persist_hot_keys()
+
+    async def warm(self, key: str) -> bool:
+        """Load one logical key through its service; False if it is not warmable"""
+        parts = key.split(":")
+        family = ":".join(parts[:2])
+        token = track_access.set(False)
+        try:
+            async with self.session_factory() as db:
+                if family == BOOKS_LIST_NAMESPACE and _page_args(parts[2:]):
+                    await BookService(db, self.cache).get_books(**_page_args(parts[2:]))
+                elif family == "reviews:book" and len(parts) > 3 and parts[2].isdigit():
+                    book_id, suffix = int(parts[2]), parts[3:]
+                    if suffix == ["stats"]:
+                        await StatsService(db, self.cache).get_stats(book_id)
+                    elif suffix[0] == "detail" and suffix[1:] and suffix[1].isdigit():
+                        await BookService(db, self.cache).get_book_detail(book_id, review_limit=int(suffix[1]))
+                    elif _page_args(suffix):
+                        await ReviewService(db, self.cache).get_reviews_by_book(book_id, **_page_args(suffix))
+                    else:
+                        return False
+                elif family == "books:top" and len(parts) == 5 and parts[4].isdigit():
+                    await LeaderboardService(db, self.cache).get_top_books(parts[2], parts[3], int(parts[4]))
+                else:
+                    return False
+            CACHE_WARMUPS.labels(family=family, result="ok").inc()
+            return True
+        except Exception as e:
+            # A key can go stale (e.g. a cursor or a bad id); skip it
+            logger.debug(f"Cache warm-up skipped {key}: {str(e)}")
+            CACHE_WARMUPS.labels(family=family, result="error").inc()
+            return False
+        finally:
+            track_access.reset(token)
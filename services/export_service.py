@@ -0,0 +1,74 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Table, select
+from datetime import datetime
+from typing import AsyncIterator, Optional
+import csv
+import io
+import json
+import logging
+import os
+
+from models import Book, Review
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+class ExportService:
+    """Streams whole tables as NDJSON or CSV in constant memory.
+
+    Rows are read as plain tuples through a server-side cursor
+    (``yield_per``), so neither ORM objects nor Pydantic models are built,
+    and nothing is written to the cache.
+    """
+
+    def __init__(self, db: AsyncSession, batch_size: int = EXPORT_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+
+    def export_books(self, fmt: str) -> AsyncIterator[str]:
+        table = Book.__table__
+        return self._export(table, select(*table.c).order_by(table.c.id), fmt)
+
+    def export_reviews(self, fmt: str, book_id: Optional[int] = None) -> AsyncIterator[str]:
+        table = Review.__table__
+        query = select(*table.c).order_by(table.c.id)
+        if book_id is not None:
+            query = query.where(table.c.book_id == book_id)
+        return self._export(table, query, fmt)
+
+    async def _export(self, table: Table, query, fmt: str) -> AsyncIterator[str]:
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format {fmt}")
+        columns = [column.name for column in table.c]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == "csv" else None
+        if writer:
+            writer.writerow(columns)
+
+        result = await self.db.stream(query.execution_options(yield_per=self.batch_size))
+        async for rows in result.partitions():
+            for row in rows:
+                if writer:
+                    writer.writerow(value.isoformat() if isinstance(value, datetime) else value for value in row)
+                else:
+                    buffer.write(json.dumps(dict(zip(columns, row)), default=_json_default))
+                    buffer.write("\n")
+            # One chunk per batch keeps writes large and memory flat
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
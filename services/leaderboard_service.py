@@ -0,0 +1,286 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+import heapq
+import logging
+import os
+
+import redis.asyncio as redis
+
+from models import Book, BookStats, Review
+from schemas import BookResponse, TopBookListAdapter
+from monitoring import CACHE_ERRORS, track_performance
+from services.cache_service import CacheService, CachedResponse, ResponseCodec
+from services.pagination import page_response
+
+logger = logging.getLogger(__name__)
+
+# Bayesian prior: every book starts with PRIOR_WEIGHT virtual reviews of
+# PRIOR_MEAN stars, so a single 5-star review cannot top the board
+LEADERBOARD_PRIOR_MEAN = float(os.getenv("LEADERBOARD_PRIOR_MEAN", "3.0"))
+LEADERBOARD_PRIOR_WEIGHT = float(os.getenv("LEADERBOARD_PRIOR_WEIGHT", "10"))
+# How long a served leaderboard page and a merged 7d/30d window stay fresh
+LEADERBOARD_CACHE_TTL = int(os.getenv("LEADERBOARD_CACHE_TTL", "30"))
+
+WINDOWS = {"all": None, "7d": 7, "30d": 30}
+RANKINGS = ("rating", "reviews")
+# Daily buckets outlive the longest window by a day
+DAY_BUCKET_TTL = (max(days for days in WINDOWS.values() if days) + 1) * 86400
+
+# (book_id, score, review count in the window)
+Entry = Tuple[int, float, int]
+# (rating, created_at) of reviews to add
+Rating = Tuple[float, Optional[datetime]]
+
+def bayesian_score(review_count: int, rating_sum: float) -> float:
+    """Average rating shrunk towards the prior mean, more strongly for few reviews"""
+    prior = LEADERBOARD_PRIOR_WEIGHT
+    return (prior * LEADERBOARD_PRIOR_MEAN + rating_sum) / (prior + review_count)
+
+def day_bucket(created_at: Optional[datetime]) -> str:
+    """UTC day (YYYYMMDD) a review counts towards; naive datetimes are UTC"""
+    if created_at is None:
+        created_at = datetime.now(timezone.utc)
+    elif created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc)
+    return created_at.strftime("%Y%m%d")
+
+def window_days(window: str, today: Optional[datetime] = None) -> List[str]:
+    """Day buckets covered by a 7d/30d window, today included"""
+    today = today or datetime.now(timezone.utc)
+    return [(today - timedelta(days=offset)).strftime("%Y%m%d") for offset in range(WINDOWS[window])]
+
+def _rank(totals: Dict[int, List[float]], by: str, limit: int) -> List[Entry]:
+    """Top ``limit`` books from {book_id: [count, sum]}"""
+    def score(counts):
+        return counts[0] if by == "reviews" else bayesian_score(*counts)
+    top = heapq.nlargest(limit, totals.items(), key=lambda item: (score(item[1]), -item[0]))
+    return [(book_id, float(score(counts)), int(counts[0])) for book_id, counts in top]
+
+class MemoryLeaderboardStore:
+    """In-process fallback used when Redis is unavailable.
+
+    Holds per-book (count, sum) for all time and per UTC day. Each worker
+    only sees its own writes, so it is rebuilt from the database at startup.
+    """
+
+    def __init__(self):
+        self.totals: Dict[int, List[float]] = defaultdict(lambda: [0, 0.0])
+        self.days: Dict[str, Dict[int, List[float]]] = defaultdict(lambda: defaultdict(lambda: [0, 0.0]))
+
+    async def record(self, book_id: int, ratings: Iterable[Rating]) -> None:
+        for rating, created_at in ratings:
+            for totals in (self.totals[book_id], self.days[day_bucket(created_at)][book_id]):
+                totals[0] += 1
+                totals[1] += rating
+        self._prune()
+
+    async def top(self, by: str, window: str, limit: int) -> List[Entry]:
+        if WINDOWS[window] is None:
+            return _rank(self.totals, by, limit)
+        merged: Dict[int, List[float]] = defaultdict(lambda: [0, 0.0])
+        for day in window_days(window):
+            for book_id, (count, total) in self.days.get(day, {}).items():
+                merged[book_id][0] += count
+                merged[book_id][1] += total
+        return _rank(merged, by, limit)
+
+    async def replace(self, totals: Dict[int, Tuple[int, float]], days: Dict[str, Dict[int, Tuple[int, float]]]) -> None:
+        self.totals.clear()
+        self.days.clear()
+        for book_id, (count, total) in totals.items():
+            self.totals[book_id] = [count, total]
+        for day, books in days.items():
+            for book_id, (count, total) in books.items():
+                self.days[day][book_id] = [count, total]
+        self._prune()
+
+    async def is_empty(self) -> bool:
+        return not self.totals
+
+    def clear(self) -> None:
+        self.totals.clear()
+        self.days.clear()
+
+    def _prune(self) -> None:
+        oldest = (datetime.now(timezone.utc) - timedelta(seconds=DAY_BUCKET_TTL)).strftime("%Y%m%d")
+        for day in [day for day in self.days if day < oldest]:
+            del self.days[day]
+
+class RedisLeaderboardStore:
+    """Sorted sets shared by every worker.
+
+    ``leaderboard:count:<bucket>`` and ``leaderboard:sum:<bucket>`` hold
+    per-book review counts and rating sums for ``all`` and each UTC day;
+    ``leaderboard:rating:all`` holds the smoothed score, updated on write.
+    7d/30d boards are merged from the daily buckets with ZUNIONSTORE and
+    kept for LEADERBOARD_CACHE_TTL seconds.
+    """
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+
+    @staticmethod
+    def _key(kind: str, bucket: str) -> str:
+        return f"leaderboard:{kind}:{bucket}"
+
+    async def record(self, book_id: int, ratings: Iterable[Rating]) -> None:
+        per_day: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+        for rating, created_at in ratings:
+            per_day[day_bucket(created_at)][0] += 1
+            per_day[day_bucket(created_at)][1] += rating
+        count = sum(totals[0] for totals in per_day.values())
+        total = sum(totals[1] for totals in per_day.values())
+        if not count:
+            return
+
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.zincrby(self._key("count", "all"), count, book_id)
+            pipe.zincrby(self._key("sum", "all"), total, book_id)
+            for day, (day_count, day_total) in per_day.items():
+                pipe.zincrby(self._key("count", day), day_count, book_id)
+                pipe.zincrby(self._key("sum", day), day_total, book_id)
+                pipe.expire(self._key("count", day), DAY_BUCKET_TTL)
+                pipe.expire(self._key("sum", day), DAY_BUCKET_TTL)
+            new_count, new_total, *_ = await pipe.execute()
+        # A concurrent write may land between the two round trips; the next
+        # write for this book (or a rebuild) corrects the score
+        await self.client.zadd(self._key("rating", "all"), {book_id: bayesian_score(new_count, new_total)})
+
+    async def top(self, by: str, window: str, limit: int) -> List[Entry]:
+        if WINDOWS[window] is not None:
+            await self._merge_window(window)
+        ranking = self._key("count" if by == "reviews" else "rating", window)
+        top = await self.client.zrevrange(ranking, 0, limit - 1, withscores=True)
+        if not top:
+            return []
+        if by == "reviews":
+            return [(int(book_id), score, int(score)) for book_id, score in top]
+        counts = await self.client.zmscore(self._key("count", window), [book_id for book_id, _ in top])
+        return [(int(book_id), score, int(count or 0)) for (book_id, score), count in zip(top, counts)]
+
+    async def _merge_window(self, window: str) -> None:
+        """Materialise the window's count, sum and rating sets unless still fresh"""
+        rating_key = self._key("rating", window)
+        if await self.client.exists(rating_key):
+            return
+        days = window_days(window)
+        count_key, sum_key = self._key("count", window), self._key("sum", window)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zunionstore(count_key, [self._key("count", day) for day in days])
+            pipe.zunionstore(sum_key, [self._key("sum", day) for day in days])
+            pipe.zrange(count_key, 0, -1, withscores=True)
+            pipe.zrange(sum_key, 0, -1, withscores=True)
+            _, _, counts, sums = await pipe.execute()
+        sums = dict(sums)
+        scores = {book_id: bayesian_score(count, sums.get(book_id, 0.0)) for book_id, count in counts}
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(rating_key)
+            if scores:
+                pipe.zadd(rating_key, scores)
+            for key in (count_key, sum_key, rating_key):
+                pipe.expire(key, LEADERBOARD_CACHE_TTL)
+            await pipe.execute()
+
+    async def replace(self, totals: Dict[int, Tuple[int, float]], days: Dict[str, Dict[int, Tuple[int, float]]]) -> None:
+        stale = [key async for key in self.client.scan_iter(match="leaderboard:*")]
+        async with self.client.pipeline(transaction=True) as pipe:
+            if stale:
+                pipe.delete(*stale)
+            if totals:
+                pipe.zadd(self._key("count", "all"), {book_id: count for book_id, (count, _) in totals.items()})
+                pipe.zadd(self._key("sum", "all"), {book_id: total for book_id, (_, total) in totals.items()})
+                pipe.zadd(self._key("rating", "all"), {
+                    book_id: bayesian_score(count, total) for book_id, (count, total) in totals.items()
+                })
+            for day, books in days.items():
+                pipe.zadd(self._key("count", day), {book_id: count for book_id, (count, _) in books.items()})
+                pipe.zadd(self._key("sum", day), {book_id: total for book_id, (_, total) in books.items()})
+                pipe.expire(self._key("count", day), DAY_BUCKET_TTL)
+                pipe.expire(self._key("sum", day), DAY_BUCKET_TTL)
+            await pipe.execute()
+
+    async def is_empty(self) -> bool:
+        return not await self.client.exists(self._key("count", "all"))
+
+# Shared by every LeaderboardService in this process when Redis is absent
+local_leaderboard = MemoryLeaderboardStore()
+
+class LeaderboardService:
+    """Top-rated and most-reviewed books, maintained incrementally on write"""
+
+    def __init__(self, db: AsyncSession, cache_service: Optional[CacheService] = None):
+        self.db = db
+        self.cache = cache_service
+        client = cache_service.client if cache_service is not None else None
+        self.store = RedisLeaderboardStore(client) if client is not None else local_leaderboard
+
+    async def record_reviews(self, book_id: int, ratings: List[Rating]) -> None:
+        """Add committed reviews to the boards.
+
+        Failures are logged, not raised: the review is already stored and
+        ``python cli.py rebuild-leaderboard`` repairs any drift.
+        """
+        try:
+            await self.store.record(book_id, ratings)
+        except Exception as e:
+            logger.warning(f"Leaderboard update error for book {book_id}: {str(e)}")
+            CACHE_ERRORS.labels(operation="leaderboard").inc()
+
+    @track_performance
+    async def get_top_books(self, by: str = "rating", window: str = "all", limit: int = 10) -> CachedResponse:
+        """Top books as a cached JSON body, at most LEADERBOARD_CACHE_TTL seconds old"""
+        if by not in RANKINGS or window not in WINDOWS:
+            raise ValueError(f"Unsupported leaderboard {by}/{window}")
+        load = lambda: self._load_top_books(by, window, limit)
+        if self.cache is None:
+            return await load()
+        return await self.cache.get_or_load(
+            f"books:top:{by}:{window}:{limit}", load, ttl=LEADERBOARD_CACHE_TTL, codec=ResponseCodec
+        )
+
+    async def _load_top_books(self, by: str, window: str, limit: int) -> CachedResponse:
+        entries = await self.store.top(by, window, limit)
+        if not entries:
+            return page_response(TopBookListAdapter, [], None)
+        result = await self.db.execute(select(Book).where(Book.id.in_([book_id for book_id, _, _ in entries])))
+        books = {book.id: book for book in result.scalars()}
+        rows = [
+            {**BookResponse.model_validate(books[book_id]).model_dump(), "score": round(score, 4), "window_review_count": count}
+            for book_id, score, count in entries
+            if book_id in books
+        ]
+        return page_response(TopBookListAdapter, rows, None)
+
+    async def rebuild(self) -> int:
+        """Reload the boards from the database; returns the number of books ranked.
+
+        All-time totals come from book_stats; the daily buckets of the
+        longest window come from one GROUP BY over recent reviews.
+        """
+        result = await self.db.execute(
+            select(BookStats.book_id, BookStats.review_count, BookStats.rating_sum).where(BookStats.review_count > 0)
+        )
+        totals = {book_id: (count, total) for book_id, count, total in result}
+
+        since = datetime.now(timezone.utc) - timedelta(days=max(days for days in WINDOWS.values() if days))
+        day = func.date(Review.created_at)
+        result = await self.db.execute(
+            select(Review.book_id, day, func.count(), func.sum(Review.rating))
+            .where(Review.created_at >= since.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None))
+            .group_by(Review.book_id, day)
+        )
+        days: Dict[str, Dict[int, Tuple[int, float]]] = defaultdict(dict)
+        for book_id, review_day, count, total in result:
+            days[str(review_day)[:10].replace("-", "")][book_id] = (count, total)
+
+        await self.store.replace(totals, days)
+        return len(totals)
+
+    async def ensure_built(self) -> None:
+        """Rebuild at startup when the boards are empty (fresh Redis or in-process fallback)"""
+        if await self.store.is_empty():
+            count = await self.rebuild()
+            logger.info(f"🏆 Built leaderboards for {count} books")
@@ -0,0 +1,80 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from pydantic import TypeAdapter
+
+from services.cache_service import CachedResponse
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    """Encode a keyset position into an opaque, URL-safe cursor"""
+    raw = json.dumps(position, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Decode an opaque cursor back into its keyset position"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursorError("Invalid pagination cursor")
+    if not isinstance(position, dict) or not isinstance(position.get("id"), int):
+        raise InvalidCursorError("Invalid pagination cursor")
+    return position
+
+def book_cursor(book_id: int) -> str:
+    """Cursor pointing just after the given book (books are ordered by id)"""
+    return encode_cursor({"id": book_id})
+
+def review_cursor(created_at: datetime, review_id: int) -> str:
+    """Cursor pointing just after the given review (newest first)"""
+    return encode_cursor({"created_at": created_at.isoformat(), "id": review_id})
+
+def decode_review_cursor(cursor: str) -> tuple:
+    """Decode a review cursor into its (created_at, id) keyset position"""
+    position = decode_cursor(cursor)
+    try:
+        created_at = datetime.fromisoformat(position["created_at"])
+    except (KeyError, TypeError, ValueError):
+        raise InvalidCursorError("Invalid pagination cursor")
+    return created_at, position["id"]
+
+def search_cursor(book_id: int, offset: int) -> str:
+    """Cursor for the next page of ranked search results (ranks are not keyset-friendly)"""
+    return encode_cursor({"id": book_id, "offset": offset})
+
+def decode_search_cursor(cursor: str) -> int:
+    """Decode a search cursor into the offset of the next page"""
+    offset = decode_cursor(cursor).get("offset")
+    if not isinstance(offset, int) or offset < 0:
+        raise InvalidCursorError("Invalid pagination cursor")
+    return offset
+
+def page_cursor(items: list, limit: int, make_cursor) -> Optional[str]:
+    """Return the next cursor when the query fetched more than one page (limit + 1 rows)"""
+    if limit < 1 or len(items) <= limit:
+        return None
+    return make_cursor(items[limit - 1])
+
+def page_response(adapter: TypeAdapter, rows: Sequence[Any], next_cursor: Optional[str]) -> CachedResponse:
+    """Serialise a page of ORM rows straight to JSON bytes with pydantic-core.
+
+    Validation and encoding both run in Rust, in one pass each, and the
+    resulting body is what gets cached.
+    """
+    body = adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return CachedResponse(body=body, headers=headers)
+
+def id_page(rows: Sequence[Any], next_cursor: Optional[str]) -> CachedResponse:
+    """A page that stores only its rows' ids, in order, for bodies cached per row"""
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return CachedResponse(body=json.dumps([row.id for row in rows]).encode(), headers=headers)
+
+def page_ids(page: CachedResponse) -> List[int]:
+    """The ids stored by id_page"""
+    return json.loads(page.body)
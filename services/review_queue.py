@@ -0,0 +1,225 @@
+"""Write-behind ingestion for POST /books/{book_id}/reviews.
+
+With REVIEW_QUEUE_SIZE > 0 a validated review is acknowledged with a ticket
+and queued in memory. A background flusher writes queued reviews every
+REVIEW_FLUSH_INTERVAL_MS, or as soon as REVIEW_FLUSH_BATCH are waiting, in
+one transaction per batch, then invalidates each affected book's cache once.
+
+A batch that fails with a transient error (database restart, lock timeout)
+is kept and retried with exponential backoff; only reviews the database
+rejects outright (IntegrityError, DataError) are dropped, one by one.
+
+Queued reviews live only in this process until flushed: a crash loses them.
+``stop()`` flushes everything still queued, so a clean shutdown does not.
+"""
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import os
+import uuid
+
+from models import Review
+from schemas import ReviewCreate, ReviewQueued
+from monitoring import REVIEW_BATCH_SIZE, REVIEW_QUEUE_DEPTH, REVIEW_QUEUE_FAILED, REVIEW_QUEUE_REJECTED
+from services.cache_service import CacheService, reviews_namespace
+from services.stats_service import StatsService
+from services.leaderboard_service import LeaderboardService
+
+logger = logging.getLogger(__name__)
+
+# Queue capacity; 0 keeps the synchronous one-transaction-per-review path
+REVIEW_QUEUE_SIZE = int(os.getenv("REVIEW_QUEUE_SIZE", "0"))
+REVIEW_FLUSH_INTERVAL_MS = int(os.getenv("REVIEW_FLUSH_INTERVAL_MS", "50"))
+REVIEW_FLUSH_BATCH = int(os.getenv("REVIEW_FLUSH_BATCH", "500"))
+# Backoff cap for batches that hit a transient database error
+REVIEW_RETRY_MAX_MS = int(os.getenv("REVIEW_RETRY_MAX_MS", "5000"))
+# Attempts per batch during a shutdown flush before giving up on it
+REVIEW_SHUTDOWN_ATTEMPTS = int(os.getenv("REVIEW_SHUTDOWN_ATTEMPTS", "5"))
+
+# The database refuses these rows as they are; retrying cannot help
+PERMANENT_ERRORS = (IntegrityError, DataError)
+
+class ReviewQueueFull(Exception):
+    """The write-behind queue is at capacity; the client should retry later"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Review queue is full")
+        self.retry_after = retry_after
+
+class ReviewWriteQueue:
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        cache: CacheService,
+        maxsize: int = REVIEW_QUEUE_SIZE,
+        batch_size: int = REVIEW_FLUSH_BATCH,
+        interval_ms: int = REVIEW_FLUSH_INTERVAL_MS,
+        retry_max_ms: int = REVIEW_RETRY_MAX_MS,
+    ):
+        self.session_factory = session_factory
+        self.cache = cache
+        self.batch_size = batch_size
+        self.interval = interval_ms / 1000
+        self.retry_max = retry_max_ms / 1000
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self._batch_ready = asyncio.Event()
+        # Rows taken off the queue but not yet handed to a write
+        self._batch: List[dict] = []
+        self._task: Optional[asyncio.Task] = None
+        self._writing: Optional[asyncio.Future] = None
+
+    def submit(self, book_id: int, review: ReviewCreate) -> ReviewQueued:
+        """Queue a review for the next batch, or raise ReviewQueueFull.
+
+        The caller has already checked that the book exists. ``created_at`` is
+        the acceptance time, so ordering matches what clients observed.
+        """
+        queued = ReviewQueued(ticket=uuid.uuid4().hex, book_id=book_id, accepted_at=datetime.now(timezone.utc))
+        try:
+            self._queue.put_nowait({"book_id": book_id, **review.model_dump(), "created_at": queued.accepted_at})
+        except asyncio.QueueFull:
+            REVIEW_QUEUE_REJECTED.inc()
+            raise ReviewQueueFull(retry_after=max(1, round(self.interval * 2)))
+        REVIEW_QUEUE_DEPTH.set(self._queue.qsize())
+        if self._queue.qsize() >= self.batch_size:
+            self._batch_ready.set()
+        return queued
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info("✅ Review write-behind queue started")
+
+    async def stop(self) -> None:
+        """Stop the flusher and write everything still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._writing is not None:
+            retry, = await asyncio.gather(self._writing, return_exceptions=True)
+            if isinstance(retry, list):
+                self._batch[:0] = retry
+        await self.flush()
+
+    async def flush(self, attempts: int = REVIEW_SHUTDOWN_ATTEMPTS) -> int:
+        """Write every queued review now; returns how many were taken.
+
+        A batch still failing after ``attempts`` tries is dropped and counted.
+        """
+        taken = 0
+        failures = 0
+        while self._batch or not self._queue.empty():
+            self._take(self.batch_size - len(self._batch))
+            batch, self._batch = self._batch, []
+            retry = await self._write(batch)
+            taken += len(batch) - len(retry)
+            if not retry:
+                failures = 0
+                continue
+            failures += 1
+            if failures >= attempts:
+                logger.error(f"❌ Dropping {len(retry)} queued reviews after {failures} failed attempts")
+                REVIEW_QUEUE_FAILED.inc(len(retry))
+                taken += len(retry)
+                failures = 0
+                continue
+            self._batch = retry
+            await asyncio.sleep(self._backoff(failures))
+        return taken
+
+    def _backoff(self, failures: int) -> float:
+        return min(self.retry_max, self.interval * 2 ** failures)
+
+    def _take(self, count: int) -> None:
+        while count > 0 and not self._queue.empty():
+            self._batch.append(self._queue.get_nowait())
+            count -= 1
+        REVIEW_QUEUE_DEPTH.set(self._queue.qsize())
+
+    async def _run(self) -> None:
+        failures = 0
+        while True:
+            try:
+                if not self._batch:
+                    self._batch.append(await self._queue.get())
+                if failures:
+                    await asyncio.sleep(self._backoff(failures))
+                else:
+                    # Let the batch fill until the interval elapses or it is full
+                    try:
+                        await asyncio.wait_for(self._batch_ready.wait(), self.interval)
+                    except asyncio.TimeoutError:
+                        pass
+                self._batch_ready.clear()
+                self._take(self.batch_size - len(self._batch))
+                batch, self._batch = self._batch, []
+                # Shielded so shutdown waits for the transaction instead of abandoning it
+                self._writing = asyncio.ensure_future(self._write(batch))
+                retry = await asyncio.shield(self._writing)
+                self._writing = None
+                # Failed rows go first so acceptance order is kept
+                self._batch[:0] = retry
+                failures = failures + 1 if retry else 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # One bad write must not stop the flusher, or the queue only fills up
+                logger.exception(f"❌ Review flusher error: {str(e)}")
+                self._writing = None
+
+    async def _write(self, batch: List[dict]) -> List[dict]:
+        """Write ``batch``; returns the rows that hit a transient error and should be retried"""
+        if not batch:
+            return []
+        by_book: Dict[int, List[dict]] = defaultdict(list)
+        for row in batch:
+            by_book[row["book_id"]].append(row)
+
+        try:
+            async with self.session_factory() as db:
+                await self._insert(db, batch, by_book)
+                REVIEW_BATCH_SIZE.observe(len(batch))
+                await self._after_insert(db, by_book)
+        except PERMANENT_ERRORS as e:
+            if len(batch) == 1:
+                logger.error(f"❌ Dropping queued review for book {batch[0]['book_id']}: {str(e)}")
+                REVIEW_QUEUE_FAILED.inc()
+                return []
+            # Isolate the failing review (e.g. its book was deleted) and keep the rest
+            logger.warning(f"⚠️ Review batch of {len(batch)} failed, retrying one by one: {str(e)}")
+            retry = []
+            for row in batch:
+                retry += await self._write([row])
+            return retry
+        except Exception as e:
+            logger.warning(f"⚠️ Review batch of {len(batch)} failed, will retry: {str(e)}")
+            return batch
+        return []
+
+    async def _after_insert(self, db: AsyncSession, by_book: Dict[int, List[dict]]) -> None:
+        """Invalidate caches and update leaderboards for committed reviews.
+
+        The rows are already written, so a failure here is logged rather than
+        retried; the caches catch up when their entries expire.
+        """
+        try:
+            leaderboard = LeaderboardService(db, self.cache)
+            for book_id, rows in by_book.items():
+                await self.cache.bump_generation(reviews_namespace(book_id))
+                await leaderboard.record_reviews(book_id, [(row["rating"], row["created_at"]) for row in rows])
+        except Exception as e:
+            logger.error(f"❌ Cache update after writing reviews failed: {str(e)}")
+
+    async def _insert(self, db: AsyncSession, batch: List[dict], by_book: Dict[int, List[dict]]) -> None:
+        """One executemany plus one aggregate UPDATE per book, in one transaction"""
+        await db.execute(insert(Review), batch)
+        stats = StatsService(db)
+        for book_id, rows in by_book.items():
+            await stats.record_reviews(book_id, [row["rating"] for row in rows])
+        await db.commit()
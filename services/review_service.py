@@ -1,62 +1,181 @@
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, insert, literal, select, tuple_
+from sqlalchemy.orm import aliased
+from collections import defaultdict
+from typing import Any, AsyncIterator, List, Optional
 
-from models import Review, Book
-from schemas import ReviewCreate, ReviewResponse
-from services.cache_service import CacheService
+from models import Review
+from schemas import BulkResult, ReviewCreate, ReviewQueued, ReviewResponse, ReviewListAdapter
+from monitoring import track_performance
+from services.cache_service import CacheService, CachedResponse, ResponseCodec, reviews_namespace
+from services.batch import json_object
+from services.stats_service import StatsService
+from services.leaderboard_service import LeaderboardService
+from services.review_queue import ReviewWriteQueue
+from services.book_index import book_exists
+from services.bulk import BULK_CHUNK_SIZE, chunked, validate_item
+from services.pagination import decode_review_cursor, page_cursor, page_response, review_cursor
 
 class ReviewService:
-    def __init__(self, db: Session, cache_service: CacheService):
+    def __init__(self, db: AsyncSession, cache_service: CacheService):
         self.db = db
         self.cache = cache_service
     
-    async def get_reviews_by_book(self, book_id: int, skip: int = 0, limit: int = 100) -> List[ReviewResponse]:
-        """Get reviews for a book (optimized with index)"""
-        # Verify book exists
-        book = self.db.query(Book).filter(Book.id == book_id).first()
-        if not book:
+    @track_performance
+    async def get_reviews_by_book(
+        self, book_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+        if_none_match: Optional[str] = None,
+    ) -> CachedResponse:
+        """Get reviews for a book, newest first (optimized with index).
+
+        Uses the (book_id, created_at, id) index. When ``cursor`` is given the
+        page starts right after the cursor position (keyset pagination) and
+        ``skip`` is ignored, so deep pages cost the same as the first one.
+        The page is cached as its final JSON body. A matching
+        ``if_none_match`` gets a 304 from the cached page, without a query.
+        """
+        # Cache key for book reviews
+        cache_key = await self.cache.namespaced_key(
+            reviews_namespace(book_id), f"c{cursor}:{limit}" if cursor else f"{skip}:{limit}"
+        )
+        
+        # Verify book exists - from the in-process index, not a SELECT
+        if not await book_exists(self.db, self.cache, book_id):
             raise ValueError(f"Book with id {book_id} not found")
         
-        # Cache key for book reviews
-        cache_key = f"reviews:book:{book_id}:{skip}:{limit}"
-        
-        # Try cache first
-        cached_reviews = await self.cache.get(cache_key)
-        if cached_reviews:
-            return [ReviewResponse(**review) for review in cached_reviews]
-        
-        # Fetch from database using optimized query with index
-        reviews = (
-            self.db.query(Review)
-            .filter(Review.book_id == book_id)
-            .order_by(Review.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-            .all()
+        # Cache first; concurrent misses share a single database load
+        return await self.cache.get_or_load_response(
+            cache_key, lambda: self._load_reviews_page(book_id, skip, limit, cursor), if_none_match
         )
+    
+    async def _load_reviews_page(self, book_id: int, skip: int, limit: int, cursor: Optional[str]) -> CachedResponse:
+        """Fetch one page of reviews using the (book_id, created_at, id) index"""
+        query = (
+            select(Review)
+            .where(Review.book_id == book_id)
+            .order_by(Review.created_at.desc(), Review.id.desc())
+            .limit(limit + 1)
+        )
+        if cursor:
+            created_at, review_id = decode_review_cursor(cursor)
+            # Bind with the column type so SQLite compares in the stored timestamp format
+            position = tuple_(literal(created_at, Review.created_at.type), review_id)
+            query = query.where(tuple_(Review.created_at, Review.id) < position)
+        else:
+            query = query.offset(skip)
+        result = await self.db.execute(query)
+        reviews = result.scalars().all()
         
-        review_responses = [ReviewResponse.model_validate(review) for review in reviews]
+        return page_response(
+            ReviewListAdapter,
+            reviews[:limit],
+            page_cursor(reviews, limit, lambda review: review_cursor(review.created_at, review.id)),
+        )
+    
+    @track_performance
+    async def get_reviews_for_books(self, book_ids: List[int], per_book: int = 5) -> CachedResponse:
+        """Newest reviews of several books as ``{"<book_id>": [...]}``.
+
+        Shares cache entries with the first page of /books/{book_id}/reviews
+        (skip=0, limit=per_book): hits come from one MGET, the misses from one
+        windowed query, and they are backfilled with one pipelined write.
+        Books without reviews, or unknown ids, map to an empty list.
+        """
+        keys = await self.cache.namespaced_keys([reviews_namespace(book_id) for book_id in book_ids], f"0:{per_book}")
+        keys = {book_id: keys[reviews_namespace(book_id)] for book_id in book_ids}
+        cached = await self.cache.get_many(keys.values(), codec=ResponseCodec)
+        pages = {book_id: cached[key] for book_id, key in keys.items() if key in cached}
         
-        # Cache results
-        reviews_dict = [review.dict() for review in review_responses]
-        await self.cache.set(cache_key, reviews_dict)
+        misses = [book_id for book_id in book_ids if book_id not in pages]
+        if misses:
+            loaded = await self._load_first_pages(misses, per_book)
+            loaded = {book_id: self.cache.cacheable_response(keys[book_id], page) for book_id, page in loaded.items()}
+            await self.cache.set_many({keys[book_id]: page for book_id, page in loaded.items()}, codec=ResponseCodec)
+            pages.update(loaded)
         
-        return review_responses
+        return CachedResponse(body=json_object((str(book_id), pages[book_id].body) for book_id in book_ids))
     
+    async def _load_first_pages(self, book_ids: List[int], limit: int) -> dict:
+        """First review page of each book with one ROW_NUMBER() query over the (book_id, created_at, id) index"""
+        rank = func.row_number().over(
+            partition_by=Review.book_id, order_by=(Review.created_at.desc(), Review.id.desc())
+        ).label("rank")
+        ranked = select(Review, rank).where(Review.book_id.in_(book_ids)).subquery()
+        review = aliased(Review, ranked)
+        query = select(review).where(ranked.c.rank <= limit + 1).order_by(ranked.c.book_id, ranked.c.rank)
+        
+        by_book = defaultdict(list)
+        for row in (await self.db.scalars(query)).all():
+            by_book[row.book_id].append(row)
+        return {
+            book_id: page_response(
+                ReviewListAdapter,
+                by_book[book_id][:limit],
+                page_cursor(by_book[book_id], limit, lambda r: review_cursor(r.created_at, r.id)),
+            )
+            for book_id in book_ids
+        }
+    
+    @track_performance
     async def create_review(self, book_id: int, review_data: ReviewCreate) -> ReviewResponse:
         """Create a new review for a book"""
-        # Verify book exists
-        book = self.db.query(Book).filter(Book.id == book_id).first()
-        if not book:
+        # Verify book exists - from the in-process index, not a SELECT
+        if not await book_exists(self.db, self.cache, book_id):
             raise ValueError(f"Book with id {book_id} not found")
         
-        # Create review
+        # Create review and update the book's aggregates in the same transaction
         db_review = Review(book_id=book_id, **review_data.model_dump())
         self.db.add(db_review)
-        self.db.commit()
-        self.db.refresh(db_review)
+        await StatsService(self.db).record_review(book_id, db_review.rating)
+        await self.db.commit()
+        await self.db.refresh(db_review)
+        
+        # Invalidate related caches and update the leaderboards
+        await self.cache.bump_generation(reviews_namespace(book_id))
+        await LeaderboardService(self.db, self.cache).record_reviews(book_id, [(db_review.rating, db_review.created_at)])
+        
+        return ReviewResponse.model_validate(db_review)
+    
+    @track_performance
+    async def queue_review(self, book_id: int, review_data: ReviewCreate, queue: ReviewWriteQueue) -> ReviewQueued:
+        """Accept a review for write-behind insertion (see services.review_queue)"""
+        if not await book_exists(self.db, self.cache, book_id):
+            raise ValueError(f"Book with id {book_id} not found")
+        return queue.submit(book_id, review_data)
+    
+    @track_performance
+    async def bulk_create_reviews(
+        self, book_id: int, items: AsyncIterator[Any], chunk_size: int = BULK_CHUNK_SIZE
+    ) -> BulkResult:
+        """Validate and insert reviews for one book in chunked transactions.
+
+        Each chunk is a single executemany plus one aggregate UPDATE; the
+        book's review cache is invalidated once for the whole batch.
+        """
+        if not await book_exists(self.db, self.cache, book_id):
+            raise ValueError(f"Book with id {book_id} not found")
         
-        # Invalidate related caches
-        await self.cache.invalidate_pattern(f"reviews:book:{book_id}:*")
+        result = BulkResult()
+        stats = StatsService(self.db)
+        leaderboard = LeaderboardService(self.db, self.cache)
+        async for chunk in chunked(items, chunk_size):
+            rows = []
+            for index, item in chunk:
+                review, error = validate_item(ReviewCreate, item)
+                if error:
+                    result.add_error(index, error)
+                else:
+                    rows.append({"book_id": book_id, **review.model_dump()})
+            if not rows:
+                continue
+            
+            await self.db.execute(insert(Review), rows)
+            await stats.record_reviews(book_id, [row["rating"] for row in rows])
+            await self.db.commit()
+            result.inserted += len(rows)
+            # Bulk rows take the server's CURRENT_TIMESTAMP, i.e. today
+            await leaderboard.record_reviews(book_id, [(row["rating"], None) for row in rows])
         
-        return ReviewResponse.model_validate(db_review)
\ No newline at end of file
+        if result.inserted:
+            await self.cache.bump_generation(reviews_namespace(book_id))
+        return result
@@ -0,0 +1,141 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Float, Integer, func, literal, or_, select, text
+from typing import List, Optional, Tuple
+import re
+
+from models import Book, Review, TS_CONFIG
+from schemas import BookListAdapter
+from monitoring import track_performance
+from services.cache_service import CacheService, CachedResponse, ResponseCodec, BOOKS_LIST_NAMESPACE
+from services.book_service import BookService
+from services.pagination import decode_search_cursor, id_page, page_cursor, page_response, search_cursor
+
+# Review matches rank below equally good title/author/description matches
+REVIEW_MATCH_WEIGHT = 0.5
+
+# Column weights for bm25 (title, author, description)
+BOOK_COLUMN_WEIGHTS = (10.0, 5.0, 1.0)
+
+class InvalidSearchError(ValueError):
+    """Raised when a search query has nothing to match on"""
+
+def search_terms(query: str) -> List[str]:
+    """Split a free-text query into lowercase word tokens"""
+    return re.findall(r"\w+", query.lower())
+
+class SearchService:
+    """Ranked full-text search over books, optionally including review comments.
+
+    Uses FTS5 with bm25 ranking on SQLite and the weighted ``search_vector``
+    GIN index with ts_rank on Postgres. The last term is matched as a
+    prefix so search-as-you-type works. Other databases fall back to an
+    unranked LIKE scan.
+    """
+
+    def __init__(self, db: AsyncSession, cache_service: Optional[CacheService] = None):
+        self.db = db
+        self.cache = cache_service
+
+    @track_performance
+    async def search_books(
+        self, query: str, skip: int = 0, limit: int = 20,
+        cursor: Optional[str] = None, include_reviews: bool = False,
+    ) -> CachedResponse:
+        """One page of books ranked by relevance.
+
+        Title/author/description results are cached in the books list
+        namespace as their ranked book ids, so creating a book invalidates
+        them while reviews only refresh the per-book bodies. Searches that
+        include review comments would be invalidated by every review, so they
+        are not cached.
+        """
+        terms = search_terms(query)
+        if not terms:
+            raise InvalidSearchError("Search query must contain at least one word")
+        if cursor:
+            skip = decode_search_cursor(cursor)
+
+        if self.cache is None or include_reviews:
+            books, next_cursor = await self._search(terms, skip, limit, include_reviews)
+            return page_response(BookListAdapter, books, next_cursor)
+
+        book_service = BookService(self.db, self.cache)
+
+        async def load() -> CachedResponse:
+            books, next_cursor = await self._search(terms, skip, limit, include_reviews)
+            await book_service.cache_books(books)
+            return id_page(books, next_cursor)
+
+        cache_key = await self.cache.namespaced_key(BOOKS_LIST_NAMESPACE, f"search:{skip}:{limit}:{' '.join(terms)}")
+        page = await self.cache.get_or_load(cache_key, load, codec=ResponseCodec)
+        return await book_service.listing_response(cache_key, page)
+
+    async def _search(
+        self, terms: List[str], skip: int, limit: int, include_reviews: bool
+    ) -> Tuple[List[Book], Optional[str]]:
+        """One page of matching books and the cursor for the next page"""
+        dialect = self.db.get_bind().dialect.name
+        if dialect == "sqlite":
+            ranked = self._sqlite_ranking(terms, include_reviews)
+        elif dialect == "postgresql":
+            ranked = self._postgres_ranking(terms, include_reviews)
+        else:
+            ranked = self._like_ranking(terms, include_reviews)
+
+        query = (
+            select(Book)
+            .join(ranked, Book.id == ranked.c.book_id)
+            .order_by(ranked.c.score, Book.id)
+            .offset(skip)
+            .limit(limit + 1)
+        )
+        result = await self.db.execute(query)
+        books = result.scalars().all()
+        return books[:limit], page_cursor(books, limit, lambda book: search_cursor(book.id, skip + limit))
+
+    def _sqlite_ranking(self, terms: List[str], include_reviews: bool):
+        """(book_id, score) from FTS5; bm25 is negative, lower is better"""
+        # Quote every term so user input can never be read as FTS5 syntax
+        match = " ".join(f'"{term}"' for term in terms) + "*"
+        weights = ", ".join(str(weight) for weight in BOOK_COLUMN_WEIGHTS)
+        sql = f"SELECT rowid AS book_id, bm25(books_fts, {weights}) AS score FROM books_fts WHERE books_fts MATCH :match"
+        if include_reviews:
+            sql = (
+                f"SELECT book_id, MIN(score) AS score FROM ({sql} UNION ALL "
+                f"SELECT reviews.book_id, bm25(reviews_fts) * {REVIEW_MATCH_WEIGHT} FROM reviews_fts "
+                "JOIN reviews ON reviews.id = reviews_fts.rowid WHERE reviews_fts MATCH :match) "
+                "GROUP BY book_id"
+            )
+        return text(sql).bindparams(match=match).columns(book_id=Integer, score=Float).subquery("ranked")
+
+    def _postgres_ranking(self, terms: List[str], include_reviews: bool):
+        """(book_id, score) from the GIN-indexed tsvectors; score is the negated ts_rank"""
+        match = " & ".join(terms) + ":*"
+        sql = (
+            f"SELECT id AS book_id, -ts_rank(search_vector, query) AS score "
+            f"FROM books, to_tsquery('{TS_CONFIG}', :match) query WHERE search_vector @@ query"
+        )
+        if include_reviews:
+            document = f"to_tsvector('{TS_CONFIG}', coalesce(comment, ''))"
+            sql = (
+                f"SELECT book_id, MIN(score) AS score FROM ({sql} UNION ALL "
+                f"SELECT book_id, -ts_rank({document}, query) * {REVIEW_MATCH_WEIGHT} "
+                f"FROM reviews, to_tsquery('{TS_CONFIG}', :match) query WHERE {document} @@ query) matches "
+                "GROUP BY book_id"
+            )
+        return text(sql).bindparams(match=match).columns(book_id=Integer, score=Float).subquery("ranked")
+
+    def _like_ranking(self, terms: List[str], include_reviews: bool):
+        """Unindexed fallback: every term must appear in title, author or description"""
+        conditions = [
+            or_(*(column.ilike(f"%{term}%") for column in (Book.title, Book.author, Book.description)))
+            for term in terms
+        ]
+        query = select(Book.id.label("book_id"), literal(0.0, Float).label("score")).where(*conditions)
+        if include_reviews:
+            review_matches = select(Review.book_id, literal(1.0, Float)).where(
+                *(Review.comment.ilike(f"%{term}%") for term in terms)
+            )
+            union = query.union(review_matches).subquery()
+            query = select(union.c.book_id, func.min(union.c.score).label("score")).group_by(union.c.book_id)
+        return query.subquery("ranked")
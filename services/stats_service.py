@@ -0,0 +1,107 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import case, delete, func, insert, select, update
+from collections import Counter
+from typing import List, Optional
+
+from models import Book, BookStats, Review
+from schemas import BookStatsResponse
+from services.cache_service import CacheService, reviews_namespace
+
+def star_bucket(rating: float) -> int:
+    """Histogram bucket for a rating - rounded to the nearest star, halves round up"""
+    return min(5, max(1, int(rating + 0.5)))
+
+def _star_count(star: int):
+    """SQL twin of star_bucket: number of ratings that fall into ``star``"""
+    condition = None
+    if star > 1:
+        condition = Review.rating >= star - 0.5
+    if star < 5:
+        upper = Review.rating < star + 0.5
+        condition = upper if condition is None else condition & upper
+    return func.sum(case((condition, 1), else_=0))
+
+def book_stats(book: Book) -> BookStatsResponse:
+    """Rating summary from a book's (eagerly loaded) aggregates row"""
+    if book.stats is None:
+        return BookStatsResponse(book_id=book.id)
+    return BookStatsResponse(
+        book_id=book.id,
+        review_count=book.stats.review_count,
+        average_rating=book.stats.average_rating,
+        rating_histogram=book.stats.histogram,
+    )
+
+class StatsService:
+    def __init__(self, db: AsyncSession, cache_service: Optional[CacheService] = None):
+        self.db = db
+        self.cache = cache_service
+
+    async def record_review(self, book_id: int, rating: float) -> None:
+        """Add one rating to the book's aggregates.
+
+        Runs inside the caller's transaction, so the aggregate commits (or
+        rolls back) together with the review row.
+        """
+        await self.record_reviews(book_id, [rating])
+
+    async def record_reviews(self, book_id: int, ratings: List[float]) -> None:
+        """Add a batch of ratings to the book's aggregates with a single UPDATE"""
+        if not ratings:
+            return
+        stars = Counter(f"rating_{star_bucket(rating)}" for rating in ratings)
+        values = {
+            "review_count": BookStats.review_count + len(ratings),
+            "rating_sum": BookStats.rating_sum + sum(ratings),
+        }
+        for column, count in stars.items():
+            values[column] = getattr(BookStats, column) + count
+
+        result = await self.db.execute(update(BookStats).where(BookStats.book_id == book_id).values(values))
+        if result.rowcount == 0:
+            # First review for a book created before aggregates existed
+            self.db.add(BookStats(book_id=book_id, review_count=len(ratings), rating_sum=sum(ratings), **stars))
+
+    async def get_stats(self, book_id: int) -> BookStatsResponse:
+        """Rating summary for a book, cached alongside its review pages"""
+        if self.cache is None:
+            return BookStatsResponse(**await self._load_stats(book_id))
+        cache_key = await self.cache.namespaced_key(reviews_namespace(book_id), "stats")
+        stats = await self.cache.get_or_load(cache_key, lambda: self._load_stats(book_id))
+        return BookStatsResponse(**stats)
+
+    async def _load_stats(self, book_id: int) -> dict:
+        book = await self.db.get(Book, book_id)
+        if not book:
+            raise ValueError(f"Book with id {book_id} not found")
+        return book_stats(book).model_dump()
+
+    async def rebuild(self, book_id: Optional[int] = None) -> int:
+        """Recompute aggregates from the reviews table and return the number of books updated.
+
+        The GROUP BY only reads (book_id, rating), so it is served from
+        idx_reviews_book_rating without touching the review rows.
+        """
+        aggregate = (
+            select(
+                Review.book_id,
+                func.count(),
+                func.coalesce(func.sum(Review.rating), 0.0),
+                *(_star_count(star) for star in range(1, 6)),
+            )
+            .group_by(Review.book_id)
+        )
+        clear = delete(BookStats)
+        if book_id is not None:
+            aggregate = aggregate.where(Review.book_id == book_id)
+            clear = clear.where(BookStats.book_id == book_id)
+
+        await self.db.execute(clear)
+        result = await self.db.execute(
+            insert(BookStats).from_select(
+                ["book_id", "review_count", "rating_sum", "rating_1", "rating_2", "rating_3", "rating_4", "rating_5"],
+                aggregate,
+            )
+        )
+        await self.db.commit()
+        return result.rowcount
@@ -6,12 +6,15 @@ import pytest
 import asyncio
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool, StaticPool
 
-from main import app
+from main import app, get_cache_service
 from database import get_db, Base
 from services.cache_service import CacheService
+from services.leaderboard_service import local_leaderboard
+from services.book_index import book_index
 
 # Test database
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -22,6 +25,13 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for the request path. NullPool because TestClient may run each
+# request on its own event loop, so connections must not outlive a request.
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 @pytest.fixture(scope="function")
 def db_session():
     """Create a fresh database for each test"""
@@ -34,18 +44,24 @@ def db_session():
         Base.metadata.drop_all(bind=engine)
 
 @pytest.fixture(scope="function")
-def client(db_session):
-    """Create test client with database override"""
-    def override_get_db():
-        try:
-            yield db_session
-        finally:
-            pass
+def cache_service():
+    """Cache service without a Redis client (cache unavailable)"""
+    return CacheService()
+
+@pytest.fixture(scope="function")
+def client(db_session, cache_service):
+    """Create test client with database and cache overrides"""
+    async def override_get_db():
+        async with TestingAsyncSessionLocal() as session:
+            yield session
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_cache_service] = lambda: cache_service
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
+    local_leaderboard.clear()
+    book_index.clear()
 
 @pytest.fixture
 def mock_cache_service():
@@ -53,6 +69,7 @@ def mock_cache_service():
     class MockCacheService:
         def __init__(self):
             self._store = {}
+            self._generations = {}
             self._is_available = True
         
         async def get(self, key):
@@ -67,13 +84,14 @@ def mock_cache_service():
         async def delete(self, key):
             return self._store.pop(key, None) is not None if self._is_available else False
         
-        async def invalidate_pattern(self, pattern):
+        async def namespaced_key(self, namespace, suffix):
+            return f"{namespace}:g{self._generations.get(namespace, 0)}:{suffix}"
+        
+        async def bump_generation(self, namespace):
             if not self._is_available:
                 return 0
-            keys_to_delete = [k for k in self._store.keys() if pattern.replace('*', '') in k]
-            for key in keys_to_delete:
-                del self._store[key]
-            return len(keys_to_delete)
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            return self._generations[namespace]
         
         def set_unavailable(self):
             self._is_available = False
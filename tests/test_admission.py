@@ -0,0 +1,115 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from admission import AdaptiveLimiter, AdmissionMiddleware, RateLimiter, RouteClassPolicy, route_class
+
+def test_route_classes():
+    assert route_class("GET", "/books/1/reviews") == "read"
+    assert route_class("POST", "/books/1/reviews") == "write"
+    assert route_class("POST", "/books/bulk") == "bulk"
+    assert route_class("GET", "/export/reviews") == "bulk"
+    assert route_class("POST", "/login") == "auth"
+    assert route_class("GET", "/health") is None
+    assert route_class("OPTIONS", "/books") is None
+
+def test_limit_backs_off_when_slow_and_recovers_when_fast():
+    limiter = AdaptiveLimiter("test", RouteClassPolicy(initial=10, minimum=2, maximum=12, target_ms=100))
+    for _ in range(10):
+        assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+    limiter.release(0.5)
+    assert limiter.limit == 9
+    # One decrease per target interval, however many slow responses land in it
+    limiter.release(0.5, failed=True)
+    assert limiter.limit == 9
+
+    for _ in range(8):
+        limiter.release(0.01)
+    grown = limiter.limit
+    assert 9 < grown < 10 and limiter.in_flight == 0
+    # Growth only happens while the limit is actually in use
+    for _ in range(40):
+        assert limiter.try_acquire()
+        limiter.release(0.01)
+    assert limiter.limit == grown
+
+def _slow_app(policies, **options):
+    """App whose routes block until ``gate`` is set"""
+    app = FastAPI()
+    gate = asyncio.Event()
+
+    @app.get("/slow")
+    async def slow_read():
+        await gate.wait()
+        return {"ok": True}
+
+    @app.post("/slow")
+    async def slow_write():
+        await gate.wait()
+        return {"ok": True}
+
+    @app.post("/login")
+    async def login():
+        return {"ok": True}
+
+    app.add_middleware(AdmissionMiddleware, policies=policies, **options)
+    return app, gate
+
+@pytest.mark.asyncio
+async def test_overload_is_shed_with_retry_after_and_reads_wait():
+    app, gate = _slow_app({
+        "read": RouteClassPolicy(initial=1, minimum=1, maximum=1, target_ms=None, max_wait_ms=2000),
+        "write": RouteClassPolicy(initial=1, minimum=1, maximum=1, target_ms=None),
+        "auth": RouteClassPolicy(initial=4, minimum=1, maximum=4, target_ms=None, yields_to_reads=True),
+    }, rate=0)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        write = asyncio.create_task(client.post("/slow"))
+        read = asyncio.create_task(client.get("/slow"))
+        queued_read = asyncio.create_task(client.get("/slow"))
+        await asyncio.sleep(0.05)
+
+        # Writes over the limit are refused at once; reads queue for a slot
+        rejected = await client.post("/slow")
+        assert rejected.status_code == 503 and rejected.headers["Retry-After"] == "1"
+        assert not queued_read.done()
+        # Auth work gives way while reads are waiting
+        assert (await client.post("/login")).status_code == 503
+
+        gate.set()
+        assert [r.status_code for r in await asyncio.gather(write, read, queued_read)] == [200, 200, 200]
+        assert (await client.post("/login")).status_code == 200
+
+@pytest.mark.asyncio
+async def test_token_bucket_answers_429():
+    app, gate = _slow_app(None, rate=1, burst=2)
+    gate.set()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        assert [(await client.get("/slow")).status_code for _ in range(2)] == [200, 200]
+        response = await client.get("/slow")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+@pytest.mark.asyncio
+async def test_redis_token_bucket_is_shared_between_workers():
+    pytest.importorskip("lupa")  # fakeredis runs Lua through lupa
+    fakeredis = pytest.importorskip("fakeredis")
+    redis_client = fakeredis.FakeAsyncRedis()
+    workers = [RateLimiter(rate=1, burst=3), RateLimiter(rate=1, burst=3)]
+    waits = [await workers[i % 2].take("10.0.0.1", redis_client) for i in range(4)]
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert 0 < waits[3] <= 1
+    assert await workers[0].take("10.0.0.2", redis_client) == 0.0
+
+@pytest.mark.asyncio
+async def test_rate_limiter_falls_back_to_local_buckets():
+    class BrokenRedis:
+        def register_script(self, script):
+            raise ConnectionError("redis down")
+
+    limiter = RateLimiter(rate=1, burst=1)
+    assert await limiter.take("client", BrokenRedis()) == 0.0
+    assert await limiter.take("client", BrokenRedis()) > 0
@@ -0,0 +1,63 @@
+import pytest
+from datetime import timedelta
+
+import auth
+from auth import create_access_token, hash_password_async, shutdown_hash_executor, token_cache, verify_password_async
+from models import User
+
+@pytest.fixture(autouse=True)
+def clean_auth_state():
+    token_cache.clear()
+    yield
+    token_cache.clear()
+
+@pytest.fixture(scope="module", autouse=True)
+def hash_pool():
+    yield
+    shutdown_hash_executor()
+
+def _signup(client, email="reader@example.com", username="reader"):
+    return client.post("/signup", json={"email": email, "username": username, "password": "correct-horse"})
+
+@pytest.mark.asyncio
+async def test_password_hashing_runs_in_process_pool():
+    hashed = await hash_password_async("correct-horse")
+    assert await verify_password_async("correct-horse", hashed)
+    assert not await verify_password_async("wrong-password", hashed)
+    assert auth.get_hash_executor() is not None
+
+def test_signup_and_login(client):
+    response = _signup(client)
+    assert response.status_code == 200
+    assert response.json()["user"]["email"] == "reader@example.com"
+
+    response = client.post("/login", json={"email": "reader@example.com", "password": "correct-horse"})
+    assert response.status_code == 200
+    assert response.json()["token_type"] == "bearer"
+
+    response = client.post("/login", json={"email": "reader@example.com", "password": "wrong-password"})
+    assert response.status_code == 401
+
+def test_current_user_requires_valid_token(client):
+    assert client.get("/me").status_code == 401
+    assert client.get("/me", headers={"Authorization": "Bearer not-a-jwt"}).status_code == 401
+
+    expired = create_access_token({"sub": "reader@example.com"}, expires_delta=timedelta(seconds=-1))
+    assert client.get("/me", headers={"Authorization": f"Bearer {expired}"}).status_code == 401
+
+def test_current_user_is_cached_per_token(client, db_session):
+    token = _signup(client).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.get("/me", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["username"] == "reader"
+    assert len(token_cache) == 1
+
+    # Served from the token cache - no signature check or User lookup
+    db_session.query(User).delete()
+    db_session.commit()
+    assert client.get("/me", headers=headers).status_code == 200
+
+    token_cache.clear()
+    assert client.get("/me", headers=headers).status_code == 401
@@ -0,0 +1,38 @@
+from benchmarks.compare import compare, config_mismatch
+from benchmarks.run import percentile, summarize
+
+def _result(p95_ms, rps, **meta):
+    return {
+        "meta": {"books": 100, "concurrency": 16, **meta},
+        "results": {"warm": {"list_books": {"p50_ms": 1.0, "p95_ms": p95_ms, "p99_ms": 5.0, "rps": rps}}},
+    }
+
+def test_percentile_nearest_rank():
+    samples = [float(i) for i in range(1, 101)]
+    assert percentile(samples, 50) == 50.0
+    assert percentile(samples, 95) == 95.0
+    assert percentile(samples, 99) == 99.0
+    assert percentile([], 99) == 0.0
+
+def test_summarize_reports_milliseconds_and_throughput():
+    stats = summarize([0.002, 0.001, 0.003], errors=1, sizes=[10, 20, 30], elapsed=0.5)
+    assert stats["requests"] == 3
+    assert stats["errors"] == 1
+    assert stats["p50_ms"] == 2.0
+    assert stats["max_ms"] == 3.0
+    assert stats["rps"] == 6.0
+    assert stats["mean_bytes"] == 20
+
+def test_compare_flags_latency_and_throughput_regressions():
+    rows = compare(_result(10.0, 1000.0), _result(12.0, 800.0), threshold=0.15)
+    regressed = {row["metric"] for row in rows if row["regressed"]}
+    assert regressed == {"p95_ms", "rps"}
+
+def test_compare_tolerates_changes_within_threshold_and_improvements():
+    rows = compare(_result(10.0, 1000.0), _result(11.0, 1500.0), threshold=0.15)
+    assert rows
+    assert not any(row["regressed"] for row in rows)
+
+def test_config_mismatch():
+    assert config_mismatch(_result(1, 1), _result(1, 1)) == []
+    assert config_mismatch(_result(1, 1), _result(1, 1, concurrency=32)) == ["concurrency"]
@@ -0,0 +1,90 @@
+import asyncio
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from conftest import TestingAsyncSessionLocal
+from models import Book
+from services.book_index import BookIndex, book_index
+
+def test_bitmap_membership():
+    index = BookIndex()
+    for book_id in (1, 8, 9, 1000):
+        index.add(book_id)
+    assert 8 in index and 1000 in index
+    assert 2 not in index and 999 not in index and 10**9 not in index and -1 not in index
+    assert len(index) == 4
+
+def test_rebuild_loads_existing_ids(db_session):
+    db_session.add_all([Book(id=3, title="A", author="X"), Book(id=70, title="B", author="X")])
+    db_session.commit()
+
+    async def rebuild():
+        async with TestingAsyncSessionLocal() as db:
+            return await book_index.rebuild(db)
+
+    try:
+        assert asyncio.run(rebuild()) == 2
+        assert 3 in book_index and 70 in book_index and 4 not in book_index
+    finally:
+        book_index.clear()
+
+def test_cached_reviews_need_no_database(client: TestClient):
+    """Test a cache hit on a known book runs no SQL at all"""
+    book_id = client.post("/books", json={"title": "Indexed", "author": "Author"}).json()["id"]
+    client.get(f"/books/{book_id}/reviews")
+
+    with patch.object(AsyncSession, "execute", side_effect=AssertionError("database hit")), \
+            patch.object(AsyncSession, "scalar", side_effect=AssertionError("database hit")):
+        assert client.get(f"/books/{book_id}/reviews").status_code == 200
+
+def test_missing_books_are_negatively_cached(client: TestClient):
+    """Test repeated 404s skip the database until a book is created"""
+    assert client.get("/books/1/reviews").status_code == 404
+    with patch.object(AsyncSession, "scalar", side_effect=AssertionError("database hit")):
+        assert client.get("/books/1/reviews").status_code == 404
+        assert client.post("/books/1/reviews", json={"reviewer_name": "R", "rating": 3}).status_code == 404
+
+    # Creating the book invalidates the cached 404 for its id
+    assert client.post("/books", json={"title": "New", "author": "Author"}).json()["id"] == 1
+    book_index.clear()  # as if another worker created it
+    assert client.get("/books/1/reviews").status_code == 200
+    assert 1 in book_index
+
+def test_reviews_keep_cached_404s(client: TestClient):
+    """Test review traffic does not invalidate the negative cache"""
+    book_id = client.post("/books", json={"title": "Reviewed", "author": "Author"}).json()["id"]
+    assert client.get("/books/99/reviews").status_code == 404
+    client.post(f"/books/{book_id}/reviews", json={"reviewer_name": "R", "rating": 3})
+
+    with patch.object(AsyncSession, "execute", side_effect=AssertionError("database hit")), \
+            patch.object(AsyncSession, "scalar", side_effect=AssertionError("database hit")):
+        assert client.get("/books/99/reviews").status_code == 404
+
+def test_settled_ids_answer_missing_from_the_bitmap(db_session, client: TestClient):
+    """Test gaps below the settled max id 404 with no query or cache probe"""
+    db_session.add_all([Book(id=1, title="A", author="X"), Book(id=3, title="B", author="X")])
+    db_session.commit()
+
+    async def refresh():
+        async with TestingAsyncSessionLocal() as db:
+            await book_index.refresh(db)
+
+    book_index.settle = 0
+    try:
+        asyncio.run(refresh())
+        assert not book_index.known_missing(2)  # one scan cannot rule out an uncommitted insert
+        asyncio.run(refresh())
+        assert book_index.complete_up_to == 3
+
+        misses = REGISTRY.get_sample_value("cache_misses_total", {"family": "books:list"}) or 0
+        with patch.object(AsyncSession, "execute", side_effect=AssertionError("database hit")), \
+                patch.object(AsyncSession, "scalar", side_effect=AssertionError("database hit")):
+            assert client.get("/books/2/reviews").status_code == 404
+        assert client.get("/books/9/reviews").status_code == 404
+        # Above the mark it takes a query, but the negative-cache probe is not a list miss
+        assert (REGISTRY.get_sample_value("cache_misses_total", {"family": "books:list"}) or 0) == misses
+    finally:
+        book_index.settle = BookIndex().settle
@@ -1,6 +1,8 @@
 import pytest
 from fastapi.testclient import TestClient
 
+from services.book_index import book_index
+
 def test_create_book(client: TestClient):
     """Test creating a new book"""
     book_data = {
@@ -75,4 +77,155 @@ def test_list_books_pagination(client: TestClient):
     response = client.get("/books?skip=2&limit=2")
     assert response.status_code == 200
     data = response.json()
-    assert len(data) == 2
\ No newline at end of file
+    assert len(data) == 2
+
+def test_list_books_cursor_pagination(client: TestClient):
+    """Test keyset pagination walks every book exactly once"""
+    for i in range(5):
+        client.post("/books", json={"title": f"Book {i}", "author": f"Author {i}"})
+    
+    response = client.get("/books?limit=2")
+    assert response.status_code == 200
+    seen = [b["id"] for b in response.json()]
+    cursor = response.headers.get("X-Next-Cursor")
+    
+    while cursor:
+        response = client.get(f"/books?limit=2&cursor={cursor}")
+        assert response.status_code == 200
+        seen.extend(b["id"] for b in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+    
+    assert len(seen) == 5
+    assert seen == sorted(seen)
+
+def test_list_books_invalid_cursor(client: TestClient):
+    """Test a malformed cursor is rejected"""
+    response = client.get("/books?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+def test_bulk_create_books_json_array(client: TestClient):
+    """Test bulk import from a JSON array reports invalid and duplicate items"""
+    client.post("/books", json={"title": "Existing", "author": "Author", "isbn": "1111111111"})
+    
+    books = [
+        {"title": "Bulk 1", "author": "Author", "isbn": "2222222222"},
+        {"title": "", "author": "Author"},  # invalid
+        {"title": "Bulk 2", "author": "Author", "isbn": "1111111111"},  # duplicate of existing
+        {"title": "Bulk 3", "author": "Author", "isbn": "2222222222"},  # duplicate within batch
+        {"title": "Bulk 4", "author": "Author"},
+    ]
+    response = client.post("/books/bulk", json=books)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["inserted"] == 2
+    assert data["failed"] == 3
+    assert [error["index"] for error in data["errors"]] == [1, 2, 3]
+    
+    assert len(client.get("/books").json()) == 3
+
+def test_bulk_create_books_ndjson(client: TestClient):
+    """Test bulk import from a streamed NDJSON body"""
+    lines = [f'{{"title": "Book {i}", "author": "Author"}}' for i in range(25)]
+    lines.insert(3, "{not json")
+    response = client.post(
+        "/books/bulk",
+        content="\n".join(lines) + "\n",
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    assert response.json()["inserted"] == 25
+    assert response.json()["errors"][0]["index"] == 3
+    
+    assert len(client.get("/books?limit=100").json()) == 25
+
+def test_bulk_created_books_get_stats_and_index(client: TestClient):
+    """Test bulk-imported books are indexed and their stats follow reviews"""
+    response = client.post("/books/bulk", json=[{"title": "Bulk", "author": "Author"}])
+    assert response.json()["inserted"] == 1
+    book_id = client.get("/books").json()[0]["id"]
+    assert book_id in book_index
+    
+    client.post(f"/books/{book_id}/reviews", json={"reviewer_name": "R", "rating": 4})
+    book = client.get("/books").json()[0]
+    assert book["review_count"] == 1
+    assert book["average_rating"] == 4.0
+
+def test_bulk_create_books_rejects_non_array(client: TestClient):
+    """Test a JSON body that is not an array is rejected"""
+    response = client.post("/books/bulk", json={"title": "Not a list"})
+    assert response.status_code == 400
+
+def test_get_books_conditional_request(client: TestClient):
+    """Test an unchanged list answers If-None-Match with an empty 304"""
+    client.post("/books", json={"title": "Book 1", "author": "Author"})
+
+    response = client.get("/books")
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "no-cache"
+
+    response = client.get("/books", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    # Pages are versioned separately
+    assert client.get("/books?limit=1", headers={"If-None-Match": etag}).status_code == 200
+
+    # A new book invalidates the list, and with it the ETag
+    client.post("/books", json={"title": "Book 2", "author": "Author"})
+    response = client.get("/books", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    assert response.headers["ETag"] != etag
+
+def test_get_book_detail(client: TestClient):
+    """Test the book page embeds stats and the newest reviews, and tracks new reviews"""
+    book = client.post("/books", json={"title": "Detail", "author": "Author"}).json()
+    for rating in (3.0, 4.0, 5.0):
+        client.post(f"/books/{book['id']}/reviews", json={"reviewer_name": "R", "rating": rating})
+
+    response = client.get(f"/books/{book['id']}", params={"review_limit": 2})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["title"] == "Detail"
+    assert data["stats"]["review_count"] == 3
+    assert data["stats"]["average_rating"] == 4.0
+    assert [review["rating"] for review in data["reviews"]] == [5.0, 4.0]
+
+    # The cursor continues on the reviews endpoint
+    rest = client.get(f"/books/{book['id']}/reviews", params={"cursor": response.headers["X-Next-Cursor"]})
+    assert [review["rating"] for review in rest.json()] == [3.0]
+
+    # A new review invalidates the cached page
+    client.post(f"/books/{book['id']}/reviews", json={"reviewer_name": "R", "rating": 1.0})
+    data = client.get(f"/books/{book['id']}", params={"review_limit": 2}).json()
+    assert data["stats"]["review_count"] == 4
+    assert data["reviews"][0]["rating"] == 1.0
+
+def test_get_book_detail_without_reviews_and_not_found(client: TestClient):
+    book = client.post("/books", json={"title": "Quiet", "author": "Author"}).json()
+    response = client.get(f"/books/{book['id']}")
+    assert response.status_code == 200
+    assert response.json()["reviews"] == []
+    assert response.json()["stats"]["review_count"] == 0
+    assert "X-Next-Cursor" not in response.headers
+
+    assert client.get("/books/999").status_code == 404
+    # Static routes still win over the book id
+    assert client.get("/books/top").status_code == 200
+
+def test_get_books_by_ids(client: TestClient):
+    """Test a batch fetch keeps the requested order, skips unknown ids and tracks new reviews"""
+    ids = [client.post("/books", json={"title": f"Batch {i}", "author": "Author"}).json()["id"] for i in range(3)]
+
+    response = client.get("/books", params={"ids": f"{ids[2]},999,{ids[0]},{ids[2]}"})
+    assert response.status_code == 200
+    assert [book["id"] for book in response.json()] == [ids[2], ids[0]]
+
+    # Served from the per-book entries; a review refreshes that book's summary
+    client.post(f"/books/{ids[0]}/reviews", json={"reviewer_name": "R", "rating": 5})
+    books = client.get("/books", params={"ids": f"{ids[0]},{ids[1]}"}).json()
+    assert [book["review_count"] for book in books] == [1, 0]
+
+    assert client.get("/books", params={"ids": "1,abc"}).status_code == 400
+    assert client.get("/books", params={"ids": ",".join(map(str, range(1000)))}).status_code == 400
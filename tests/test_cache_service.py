@@ -1,78 +1,284 @@
+import asyncio
+import time
 import pytest
-from unittest.mock import MagicMock, patch
-from services.cache_service import CacheService
+import redis.asyncio as redis
+from unittest.mock import AsyncMock, MagicMock, patch
+from services.cache_service import (
+    CacheService, CachedResponse, LocalCache, RawCodec, ResponseCodec, _MISSING, create_redis_client, redis_connection_pool
+)
 
 @pytest.mark.asyncio
 async def test_cache_service_get_success():
     """Test successful cache get operation"""
-    with patch('redis.from_url') as mock_redis_from_url:
-        mock_client = MagicMock()
-        mock_client.ping.return_value = True
-        mock_client.get.return_value = '{"key": "value"}'
-        mock_redis_from_url.return_value = mock_client
-        
-        cache_service = CacheService()
-        result = await cache_service.get("test_key")
-        
-        assert result == {"key": "value"}
-        mock_client.get.assert_called_once_with("test_key")
+    mock_client = AsyncMock()
+    mock_client.get.return_value = '{"key": "value"}'
+
+    cache_service = CacheService(mock_client)
+    result = await cache_service.get("test_key")
+
+    assert result == {"key": "value"}
+    mock_client.get.assert_awaited_once_with("test_key")
 
 @pytest.mark.asyncio
 async def test_cache_service_get_miss():
     """Test cache get with cache miss"""
-    with patch('redis.from_url') as mock_redis_from_url:
-        mock_client = MagicMock()
-        mock_client.ping.return_value = True
-        mock_client.get.return_value = None  # Cache miss
-        mock_redis_from_url.return_value = mock_client
-        
-        cache_service = CacheService()
-        result = await cache_service.get("test_key")
-        
-        assert result is None
+    mock_client = AsyncMock()
+    mock_client.get.return_value = None  # Cache miss
+
+    cache_service = CacheService(mock_client)
+    result = await cache_service.get("test_key")
+
+    assert result is None
 
 @pytest.mark.asyncio
 async def test_cache_service_set_success():
     """Test successful cache set operation"""
-    with patch('redis.from_url') as mock_redis_from_url:
-        mock_client = MagicMock()
-        mock_client.ping.return_value = True
-        mock_client.setex.return_value = True
-        mock_redis_from_url.return_value = mock_client
-        
-        cache_service = CacheService()
-        result = await cache_service.set("test_key", {"data": "value"}, 300)
-        
-        assert result is True
-        mock_client.setex.assert_called_once()
+    mock_client = AsyncMock()
+    mock_client.setex.return_value = True
+
+    cache_service = CacheService(mock_client)
+    result = await cache_service.set("test_key", {"data": "value"}, 300)
+
+    assert result is True
+    mock_client.setex.assert_awaited_once()
 
 @pytest.mark.asyncio
 async def test_cache_service_connection_failure():
     """Test cache service handles connection failures gracefully"""
-    with patch('redis.from_url') as mock_redis_from_url:
-        mock_redis_from_url.side_effect = Exception("Connection failed")
-        
-        cache_service = CacheService()
-        
+    with patch('redis.asyncio.Redis.ping', new_callable=AsyncMock) as mock_ping:
+        mock_ping.side_effect = Exception("Connection failed")
+
+        client = await create_redis_client("redis://localhost:1")
+        assert client is None
+
+        cache_service = CacheService(client)
+
         # Should handle gracefully and return None/False
         get_result = await cache_service.get("test_key")
         set_result = await cache_service.set("test_key", "value")
-        
+
         assert get_result is None
         assert set_result is False
 
 @pytest.mark.asyncio
-async def test_cache_service_invalidate_pattern():
-    """Test cache pattern invalidation"""
-    with patch('redis.from_url') as mock_redis_from_url:
-        mock_client = MagicMock()
-        mock_client.ping.return_value = True
-        mock_client.keys.return_value = ['books:list:0:100', 'books:list:100:100']
-        mock_client.delete.return_value = 2
-        mock_redis_from_url.return_value = mock_client
-        
-        cache_service = CacheService()
-        result = await cache_service.invalidate_pattern("books:list:*")
-        
-        assert result == 2
-        mock_client.keys.assert_called_once_with("books:list:*")
\ No newline at end of file
+async def test_cache_service_errors_do_not_disable_shared_client():
+    """Test a transient Redis error does not switch the shared cache off"""
+    mock_client = AsyncMock()
+    mock_client.get.side_effect = [Exception("Timeout"), '{"key": "value"}']
+
+    cache_service = CacheService(mock_client)
+
+    assert await cache_service.get("test_key") is None
+    assert await cache_service.get("test_key") == {"key": "value"}
+
+@pytest.mark.asyncio
+async def test_cache_service_namespaced_key_embeds_generation():
+    """Test cache keys embed the namespace generation"""
+    mock_client = AsyncMock()
+    mock_client.get.return_value = "7"
+
+    cache_service = CacheService(mock_client)
+    key = await cache_service.namespaced_key("books:list", "0:100")
+
+    assert key == "books:list:g7:0:100"
+    mock_client.get.assert_awaited_once_with("gen:books:list")
+    mock_client.keys.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_generation_errors_never_reuse_an_earlier_outage():
+    """Test a Redis error yields a per-outage generation, never a shared fixed one"""
+    mock_client = AsyncMock()
+    mock_client.get.side_effect = [Exception("down"), Exception("down"), "7"] + [Exception("down again")] * 2
+    mock_client.pipeline = MagicMock(side_effect=Exception("down again"))
+
+    cache_service = CacheService(mock_client)
+    first_outage = await cache_service.get_generation("books:list")
+    assert first_outage != 0
+    # Stable within one outage, so L1 keeps working
+    assert await cache_service.get_generation("books:list") == first_outage
+
+    assert await cache_service.get_generation("books:list") == 7
+    cache_service.local.clear()  # the generation expired from L1
+    second_outage = await cache_service.get_generation("books:list")
+    assert second_outage not in (0, 7, first_outage)
+
+    # A bump that cannot reach Redis still moves this worker on
+    await cache_service.bump_generation("books:list")
+    assert await cache_service.get_generation("books:list") == second_outage + 1
+
+@pytest.mark.asyncio
+async def test_cache_service_bump_generation():
+    """Test namespace invalidation is a single INCR, not a KEYS scan"""
+    mock_client = MagicMock()
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[None, 8])
+    mock_client.pipeline.return_value.__aenter__ = AsyncMock(return_value=pipe)
+    mock_client.pipeline.return_value.__aexit__ = AsyncMock(return_value=False)
+    mock_client.publish = AsyncMock()
+
+    cache_service = CacheService(mock_client)
+    result = await cache_service.bump_generation("books:list")
+
+    assert result == 8
+    pipe.incr.assert_called_once_with("gen:books:list")
+    mock_client.keys.assert_not_called()
+    mock_client.publish.assert_awaited_once_with("cache:invalidate", "books:list 8")
+    # The new generation is served from L1 without another round trip
+    assert await cache_service.get_generation("books:list") == 8
+
+@pytest.mark.asyncio
+async def test_cache_service_l1_serves_repeat_reads():
+    """Test repeated reads are answered from the in-process L1"""
+    mock_client = AsyncMock()
+    mock_client.get.return_value = '{"key": "value"}'
+
+    cache_service = CacheService(mock_client)
+    assert await cache_service.get("test_key") == {"key": "value"}
+    assert await cache_service.get("test_key") == {"key": "value"}
+
+    mock_client.get.assert_awaited_once_with("test_key")
+
+def test_local_cache_lru_and_ttl():
+    """Test the L1 evicts least recently used entries and expires by TTL"""
+    local = LocalCache(max_size=2, ttl=30)
+    local.set("a", 1)
+    local.set("b", 2)
+    local.get("a")
+    local.set("c", 3)
+
+    assert local.get("a") == 1
+    assert local.get("b") is _MISSING
+    assert local.get("b", default=None) is None
+    assert local.get("c") == 3
+
+    local.set("d", 4, ttl=-1)
+    assert local.get("d") is _MISSING
+
+@pytest.mark.asyncio
+async def test_cache_service_in_process_invalidation_without_redis():
+    """Test a generation bump reaches every worker cache in the process"""
+    writer = CacheService()
+    reader = CacheService()
+
+    key = await reader.namespaced_key("books:list", "0:100")
+    await reader.set(key, ["stale"])
+    assert await reader.get(await reader.namespaced_key("books:list", "0:100")) == ["stale"]
+
+    await writer.bump_generation("books:list")
+
+    assert await reader.get(await reader.namespaced_key("books:list", "0:100")) is None
+
+@pytest.mark.asyncio
+async def test_cache_service_single_flight_coalesces_misses():
+    """Test concurrent misses for one key run the loader once"""
+    cache_service = CacheService()
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"items": [1, 2, 3]}
+
+    results = await asyncio.gather(*(cache_service.get_or_load("books:list:g0:0:100", loader) for _ in range(20)))
+
+    assert calls == 1
+    assert all(result == {"items": [1, 2, 3]} for result in results)
+
+@pytest.mark.asyncio
+async def test_cache_service_single_flight_shares_errors():
+    """Test waiters see the leader's error and the next call retries"""
+    cache_service = CacheService()
+
+    async def failing_loader():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("database down")
+
+    results = await asyncio.gather(
+        *(cache_service.get_or_load("key", failing_loader) for _ in range(3)), return_exceptions=True
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    async def loader():
+        return {"ok": True}
+
+    assert await cache_service.get_or_load("key", loader) == {"ok": True}
+
+@pytest.mark.asyncio
+async def test_cache_service_lock_held_elsewhere_waits_for_value():
+    """Test a process that loses the Redis lock reuses the winner's result"""
+    mock_client = AsyncMock()
+    mock_client.get.side_effect = [None, '{"from": "other process"}']
+    mock_client.set.return_value = None  # SET NX failed - lock held elsewhere
+
+    cache_service = CacheService(mock_client)
+    cache_service.lock_ms = 100
+    loader = AsyncMock()
+
+    result = await cache_service.get_or_load("key", loader)
+
+    assert result == {"from": "other process"}
+    loader.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_cache_service_response_codec_round_trip():
+    """Test cached responses come back from Redis as the stored body bytes"""
+    mock_client = AsyncMock()
+    mock_client.setex.return_value = True
+    cached = CachedResponse(body=b'[{"id": 1}]', headers={"X-Next-Cursor": "abc"})
+
+    writer = CacheService(mock_client)
+    await writer.set("books:list:g1:0:100", cached, codec=ResponseCodec)
+    stored = mock_client.setex.await_args.args[2]
+
+    reader = CacheService(AsyncMock(get=AsyncMock(return_value=stored)))
+    result = await reader.get("books:list:g1:0:100", codec=ResponseCodec)
+
+    assert result == cached
+    assert result.to_response().body == b'[{"id": 1}]'
+    assert result.to_response().headers["X-Next-Cursor"] == "abc"
+
+@pytest.mark.asyncio
+async def test_cache_service_batch_operations():
+    """Test batched reads and writes share one round trip per step"""
+    fakeredis = pytest.importorskip("fakeredis")
+    cache_service = CacheService(fakeredis.FakeAsyncRedis())
+
+    keys = await cache_service.namespaced_keys(["reviews:book:1", "reviews:book:2"], "book")
+    assert keys["reviews:book:1"].startswith("reviews:book:1:g")
+    assert await cache_service.get_generation("reviews:book:2") == int(keys["reviews:book:2"].split(":g")[1].split(":")[0])
+
+    assert await cache_service.set_many({keys["reviews:book:1"]: b'{"id":1}'}, codec=RawCodec)
+    cache_service.local.clear()
+    found = await cache_service.get_many(keys.values(), codec=RawCodec)
+    assert found == {keys["reviews:book:1"]: b'{"id":1}'}
+
+@pytest.mark.asyncio
+async def test_etag_follows_content_without_a_shared_generation():
+    """Test a worker that never saw the bump stops answering 304 once it reloads"""
+    cache_service = CacheService()
+    key = await cache_service.namespaced_key("books:list", "0:100")
+    bodies = iter([b'[{"review_count": 0}]', b'[{"review_count": 1}]'])
+    load = lambda: asyncio.sleep(0, CachedResponse(body=next(bodies)))
+
+    etag = (await cache_service.get_or_load_response(key, load)).headers["ETag"]
+    assert (await cache_service.get_or_load_response(key, load, if_none_match=etag)).status_code == 304
+
+    cache_service.local.clear()  # the entry expired; the generation is unchanged
+    response = await cache_service.get_or_load_response(key, load, if_none_match=etag)
+    assert response.status_code == 200
+    assert response.body == b'[{"review_count": 1}]'
+    assert response.headers["ETag"] != etag
+
+@pytest.mark.asyncio
+async def test_unreachable_redis_fails_fast():
+    """Test a refused connection falls back at once instead of waiting on the pool"""
+    start = time.perf_counter()
+    assert await create_redis_client("redis://localhost:1") is None
+
+    # Redis going away while the app runs: every operation degrades to a miss
+    cache_service = CacheService(redis.Redis(connection_pool=redis_connection_pool("redis://localhost:1")))
+    for i in range(3):
+        assert await cache_service.get(f"key:{i}") is None
+        assert await cache_service.set(f"key:{i}", "value") is False
+    assert time.perf_counter() - start < 1
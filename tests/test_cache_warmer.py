@@ -0,0 +1,63 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from conftest import TestingAsyncSessionLocal
+from services.cache_service import CacheService, HotKeyTracker, logical_key
+from services.cache_warmer import CacheWarmer
+
+def test_hot_key_tracker_counts_logical_keys_per_family():
+    tracker = HotKeyTracker(capacity=2)
+    for _ in range(3):
+        tracker.record("books:list:g5:0:100")
+    tracker.record("books:list:g6:0:100")
+    tracker.record("reviews:book:1:g9:0:20")
+    for i in range(20):
+        tracker.record(f"reviews:book:{i + 2}:g1:0:20")
+
+    assert logical_key("reviews:book:7:g123:detail:10") == "reviews:book:7:detail:10"
+    assert tracker.hot("books:list") == ["books:list:0:100"]
+    # Each family is bounded; the hottest keys survive trimming
+    assert len(tracker.hot("reviews:book", limit=100)) <= 8
+    assert tracker.take_unsaved()["books:list:0:100"] == 4
+
+def test_invalidation_rewarms_hot_pages(client: TestClient, cache_service):
+    """Test a new book schedules the hot list pages and warming refills them"""
+    warmer = CacheWarmer(TestingAsyncSessionLocal, cache_service, rate=100)
+    book_id = client.post("/books", json={"title": "Warm", "author": "Author"}).json()["id"]
+    client.get("/books")
+    client.get(f"/books/{book_id}")
+    client.post("/books", json={"title": "Warmer", "author": "Author"})
+    assert warmer.pending == {"books:list:0:100"}
+
+    warmer.pending.clear()
+    client.post(f"/books/{book_id}/reviews", json={"reviewer_name": "R", "rating": 5})
+    assert warmer.pending == {f"reviews:book:{book_id}:detail:10"}
+
+    async def warm_pending():
+        return [await warmer.warm(key) for key in sorted(warmer.pending)]
+
+    assert asyncio.run(warm_pending()) == [True]
+    with patch.object(AsyncSession, "execute", side_effect=AssertionError("database hit")):
+        detail = client.get(f"/books/{book_id}").json()
+    assert detail["stats"]["review_count"] == 1
+    # Warming is not counted as traffic
+    assert cache_service.hot_keys.take_unsaved()[f"reviews:book:{book_id}:detail:10"] == 2
+
+    assert asyncio.run(warmer.warm("books:list:search:0:20:fantasy")) is False
+
+@pytest.mark.asyncio
+async def test_hot_keys_persist_across_restarts():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    before = CacheService(fakeredis.FakeAsyncRedis(server=server))
+    for _ in range(3):
+        before.hot_keys.record("books:list:g1:0:100")
+    before.hot_keys.record("books:top:rating:all:10")
+    await before.persist_hot_keys()
+
+    after = CacheService(fakeredis.FakeAsyncRedis(server=server))
+    assert sorted(await after.load_hot_keys(10)) == ["books:list:0:100", "books:top:rating:all:10"]
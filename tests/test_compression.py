@@ -0,0 +1,81 @@
+import gzip
+
+import pytest
+from fastapi.testclient import TestClient
+
+import compression
+from compression import encoded_etag, parse_accept_encoding, strip_etag_encoding
+from services.cache_service import CachedResponse, ResponseCodec, etag_matches
+
+@pytest.fixture
+def catalog(client: TestClient):
+    """Enough books for the first page to pass the compression threshold"""
+    for i in range(30):
+        client.post("/books", json={
+            "title": f"Book {i}",
+            "author": "Author",
+            "description": "A long enough description to make the page worth compressing",
+        })
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding(None) == ()
+    assert parse_accept_encoding("identity") == ()
+    assert parse_accept_encoding("gzip, deflate") == ("gzip",)
+    assert parse_accept_encoding("gzip;q=0") == ()
+    assert "gzip" in parse_accept_encoding("*")
+
+def test_etag_encoding_round_trip():
+    assert encoded_etag('"abc"', "gzip") == '"abc-gzip"'
+    assert strip_etag_encoding('"abc-gzip"') == '"abc"'
+    assert strip_etag_encoding('"abc"') == '"abc"'
+    assert etag_matches('W/"abc-gzip"', '"abc"') == '"abc-gzip"'
+
+def test_response_codec_keeps_encoded_bodies():
+    body = b'{"a": 1}' * 200
+    response = CachedResponse(body=body, headers={"ETag": '"x"'}).precompressed()
+    assert set(response.encoded) == set(compression.SUPPORTED_ENCODINGS)
+
+    loaded = ResponseCodec.loads(ResponseCodec.dumps(response))
+    assert loaded.body == body
+    assert gzip.decompress(loaded.encoded["gzip"]) == body
+    # Entries written before compression existed still load
+    assert ResponseCodec.loads(b'{"headers": {}, "media_type": null}\nraw').body == b"raw"
+
+def test_list_served_gzip_from_cache(client: TestClient, catalog, monkeypatch):
+    """Test a hot page is compressed once per cache fill, not per request"""
+    response = client.get("/books", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert len(response.json()) == 30
+    etag = response.headers["ETag"]
+    assert etag.endswith('-gzip"')
+
+    def fail(*args, **kwargs):
+        raise AssertionError("cache hit recompressed the body")
+
+    monkeypatch.setattr(compression, "compress", fail)
+    cached = client.get("/books", headers={"Accept-Encoding": "gzip"})
+    assert cached.headers["Content-Encoding"] == "gzip"
+    assert cached.json() == response.json()
+
+    # The compressed representation's ETag revalidates
+    assert client.get("/books", headers={"Accept-Encoding": "gzip", "If-None-Match": etag}).status_code == 304
+
+    plain = client.get("/books", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in plain.headers
+    assert plain.headers["ETag"] == strip_etag_encoding(etag)
+    assert plain.json() == response.json()
+
+def test_small_responses_are_not_compressed(client: TestClient):
+    client.post("/books", json={"title": "Book", "author": "Author"})
+    response = client.get("/books", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert "Content-Encoding" not in client.get("/health", headers={"Accept-Encoding": "gzip"}).headers
+
+def test_streamed_export_is_compressed(client: TestClient, catalog):
+    response = client.get("/export/books?format=csv", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text.count("\n") == 31
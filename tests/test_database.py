@@ -0,0 +1,43 @@
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, exc, text
+
+from database import TimedQueuePool, configure_engine, engine_options
+
+def metric(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+def test_sqlite_profile_applies_pragmas(tmp_path):
+    url = f"sqlite:///{tmp_path / 'profile.db'}"
+    engine = create_engine(url, **engine_options(url))
+    configure_engine(engine)
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    assert isinstance(engine.pool, TimedQueuePool)
+    engine.dispose()
+
+def test_postgres_profile_sets_pool_and_statement_timeout():
+    options = engine_options("postgresql+asyncpg://user:pw@db/books", is_async=True)
+    assert options["pool_pre_ping"] is True
+    assert options["pool_size"] > 0
+    assert "statement_timeout" in options["connect_args"]["server_settings"]
+
+    options = engine_options("postgresql://user:pw@db/books")
+    assert options["connect_args"]["options"].startswith("-c statement_timeout=")
+
+def test_pool_checkout_wait_and_timeout_are_exported(tmp_path):
+    url = f"sqlite:///{tmp_path / 'pool.db'}"
+    engine = create_engine(url, **{**engine_options(url), "pool_size": 1, "max_overflow": 0, "pool_timeout": 0.05})
+    checkouts = metric("db_pool_checkout_seconds_count", pool="sync")
+    timeouts = metric("db_pool_timeouts_total", pool="sync")
+
+    with engine.connect():
+        assert metric("db_pool_checked_out", pool="sync") == 1
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+
+    assert metric("db_pool_checkout_seconds_count", pool="sync") == checkouts + 2
+    assert metric("db_pool_timeouts_total", pool="sync") == timeouts + 1
+    engine.dispose()
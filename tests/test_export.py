@@ -0,0 +1,41 @@
+import csv
+import io
+import json
+import pytest
+from fastapi.testclient import TestClient
+
+@pytest.fixture
+def catalog(client: TestClient):
+    """Create a few books with reviews"""
+    books = []
+    for i in range(3):
+        response = client.post("/books", json={"title": f"Book {i}", "author": "Author, Jr."})
+        books.append(response.json())
+        for rating in [3.0, 5.0]:
+            client.post(f"/books/{books[-1]['id']}/reviews", json={"reviewer_name": "Reader", "rating": rating})
+    return books
+
+def test_export_books_ndjson(client: TestClient, catalog):
+    """Test books export streams one JSON object per line"""
+    response = client.get("/export/books")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == [book["id"] for book in catalog]
+    assert rows[0]["author"] == "Author, Jr."
+
+def test_export_reviews_csv(client: TestClient, catalog):
+    """Test reviews export as CSV with a header row, filtered by book"""
+    response = client.get(f"/export/reviews?format=csv&book_id={catalog[0]['id']}")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 2
+    assert {row["rating"] for row in rows} == {"3.0", "5.0"}
+
+def test_export_invalid_format(client: TestClient):
+    """Test unsupported export formats are rejected"""
+    response = client.get("/export/books?format=xml")
+    assert response.status_code == 422
@@ -0,0 +1,87 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from fastapi.testclient import TestClient
+
+from conftest import TestingAsyncSessionLocal
+from services.leaderboard_service import (
+    LeaderboardService, MemoryLeaderboardStore, RedisLeaderboardStore, bayesian_score, local_leaderboard,
+)
+
+def _add_book(client: TestClient, title: str, ratings):
+    book = client.post("/books", json={"title": title, "author": "Author"}).json()
+    for rating in ratings:
+        client.post(f"/books/{book['id']}/reviews", json={"reviewer_name": "R", "rating": rating})
+    return book["id"]
+
+def test_bayesian_score_discounts_few_reviews():
+    assert bayesian_score(1, 5.0) < bayesian_score(20, 20 * 4.5)
+    assert bayesian_score(0, 0.0) == pytest.approx(3.0)
+
+def test_top_books_by_rating_and_reviews(client: TestClient):
+    one_hit = _add_book(client, "One five-star review", [5])
+    steady = _add_book(client, "Many good reviews", [4.5] * 12)
+    poor = _add_book(client, "Many poor reviews", [2] * 15)
+
+    response = client.get("/books/top", params={"by": "rating"})
+    assert response.status_code == 200
+    data = response.json()
+    assert [book["id"] for book in data] == [steady, one_hit, poor]
+    assert data[0]["window_review_count"] == 12
+    assert data[0]["title"] == "Many good reviews"
+
+    response = client.get("/books/top", params={"by": "reviews", "window": "7d", "limit": 2})
+    data = response.json()
+    assert [book["id"] for book in data] == [poor, steady]
+    assert data[0]["score"] == 15
+
+def test_top_books_validates_parameters(client: TestClient):
+    assert client.get("/books/top", params={"by": "votes"}).status_code == 422
+    assert client.get("/books/top", params={"window": "1y"}).status_code == 422
+
+@pytest.mark.asyncio
+async def test_memory_store_windows():
+    store = MemoryLeaderboardStore()
+    now = datetime.now(timezone.utc)
+    await store.record(1, [(5.0, now - timedelta(days=20))] * 30)
+    await store.record(2, [(4.0, now)] * 5)
+
+    assert [entry[0] for entry in await store.top("reviews", "all", 10)] == [1, 2]
+    assert [entry[0] for entry in await store.top("reviews", "7d", 10)] == [2]
+    assert [entry[0] for entry in await store.top("reviews", "30d", 10)] == [1, 2]
+
+@pytest.mark.asyncio
+async def test_rebuild_from_database(client: TestClient):
+    steady = _add_book(client, "Steady", [4, 5, 4, 5])
+    local_leaderboard.clear()
+
+    async with TestingAsyncSessionLocal() as db:
+        assert await LeaderboardService(db).rebuild() == 1
+    assert await local_leaderboard.top("rating", "all", 10) == [(steady, bayesian_score(4, 18.0), 4)]
+    assert [entry[0] for entry in await local_leaderboard.top("rating", "7d", 10)] == [steady]
+
+@pytest.mark.asyncio
+async def test_redis_store_matches_memory_store():
+    fakeredis = pytest.importorskip("fakeredis")
+    redis_store = RedisLeaderboardStore(fakeredis.FakeAsyncRedis())
+    memory_store = MemoryLeaderboardStore()
+    now = datetime.now(timezone.utc)
+    writes = [
+        (1, [(5.0, now)]),
+        (2, [(4.5, now)] * 12),
+        (3, [(5.0, now - timedelta(days=10))] * 40),
+        (2, [(4.0, now - timedelta(days=3))] * 2),
+    ]
+    for book_id, ratings in writes:
+        await redis_store.record(book_id, ratings)
+        await memory_store.record(book_id, ratings)
+
+    assert not await redis_store.is_empty()
+    for by in ("rating", "reviews"):
+        for window in ("all", "7d", "30d"):
+            expected = await memory_store.top(by, window, 10)
+            actual = await redis_store.top(by, window, 10)
+            assert [(book_id, count) for book_id, _, count in actual] == [(book_id, count) for book_id, _, count in expected]
+            assert [score for _, score, _ in actual] == pytest.approx([score for _, score, _ in expected])
+
+    await redis_store.replace({2: (1, 3.0)}, {})
+    assert await redis_store.top("rating", "all", 10) == [(2, pytest.approx(bayesian_score(1, 3.0)), 1)]
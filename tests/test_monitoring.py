@@ -0,0 +1,58 @@
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+
+from monitoring import QueryStats, _query_stats, instrument_engine, key_family
+
+def metric(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+def test_metrics_endpoint_exposes_route_templates(client: TestClient):
+    """Test requests are labelled by route template and status"""
+    client.post("/books", json={"title": "Metrics Book", "author": "Author"})
+    before = metric("http_requests_total", method="GET", endpoint="/books/{book_id}/reviews", status="404")
+    
+    client.get("/books/12345/reviews")
+    
+    after = metric("http_requests_total", method="GET", endpoint="/books/{book_id}/reviews", status="404")
+    assert after == before + 1
+    
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "http_request_duration_seconds_bucket" in response.text
+    assert 'endpoint="/books/{book_id}/reviews"' in response.text
+
+def test_cache_hit_and_miss_counters(client: TestClient):
+    """Test the cache emits miss then hit counters for a list page"""
+    misses = metric("cache_misses_total", family="books:list")
+    hits = metric("cache_hits_total", tier="l1", family="books:list")
+    
+    client.get("/books")
+    client.get("/books")
+    
+    assert metric("cache_misses_total", family="books:list") == misses + 1
+    assert metric("cache_hits_total", tier="l1", family="books:list") == hits + 1
+
+def test_instrument_engine_records_queries_per_request():
+    """Test cursor hooks count statements for the active request"""
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    instrument_engine(engine)  # idempotent
+    
+    stats = QueryStats()
+    token = _query_stats.set(stats)
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+    finally:
+        _query_stats.reset(token)
+    
+    assert stats.count == 2
+    assert stats.duration > 0
+
+def test_key_family():
+    """Test cache keys collapse to low-cardinality families"""
+    assert key_family("books:list:g12:0:100") == "books:list"
+    assert key_family("reviews:book:7:g3:0:100") == "reviews:book"
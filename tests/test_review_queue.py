@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy.exc import OperationalError
+
+from conftest import TestingAsyncSessionLocal
+from main import app, get_review_queue
+from models import Book
+from schemas import ReviewCreate
+from services.review_queue import ReviewQueueFull, ReviewWriteQueue
+
+@pytest.fixture
+def review_queue(client: TestClient, cache_service):
+    """Write-behind mode with the flusher left stopped, so tests flush explicitly"""
+    queue = ReviewWriteQueue(TestingAsyncSessionLocal, cache_service, maxsize=2, batch_size=10)
+    app.dependency_overrides[get_review_queue] = lambda: queue
+    return queue
+
+def test_queued_review_is_acknowledged_then_flushed(client: TestClient, review_queue):
+    book = client.post("/books", json={"title": "Queued", "author": "Author"}).json()
+    assert client.get(f"/books/{book['id']}/reviews").json() == []
+
+    response = client.post(f"/books/{book['id']}/reviews", json={"reviewer_name": "R", "rating": 4.0})
+    assert response.status_code == 202
+    data = response.json()
+    assert data["status"] == "queued"
+    assert data["book_id"] == book["id"]
+    assert data["ticket"]
+
+    assert asyncio.run(review_queue.flush()) == 1
+    # The flush invalidated the cached (empty) page
+    reviews = client.get(f"/books/{book['id']}/reviews").json()
+    assert [review["rating"] for review in reviews] == [4.0]
+    assert client.get(f"/books/{book['id']}/stats").json()["review_count"] == 1
+
+def test_full_queue_answers_429(client: TestClient, review_queue):
+    book = client.post("/books", json={"title": "Busy", "author": "Author"}).json()
+    for _ in range(2):
+        assert client.post(f"/books/{book['id']}/reviews", json={"reviewer_name": "R", "rating": 3.0}).status_code == 202
+
+    response = client.post(f"/books/{book['id']}/reviews", json={"reviewer_name": "R", "rating": 3.0})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+    assert client.post("/books/999/reviews", json={"reviewer_name": "R", "rating": 3.0}).status_code == 404
+
+@pytest.mark.asyncio
+async def test_flusher_batches_and_invalidates_once_per_book(db_session, cache_service):
+    db_session.add_all([Book(id=1, title="A", author="X"), Book(id=2, title="B", author="X")])
+    db_session.commit()
+
+    bumped = []
+    original = cache_service.bump_generation
+
+    async def bump_generation(namespace):
+        bumped.append(namespace)
+        return await original(namespace)
+
+    cache_service.bump_generation = bump_generation
+    queue = ReviewWriteQueue(TestingAsyncSessionLocal, cache_service, maxsize=10, batch_size=10, interval_ms=20)
+    queue.start()
+    for book_id, rating in ((1, 5.0), (1, 4.0), (2, 3.0)):
+        queue.submit(book_id, ReviewCreate(reviewer_name="R", rating=rating))
+    await asyncio.sleep(0.2)
+
+    assert sorted(bumped) == ["reviews:book:1", "reviews:book:2"]
+    assert len(db_session.query(Book).get(1).reviews) == 2
+
+    # Shutdown writes whatever is still queued
+    queue.submit(2, ReviewCreate(reviewer_name="R", rating=1.0))
+    await queue.stop()
+    db_session.expire_all()
+    assert len(db_session.query(Book).get(2).reviews) == 2
+
+    with pytest.raises(ReviewQueueFull):
+        full = ReviewWriteQueue(TestingAsyncSessionLocal, cache_service, maxsize=1)
+        full.submit(1, ReviewCreate(reviewer_name="R", rating=2.0))
+        full.submit(1, ReviewCreate(reviewer_name="R", rating=2.0))
+
+@pytest.mark.asyncio
+async def test_transient_failures_are_retried_and_the_flusher_survives(db_session, cache_service):
+    """Test a failed batch is retried, not dropped, and a post-write error does not stop the flusher"""
+    db_session.add(Book(id=1, title="A", author="X"))
+    db_session.commit()
+    failed = REGISTRY.get_sample_value("review_queue_failed_total") or 0
+
+    queue = ReviewWriteQueue(TestingAsyncSessionLocal, cache_service, maxsize=10, interval_ms=10, retry_max_ms=20)
+    original_insert = queue._insert
+    outages = [OperationalError("INSERT", {}, Exception("database restarting"))] * 2
+
+    async def flaky_insert(*args):
+        if outages:
+            raise outages.pop()
+        await original_insert(*args)
+
+    async def broken_bump(namespace):
+        raise RuntimeError("cache down")
+
+    queue._insert = flaky_insert
+    cache_service.bump_generation = broken_bump
+    queue.start()
+    queue.submit(1, ReviewCreate(reviewer_name="R", rating=5.0))
+    await asyncio.sleep(0.3)
+    assert len(db_session.query(Book).get(1).reviews) == 1
+
+    # The cache error after the first write did not kill the flusher
+    queue.submit(1, ReviewCreate(reviewer_name="R", rating=4.0))
+    await asyncio.sleep(0.1)
+    db_session.expire_all()
+    assert len(db_session.query(Book).get(1).reviews) == 2
+    assert (REGISTRY.get_sample_value("review_queue_failed_total") or 0) == failed
+    await queue.stop()
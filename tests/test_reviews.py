@@ -1,5 +1,7 @@
 import pytest
 from fastapi.testclient import TestClient
+from unittest.mock import patch
+from sqlalchemy.ext.asyncio import AsyncSession
 
 @pytest.fixture
 def sample_book(client: TestClient):
@@ -79,4 +81,157 @@ def test_review_rating_validation(client: TestClient, sample_book):
             "comment": "Test comment"
         }
         response = client.post(f"/books/{sample_book['id']}/reviews", json=review_data)
-        assert response.status_code == 422  # Validation error
\ No newline at end of file
+        assert response.status_code == 422  # Validation error
+
+def test_get_book_reviews_cursor_pagination(client: TestClient, sample_book):
+    """Test keyset pagination over reviews created within the same second"""
+    for i in range(5):
+        review = {"reviewer_name": f"Reviewer {i}", "rating": 4.0}
+        response = client.post(f"/books/{sample_book['id']}/reviews", json=review)
+        assert response.status_code == 201
+    
+    response = client.get(f"/books/{sample_book['id']}/reviews?limit=2")
+    seen = [r["id"] for r in response.json()]
+    cursor = response.headers.get("X-Next-Cursor")
+    
+    while cursor:
+        response = client.get(f"/books/{sample_book['id']}/reviews?limit=2&cursor={cursor}")
+        assert response.status_code == 200
+        seen.extend(r["id"] for r in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+    
+    # Newest first, no duplicates or gaps
+    assert seen == sorted(seen, reverse=True)
+    assert len(set(seen)) == 5
+
+def test_get_book_stats(client: TestClient, sample_book):
+    """Test rating aggregates are maintained as reviews are created"""
+    response = client.get(f"/books/{sample_book['id']}/stats")
+    assert response.status_code == 200
+    assert response.json()["review_count"] == 0
+    assert response.json()["average_rating"] is None
+    
+    for rating in [5.0, 4.4, 4.6, 1.0]:
+        review = {"reviewer_name": "Reader", "rating": rating}
+        assert client.post(f"/books/{sample_book['id']}/reviews", json=review).status_code == 201
+    
+    response = client.get(f"/books/{sample_book['id']}/stats")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["review_count"] == 4
+    assert data["average_rating"] == 3.75
+    assert data["rating_histogram"] == {"1": 1, "2": 0, "3": 0, "4": 1, "5": 2}
+    
+    # Aggregates are also exposed on the book listing
+    books = client.get("/books").json()
+    assert books[0]["review_count"] == 4
+    assert books[0]["average_rating"] == 3.75
+
+def test_review_refreshes_book_listings(client: TestClient, sample_book):
+    """Test list and search pages, and the list ETag, reflect a new review's rating
+    without reloading the cached pages themselves"""
+    from unittest.mock import patch
+    from services.book_service import BookService
+    from services.search_service import SearchService
+
+    etag = client.get("/books").headers["ETag"]
+    assert client.get("/search", params={"q": "test"}).json()[0]["review_count"] == 0
+
+    client.post(f"/books/{sample_book['id']}/reviews", json={"reviewer_name": "R", "rating": 4.0})
+    with patch.object(BookService, "_load_books_page", side_effect=AssertionError("list page reloaded")), \
+            patch.object(SearchService, "_search", side_effect=AssertionError("search reloaded")):
+        response = client.get("/books", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()[0]["review_count"] == 1
+        assert client.get("/search", params={"q": "test"}).json()[0]["average_rating"] == 4.0
+
+def test_get_book_stats_nonexistent_book(client: TestClient):
+    """Test stats for a non-existent book return 404"""
+    response = client.get("/books/999/stats")
+    assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_rebuild_stats_from_reviews(client: TestClient, sample_book):
+    """Test the rebuild job recomputes aggregates from the reviews table"""
+    from sqlalchemy import update
+    from models import BookStats
+    from services.stats_service import StatsService
+    from conftest import TestingAsyncSessionLocal
+    
+    for rating in [2.0, 3.0, 3.4]:
+        client.post(f"/books/{sample_book['id']}/reviews", json={"reviewer_name": "Reader", "rating": rating})
+    
+    async with TestingAsyncSessionLocal() as db:
+        # Corrupt the aggregate, then rebuild it
+        await db.execute(update(BookStats).values(review_count=0, rating_sum=0.0))
+        await db.commit()
+        assert await StatsService(db).rebuild() == 1
+    
+    data = client.get(f"/books/{sample_book['id']}/stats").json()
+    assert data["review_count"] == 3
+    assert data["average_rating"] == 2.8
+    assert data["rating_histogram"] == {"1": 0, "2": 1, "3": 2, "4": 0, "5": 0}
+
+def test_bulk_create_reviews(client: TestClient, sample_book):
+    """Test bulk review import updates reviews and aggregates once per chunk"""
+    client.get(f"/books/{sample_book['id']}/reviews")  # warm the cache
+    
+    reviews = [{"reviewer_name": f"Reader {i}", "rating": 4.0} for i in range(10)]
+    reviews.append({"reviewer_name": "Bad", "rating": 9})
+    response = client.post(f"/books/{sample_book['id']}/reviews/bulk", json=reviews)
+    assert response.status_code == 200
+    assert response.json()["inserted"] == 10
+    assert response.json()["failed"] == 1
+    
+    assert len(client.get(f"/books/{sample_book['id']}/reviews").json()) == 10
+    stats = client.get(f"/books/{sample_book['id']}/stats").json()
+    assert stats["review_count"] == 10
+    assert stats["rating_histogram"]["4"] == 10
+
+def test_bulk_create_reviews_nonexistent_book(client: TestClient):
+    """Test bulk review import for a missing book returns 404"""
+    response = client.post("/books/999/reviews/bulk", json=[{"reviewer_name": "A", "rating": 3}])
+    assert response.status_code == 404
+
+def test_get_book_reviews_conditional_request(client: TestClient, sample_book):
+    """Test a matching If-None-Match is answered without touching the database"""
+    book_id = sample_book["id"]
+    client.post(f"/books/{book_id}/reviews", json={"reviewer_name": "A", "rating": 4})
+
+    etag = client.get(f"/books/{book_id}/reviews").headers["ETag"]
+    with patch.object(AsyncSession, "get", side_effect=AssertionError("database hit")), \
+            patch.object(AsyncSession, "execute", side_effect=AssertionError("database hit")):
+        response = client.get(f"/books/{book_id}/reviews", headers={"If-None-Match": f'W/{etag}, "other"'})
+    assert response.status_code == 304
+
+    client.post(f"/books/{book_id}/reviews", json={"reviewer_name": "B", "rating": 5})
+    response = client.get(f"/books/{book_id}/reviews", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+
+def test_get_reviews_for_books(client: TestClient):
+    """Test one request returns the newest reviews of each book"""
+    first = client.post("/books", json={"title": "First", "author": "Author"}).json()["id"]
+    second = client.post("/books", json={"title": "Second", "author": "Author"}).json()["id"]
+    for rating in (1, 2, 3):
+        client.post(f"/books/{first}/reviews", json={"reviewer_name": "A", "rating": rating})
+    client.post(f"/books/{second}/reviews", json={"reviewer_name": "B", "rating": 5})
+
+    response = client.get("/reviews", params={"book_ids": f"{first},{second},999", "per_book": 2})
+    assert response.status_code == 200
+    data = response.json()
+    assert [review["rating"] for review in data[str(first)]] == [3, 2]
+    assert [review["rating"] for review in data[str(second)]] == [5]
+    assert data["999"] == []
+
+    # The batch filled the same entry the single-book endpoint reads
+    with patch.object(AsyncSession, "execute", side_effect=AssertionError("database hit")):
+        page = client.get(f"/books/{first}/reviews", params={"limit": 2})
+    assert [review["rating"] for review in page.json()] == [3, 2]
+    assert "ETag" in page.headers
+
+    client.post(f"/books/{first}/reviews", json={"reviewer_name": "A", "rating": 4})
+    data = client.get("/reviews", params={"book_ids": str(first), "per_book": 2}).json()
+    assert [review["rating"] for review in data[str(first)]] == [4, 3]
+
+    assert client.get("/reviews", params={"book_ids": "x"}).status_code == 400
@@ -0,0 +1,84 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from conftest import engine
+from database import Base
+
+BOOKS = [
+    {"title": "Dune", "author": "Frank Herbert", "description": "Desert planet politics and spice"},
+    {"title": "The Desert Spear", "author": "Peter Brett", "description": "Demons at night"},
+    {"title": "Children of Dune", "author": "Frank Herbert", "description": "Sequel on the desert planet"},
+    {"title": "Gardening Basics", "author": "Jane Green", "description": "Soil, seeds and water"},
+]
+
+@pytest.fixture
+def books(client: TestClient):
+    return [client.post("/books", json=book).json() for book in BOOKS]
+
+def test_search_ranks_title_matches_first(client: TestClient, books):
+    """Title matches outrank description-only matches"""
+    response = client.get("/search", params={"q": "desert"})
+    assert response.status_code == 200
+    titles = [book["title"] for book in response.json()]
+    assert titles[0] == "The Desert Spear"
+    assert set(titles) == {"Dune", "The Desert Spear", "Children of Dune"}
+
+def test_search_matches_all_terms_with_prefix_and_stemming(client: TestClient, books):
+    response = client.get("/search", params={"q": "herbert plan"})
+    assert [book["title"] for book in response.json()] == ["Dune", "Children of Dune"]
+
+    response = client.get("/search", params={"q": "planets"})
+    assert len(response.json()) == 2
+
+def test_search_includes_new_books(client: TestClient, books):
+    """The index is maintained on create_book, and cached results are invalidated"""
+    assert client.get("/search", params={"q": "orchids"}).json() == []
+    client.post("/books", json={"title": "Orchids", "author": "Someone"})
+    assert [book["title"] for book in client.get("/search", params={"q": "orchids"}).json()] == ["Orchids"]
+
+def test_search_review_comments(client: TestClient, books):
+    gardening = books[3]["id"]
+    client.post(f"/books/{gardening}/reviews", json={"reviewer_name": "Ann", "rating": 5, "comment": "Great for tomatoes"})
+
+    assert client.get("/search", params={"q": "tomatoes"}).json() == []
+    response = client.get("/search", params={"q": "tomatoes", "include_reviews": True})
+    assert [book["id"] for book in response.json()] == [gardening]
+
+def test_search_pagination(client: TestClient, books):
+    response = client.get("/search", params={"q": "desert", "limit": 2})
+    first_page = [book["id"] for book in response.json()]
+    assert len(first_page) == 2
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = client.get("/search", params={"q": "desert", "limit": 2, "cursor": cursor})
+    second_page = [book["id"] for book in response.json()]
+    assert len(second_page) == 1
+    assert "X-Next-Cursor" not in response.headers
+    assert not set(first_page) & set(second_page)
+
+def test_search_treats_operators_as_text(client: TestClient, books):
+    """FTS syntax in the query is neutralised rather than raising"""
+    response = client.get("/search", params={"q": 'dune" OR NEAR(*'})
+    assert response.status_code == 200
+
+def test_search_rejects_queries_without_words(client: TestClient):
+    assert client.get("/search", params={"q": "!!!"}).status_code == 400
+    assert client.get("/search").status_code == 422
+
+def test_create_all_indexes_existing_rows(client: TestClient):
+    """Test create_all on a database from before search and stats backfills both"""
+    with engine.begin() as conn:
+        for table in ("books_fts", "reviews_fts"):
+            for suffix in ("ai", "ad", "au"):
+                conn.execute(text(f"DROP TRIGGER {table}_{suffix}"))
+            conn.execute(text(f"DROP TABLE {table}"))
+        conn.execute(text("DROP TABLE book_stats"))
+        conn.execute(text("INSERT INTO books (id, title, author) VALUES (1, 'Harry Potter', 'J. K. Rowling')"))
+        conn.execute(text("INSERT INTO reviews (book_id, reviewer_name, rating, comment) VALUES (1, 'Ann', 4, 'Magical')"))
+    Base.metadata.create_all(bind=engine)
+
+    assert [book["id"] for book in client.get("/search", params={"q": "harry"}).json()] == [1]
+    response = client.get("/search", params={"q": "magical", "include_reviews": True})
+    assert [book["id"] for book in response.json()] == [1]
+    assert client.get("/books").json()[0]["review_count"] == 1
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+
+from conftest import async_engine
+from database import SchemaOutOfDateError, alembic_head, check_schema_revision
+from monitoring import StartupTimer
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# Generous so slow CI machines pass; a heavy eager import still blows it
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "5"))
+
+def test_import_stays_within_budget():
+    """Test importing the app is fast and leaves the auth stack unloaded"""
+    script = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import main\n"
+        "print(json.dumps({'seconds': time.perf_counter() - start,"
+        " 'loaded': [m for m in ('passlib', 'jose', 'alembic') if m in sys.modules]}))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report["loaded"] == []
+    assert report["seconds"] < IMPORT_TIME_BUDGET
+
+def test_startup_timer_exports_phases():
+    timer = StartupTimer()
+    with timer.phase("schema"):
+        pass
+    timer.record("import", 0.25)
+    assert list(timer.phases) == ["schema", "import"]
+    assert REGISTRY.get_sample_value("app_startup_phase_seconds", {"phase": "import"}) == 0.25
+    assert "import 250 ms" in timer.summary()
+
+def test_schema_revision_check(db_session):
+    """Test production startup refuses an unmigrated database and accepts the head"""
+    async def stamp(revision):
+        async with async_engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE IF NOT EXISTS alembic_version (version_num VARCHAR(32) NOT NULL)"))
+            await conn.execute(text("DELETE FROM alembic_version"))
+            await conn.execute(text("INSERT INTO alembic_version VALUES (:rev)"), {"rev": revision})
+
+    async def drop():
+        async with async_engine.begin() as conn:
+            await conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+
+    try:
+        with pytest.raises(SchemaOutOfDateError, match="revision is missing"):
+            asyncio.run(check_schema_revision(async_engine))
+        asyncio.run(stamp("8b2e4f6a1c3d"))
+        with pytest.raises(SchemaOutOfDateError, match="alembic upgrade head"):
+            asyncio.run(check_schema_revision(async_engine))
+        asyncio.run(stamp(alembic_head()))
+        assert asyncio.run(check_schema_revision(async_engine)) == alembic_head()
+    finally:
+        asyncio.run(drop())